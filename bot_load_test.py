@@ -0,0 +1,691 @@
+"""
+Bot load test - drives realistic update mixes through the real Dispatcher and handlers.
+
+Everything external is replaced by local fakes, so it runs offline:
+- Fake Telegram Bot API (aiohttp, in the bot's event loop) records every method call
+- Fake PostgREST (threaded HTTP server) backs utils/supabase_db.py with in-memory tables
+- Fake Paytm status endpoint answers payment verification
+
+Each simulated user runs one scenario at a time (start, browse, topup, buy, combo,
+history); scenarios arrive at --rate per second. Reported per step: p50/p95/p99
+latency, Bot API calls and Supabase queries per update, and errors.
+
+Usage:
+    python bot_load_test.py --duration 30 --rate 20 --users 200
+    python bot_load_test.py --db-latency-ms 15 --api-latency-ms 40 --mix buy=3,combo=1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+from aiohttp import web
+
+USER_ID_BASE = 500000000
+
+
+# =====================================================
+# FAKE POSTGREST
+# =====================================================
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# Column defaults from supabase_schema.sql
+TABLE_DEFAULTS = {
+    "users": lambda: {"wallet": 0, "referred_by": None, "referrals": [], "processed_payments": [],
+                      "joined_at": _now(), "created_at": _now(), "updated_at": _now()},
+    "plans": lambda: {"description": "", "stock": 0, "active": True, "created_at": _now(), "updated_at": _now()},
+    "stocks": lambda: {"is_used": False, "used_by": None, "used_at": None, "added_at": _now(), "created_at": _now(),
+                       "leased_by": None, "lease_expires_at": None},
+    "credential_reclaims": lambda: {"status": "pending", "created_at": _now(), "reviewed_at": None, "reviewed_by": None},
+    "subscriptions": lambda: {"status": "active", "purchased_at": _now(), "created_at": _now(), "reminded_at": None},
+    "transactions": lambda: {"transaction_type": "credit", "timestamp": _now(), "created_at": _now()},
+    "logs": lambda: {"created_at": _now(), "timestamp": _now()},
+}
+
+# (table, embedded table) -> (local column, foreign column) for select=*,plans(...)
+EMBEDS = {
+    ("subscriptions", "plans"): ("plan_key", "plan_key"),
+    ("stocks", "plans"): ("plan_key", "plan_key"),
+}
+
+
+def _split_select(select: str) -> List[str]:
+    """Split "*, plans(ott_name, plan_key)" on top-level commas"""
+    parts, depth, current = [], 0, ""
+    for char in select:
+        if char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _coerce(raw: str, sample):
+    if raw == "null":
+        return None
+    if isinstance(sample, bool):
+        return raw == "true"
+    if isinstance(sample, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _matches(row: dict, column: str, expr: str) -> bool:
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    op, _, raw = expr.partition(".")
+    value = row.get(column)
+
+    if op == "is":
+        result = value is _coerce(raw, True) if raw in ("true", "false") else value is None
+    elif op == "in":
+        options = [o.strip('"') for o in raw.strip("()").split(",") if o]
+        result = value in [_coerce(o, value) for o in options]
+    elif op in ("like", "ilike"):
+        pattern = "^" + re.escape(raw).replace("\\*", ".*").replace("%", ".*") + "$"
+        result = value is not None and re.match(pattern, str(value), re.I if op == "ilike" else 0) is not None
+    else:
+        target = _coerce(raw, value)
+        if value is None:
+            result = op == "neq" and target is not None
+        else:
+            try:
+                result = {
+                    "eq": value == target, "neq": value != target,
+                    "gt": value > target, "gte": value >= target,
+                    "lt": value < target, "lte": value <= target,
+                }[op]
+            except (KeyError, TypeError):
+                result = False
+    return not result if negate else result
+
+
+def _split_top(expr: str) -> List[str]:
+    """Split "a,and(b,c),d" on the commas outside parentheses"""
+    parts, depth, current = [], 0, ""
+    for char in expr:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    return parts + [current] if current else parts
+
+
+def _matches_group(row: dict, op: str, expr: str) -> bool:
+    """or=(...) / and=(...) logic trees, nested groups included"""
+    results = []
+    for clause in _split_top(expr[1:-1]):
+        if clause.startswith(("or(", "and(")):
+            name, _, inner = clause.partition("(")
+            results.append(_matches_group(row, name, "(" + inner))
+        else:
+            column, _, rest = clause.partition(".")
+            results.append(_matches(row, column, rest))
+    return any(results) if op == "or" else all(results)
+
+
+def _filter(row: dict, column: str, expr: str) -> bool:
+    if column in ("or", "and"):
+        return _matches_group(row, column, expr)
+    return _matches(row, column, expr)
+
+
+class FakePostgREST:
+    """In-memory PostgREST stand-in for the REST calls supabase-py makes"""
+
+    RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+    def __init__(self, db_latency_ms: float = 0.0, pay_success_ratio: float = 1.0):
+        self.tables: Dict[str, List[dict]] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.db_latency = db_latency_ms / 1000
+        self.pay_success_ratio = pay_success_ratio
+        self.requests = 0
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    # ========== DATA ==========
+
+    def insert(self, table: str, row: dict) -> dict:
+        defaults = TABLE_DEFAULTS.get(table, dict)()
+        full = {"id": next(self.ids), **defaults, **row}
+        self.tables.setdefault(table, []).append(full)
+        return full
+
+    def _project(self, table: str, row: dict, select: str) -> dict:
+        if not select or select == "*":
+            return dict(row)
+        out = {}
+        for part in _split_select(select):
+            if "(" in part:
+                name, cols = part[:-1].split("(", 1)
+                name = name.strip()
+                local, foreign = EMBEDS.get((table, name), (f"{name}_id", "id"))
+                match = next((r for r in self.tables.get(name, []) if r.get(foreign) == row.get(local)), None)
+                out[name] = self._project(name, match, cols) if match else None
+            elif part == "*":
+                out.update(row)
+            else:
+                out[part] = row.get(part)
+        return out
+
+    def query(self, method: str, table: str, params: List[tuple], body, prefer: str):
+        filters = [(k, v) for k, v in params if k not in self.RESERVED]
+        options = dict((k, v) for k, v in params if k in self.RESERVED)
+
+        with self.lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "POST":
+                new_rows = body if isinstance(body, list) else [body]
+                result = [self.insert(table, r) for r in new_rows]
+                return 201, result, len(result)
+
+            matched = [r for r in rows if all(_filter(r, k, v) for k, v in filters)]
+
+            if method == "PATCH":
+                for row in matched:
+                    row.update(body)
+                return 200, [dict(r) for r in matched], len(matched)
+            if method == "DELETE":
+                gone = {id(r) for r in matched}
+                self.tables[table] = [r for r in rows if id(r) not in gone]
+                return 200, matched, len(matched)
+
+            for clause in reversed(options.get("order", "").split(",") if options.get("order") else []):
+                column, *flags = clause.split(".")
+                present = [r for r in matched if r.get(column) is not None]
+                missing = [r for r in matched if r.get(column) is None]
+                present.sort(key=lambda r: r[column], reverse="desc" in flags)
+                matched = present + missing
+            total = len(matched)
+            offset = int(options.get("offset", 0))
+            if "limit" in options:
+                matched = matched[offset:offset + int(options["limit"])]
+            else:
+                matched = matched[offset:]
+            return 200, [self._project(table, r, options.get("select", "*")) for r in matched], total
+
+    def rpc(self, fn: str, args: dict):
+        """Python versions of the SQL functions in supabase_schema.sql"""
+        now = _now()
+        with self.lock:
+            stocks = self.tables.setdefault("stocks", [])
+            if fn == "lease_stock":
+                free = [
+                    r for r in stocks
+                    if r["plan_key"] == args["p_plan_key"] and not r["is_used"]
+                    and (r.get("leased_by") is None or r["lease_expires_at"] < now)
+                ][:args["p_count"]]
+                expires = (datetime.now(timezone.utc) + timedelta(seconds=args["p_ttl_seconds"])).isoformat()
+                for row in free:
+                    row.update(leased_by=args["p_instance"], lease_expires_at=expires)
+                return 200, [dict(r) for r in free]
+            if fn == "claim_leased_stock":
+                row = next((
+                    r for r in stocks
+                    if r["id"] == args["p_id"] and not r["is_used"]
+                    and r.get("leased_by") == args["p_instance"] and r["lease_expires_at"] > now
+                ), None)
+                if row is None:
+                    return 200, []
+                row.update(is_used=True, used_by=args["p_telegram_id"], used_at=now, leased_by=None, lease_expires_at=None)
+                return 200, [dict(row)]
+            if fn == "release_stock_leases":
+                ids = args.get("p_ids")
+                released = 0
+                for row in stocks:
+                    if row.get("leased_by") == args["p_instance"] and not row["is_used"] and (ids is None or row["id"] in ids):
+                        row.update(leased_by=None, lease_expires_at=None)
+                        released += 1
+                return 200, released
+            if fn == "queue_credential_reclaims":
+                subs = self.tables.setdefault("subscriptions", [])
+                reclaims = self.tables.setdefault("credential_reclaims", [])
+                open_ids = {r["stock_id"] for r in reclaims if r["status"] == "pending"}
+                active = {(s["telegram_id"], s["plan_key"]) for s in subs if s["status"] == "active"}
+                queued = 0
+                for sub in subs:
+                    if sub["id"] not in args["p_subscription_ids"] or sub["status"] != "expired":
+                        continue
+                    # Legacy subscriptions (no credential) wait until no active one remains
+                    legacy = sub.get("credential") is None
+                    if legacy and (sub["telegram_id"], sub["plan_key"]) in active:
+                        continue
+                    for row in stocks:
+                        if (row["is_used"] and row["used_by"] == sub["telegram_id"] and row["plan_key"] == sub["plan_key"]
+                                and (legacy or sub["credential"] == row["credential"]) and row["id"] not in open_ids):
+                            self.insert("credential_reclaims", {
+                                "stock_id": row["id"], "subscription_id": sub["id"], "plan_key": sub["plan_key"],
+                                "previous_credential": row["credential"],
+                            })
+                            open_ids.add(row["id"])
+                            queued += 1
+                return 200, queued
+            if fn == "approve_credential_reclaim":
+                reclaim = next((
+                    r for r in self.tables.get("credential_reclaims", [])
+                    if r["id"] == args["p_id"] and r["status"] == "pending"
+                ), None)
+                if reclaim is None:
+                    return 200, []
+                reclaim.update(status="approved", reviewed_at=now, reviewed_by=args["p_admin"])
+                row = next(r for r in stocks if r["id"] == reclaim["stock_id"])
+                row.update(credential=args["p_credential"] or row["credential"], is_used=False, used_by=None,
+                           used_at=None, leased_by=None, lease_expires_at=None)
+                return 200, [dict(row)]
+        return 404, {"message": f"unknown function {fn}"}
+
+    # ========== HTTP ==========
+
+    def start(self, port: int = 0) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real PostgREST behind a proxy
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, payload, headers: Optional[dict] = None):
+                data = json.dumps(payload, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self):
+                fake.requests += 1
+                if fake.db_latency:
+                    time.sleep(fake.db_latency)
+                url = urlparse(self.path)
+                params = parse_qsl(url.query, keep_blank_values=True)
+
+                if url.path == "/paytm/verify":
+                    ok = random.random() < fake.pay_success_ratio
+                    return self._reply(200, {"STATUS": "TXN_SUCCESS" if ok else "PENDING", "ORDERID": dict(params).get("oid")})
+
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null") if length else None
+
+                match = re.match(r"^/rest/v1/rpc/([^/]+)$", url.path)
+                if match:
+                    return self._reply(*fake.rpc(match.group(1), body or {}))
+
+                match = re.match(r"^/rest/v1/([^/]+)$", url.path)
+                if not match:
+                    return self._reply(404, {"message": f"unknown path {url.path}"})
+                prefer = self.headers.get("Prefer", "")
+                status, rows, total = fake.query(self.command, match.group(1), params, body, prefer)
+
+                headers = {}
+                if "count=" in prefer:
+                    headers["Content-Range"] = f"0-{max(len(rows) - 1, 0)}/{total}" if rows else f"*/{total}"
+                if "vnd.pgrst.object" in self.headers.get("Accept", ""):
+                    if len(rows) != 1:
+                        return self._reply(406, {"message": "JSON object requested, multiple (or no) rows returned"})
+                    return self._reply(status, rows[0], headers)
+                return self._reply(status, rows, headers)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="fake-postgrest").start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+
+
+# =====================================================
+# FAKE TELEGRAM BOT API
+# =====================================================
+
+class FakeBotAPI:
+    """Answers Bot API methods with plausible results and records every call"""
+
+    def __init__(self, api_latency_ms: float = 0.0):
+        self.calls: Dict[str, int] = {}
+        self.api_latency = api_latency_ms / 1000
+        self.message_ids = itertools.count(1)
+        self.runner: Optional[web.AppRunner] = None
+
+    def _message(self, chat_id) -> dict:
+        return {
+            "message_id": next(self.message_ids), "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"}, "text": "",
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        data = await request.post()
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        chat_id = data.get("chat_id")
+        if method in ("sendMessage", "sendPhoto", "sendDocument", "copyMessage", "forwardMessage",
+                      "editMessageText", "editMessageCaption", "editMessageReplyMarkup"):
+            result = self._message(chat_id)
+        elif method == "getChatMember":
+            result = {"status": "member", "user": {"id": int(data.get("user_id", 0)), "is_bot": False, "first_name": "Load"}}
+        elif method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "LoadBot", "username": "load_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", port)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+# =====================================================
+# SCENARIOS
+# =====================================================
+
+_update_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}", "username": f"load{user_id}"}
+
+
+def message(user_id: int, text: str) -> dict:
+    update_id = next(_update_ids)
+    msg = {"message_id": update_id, "date": int(time.time()), "chat": {"id": user_id, "type": "private"},
+           "from": _user(user_id), "text": text}
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": msg}
+
+
+def callback(user_id: int, data: str) -> dict:
+    update_id = next(_update_ids)
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "from": _user(user_id), "chat_instance": str(user_id), "data": data,
+            "message": {"message_id": update_id, "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"}, "text": "menu"},
+        },
+    }
+
+
+def _checkpay(user_id: int) -> dict:
+    from utils.callback_router import pack
+    return callback(user_id, pack("checkpay", f"M-{user_id}-{next(_update_ids)}", 100))
+
+
+# scenario -> [(step label, update factory)]
+SCENARIOS = {
+    "start": [("/start", lambda u: message(u, "/start"))],
+    "browse": [
+        ("menu_buy_otts", lambda u: callback(u, "menu_buy_otts")),
+        ("plan_netflix", lambda u: callback(u, "plan_netflix")),
+        ("plan_prime", lambda u: callback(u, "plan_prime")),
+        ("back_to_main", lambda u: callback(u, "back_to_main")),
+    ],
+    "topup": [
+        ("menu_add_funds", lambda u: callback(u, "menu_add_funds")),
+        ("addfunds_100", lambda u: callback(u, "addfunds_100")),
+        ("checkpay", _checkpay),
+    ],
+    "buy": [
+        ("plan_netflix", lambda u: callback(u, "plan_netflix")),
+        ("buy:netflix_4k", lambda u: callback(u, "buy:netflix_4k")),
+    ],
+    "combo": [
+        ("plan_combo", lambda u: callback(u, "plan_combo")),
+        ("buy:combo", lambda u: callback(u, "buy:combo")),
+        ("back_to_main", lambda u: callback(u, "back_to_main")),
+    ],
+    "history": [("/history", lambda u: message(u, "/history"))],
+}
+DEFAULT_MIX = "start=20,browse=35,topup=15,buy=15,combo=5,history=10"
+
+
+# =====================================================
+# DRIVER
+# =====================================================
+
+class StepResult:
+    __slots__ = ("scenario", "step", "latency_ms", "api_calls", "db_calls", "error")
+
+    def __init__(self, scenario: str, step: str):
+        self.scenario = scenario
+        self.step = step
+        self.latency_ms = 0.0
+        self.api_calls = 0
+        self.db_calls = 0
+        self.error: Optional[str] = None
+
+
+_current_step: ContextVar[Optional[StepResult]] = ContextVar("load_test_step", default=None)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def seed(db: FakePostgREST, users: int, stock: int):
+    from config.settings import PLANS
+    for plan_key, plan in PLANS.items():
+        db.insert("plans", {"plan_key": plan_key, "ott_name": plan["name"], "price": plan["price"]})
+        for i in range(stock):
+            db.insert("stocks", {"plan_key": plan_key, "credential": f"{plan_key}{i}@load.test:pw{i}"})
+    for i in range(users):
+        db.insert("users", {"telegram_id": USER_ID_BASE + i, "name": f"Load{i}", "wallet": 10_000_000})
+
+
+async def run(args):
+    fake_db = FakePostgREST(args.db_latency_ms, args.pay_success_ratio)
+    db_url = fake_db.start()
+    fake_api = FakeBotAPI(args.api_latency_ms)
+    api_url = await fake_api.start()
+
+    # The bot reads these at import time
+    os.environ.update({
+        "SUPABASE_URL": db_url,
+        "SUPABASE_SERVICE_ROLE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.loadtest",
+        "BOT_MODE": "polling",
+        "REDIS_URL": "",
+        "METRICS_PORT": "0",
+    })
+
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        import main
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+
+    from aiogram import Bot, Dispatcher, types
+    from aiogram.bot import api
+    from aiogram.bot.api import TelegramAPIServer
+    from handlers import wallet_handler
+    from utils.db_instrumentation import add_trace_listener
+
+    seed(fake_db, args.users, args.stock)
+    wallet_handler.PAY_VERIFY_API = f"{db_url}/paytm/verify"
+
+    # Route every Bot instance to the fake API and attribute calls to the running step
+    fake_server = TelegramAPIServer.from_base(api_url)
+    make_request = api.make_request
+
+    async def fake_make_request(session, server, token, method, data=None, files=None, **kwargs):
+        step = _current_step.get()
+        if step is not None:
+            step.api_calls += 1
+        return await make_request(session, fake_server, token, method, data, files, **kwargs)
+
+    api.make_request = fake_make_request
+
+    def count_queries(trace):
+        step = _current_step.get()
+        if step is not None:
+            step.db_calls = len(trace.calls)
+
+    add_trace_listener(count_queries)
+
+    async def record_error(update, error):
+        step = _current_step.get()
+        if step is not None:
+            step.error = type(error).__name__
+
+    dp = main.dp
+    dp.errors_handlers.register(record_error, index=0)
+    Bot.set_current(dp.bot)
+    Dispatcher.set_current(dp)
+
+    results: List[StepResult] = []
+    idle = asyncio.Queue()
+    for i in range(args.users):
+        idle.put_nowait(USER_ID_BASE + i)
+    weights = _parse_mix(args.mix)
+    names, probs = list(weights), list(weights.values())
+    saturated = 0
+
+    async def session(user_id: int, scenario: str):
+        try:
+            for label, factory in SCENARIOS[scenario]:
+                step = StepResult(scenario, label)
+                token = _current_step.set(step)
+                start = time.perf_counter()
+                try:
+                    await dp.updates_handler.notify(types.Update(**factory(user_id)))
+                except Exception as e:
+                    step.error = type(e).__name__
+                finally:
+                    step.latency_ms = (time.perf_counter() - start) * 1000
+                    _current_step.reset(token)
+                results.append(step)
+                if args.think_ms:
+                    await asyncio.sleep(random.uniform(0.5, 1.5) * args.think_ms / 1000)
+        finally:
+            idle.put_nowait(user_id)
+
+    tasks = set()
+    with quiet:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        next_arrival = start
+        while time.perf_counter() < deadline:
+            try:
+                user_id = idle.get_nowait()
+            except asyncio.QueueEmpty:
+                saturated += 1
+            else:
+                task = asyncio.create_task(session(user_id, random.choices(names, probs)[0]))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_arrival += random.expovariate(args.rate)
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        if tasks:
+            await asyncio.wait(set(tasks))
+        elapsed = time.perf_counter() - start
+        await main.credential_pool.close()
+
+    await fake_api.stop()
+    fake_db.stop()
+    report(args, results, elapsed, saturated, fake_api, fake_db)
+
+
+def report(args, results: List[StepResult], elapsed: float, saturated: int, fake_api: FakeBotAPI, fake_db: FakePostgREST):
+    latencies = [r.latency_ms for r in results]
+    print("=" * 96)
+    print("📈 BOT LOAD TEST")
+    print("=" * 96)
+    print(f"Duration:      {elapsed:.1f}s  (arrival rate {args.rate}/s, {args.users} users, mix {args.mix})")
+    print(f"Fake latency:  db {args.db_latency_ms}ms/query, bot api {args.api_latency_ms}ms/call")
+    print(f"Updates:       {len(results)}  ({len(results) / elapsed:,.1f}/s)   arrivals dropped (all users busy): {saturated}")
+    print(f"Latency:       p50 {_percentile(latencies, 50):.1f}ms  p95 {_percentile(latencies, 95):.1f}ms  "
+          f"p99 {_percentile(latencies, 99):.1f}ms  mean {statistics.mean(latencies) if latencies else 0:.1f}ms")
+    print(f"Errors:        {sum(1 for r in results if r.error)}")
+    print()
+    print(f"{'scenario / step':<28}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'api/upd':>9}{'db/upd':>8}{'errors':>8}")
+    print("-" * 96)
+    groups: Dict[tuple, List[StepResult]] = {}
+    for r in results:
+        groups.setdefault((r.scenario, r.step), []).append(r)
+    for (scenario, step), rows in sorted(groups.items()):
+        lat = [r.latency_ms for r in rows]
+        errors = [r.error for r in rows if r.error]
+        print(f"{scenario + ' / ' + step:<28}{len(rows):>7}{_percentile(lat, 50):>9.1f}{_percentile(lat, 95):>9.1f}"
+              f"{_percentile(lat, 99):>9.1f}{statistics.mean(r.api_calls for r in rows):>9.1f}"
+              f"{statistics.mean(r.db_calls for r in rows):>8.1f}{len(errors):>8}"
+              + (f"  {max(set(errors), key=errors.count)}" if errors else ""))
+    print()
+    print(f"Bot API calls: {dict(sorted(fake_api.calls.items(), key=lambda kv: -kv[1]))}")
+    print(f"PostgREST requests: {fake_db.requests}")
+    print("=" * 96)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive synthetic update mixes through the bot against local fakes")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to generate arrivals")
+    parser.add_argument("--rate", type=float, default=10.0, help="Scenario arrivals per second")
+    parser.add_argument("--users", type=int, default=100, help="Simulated users (each runs one scenario at a time)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, e.g. start=1,buy=3")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="Mean pause between a user's steps")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Added latency per PostgREST request")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Added latency per Bot API call")
+    parser.add_argument("--pay-success-ratio", type=float, default=0.8, help="Share of checkpay calls that succeed")
+    parser.add_argument("--stock", type=int, default=2000, help="Credentials seeded per plan")
+    parser.add_argument("--verbose", action="store_true", help="Keep handler prints and logs")
+    asyncio.run(run(parser.parse_args()))
@@ -1,3 +1,8 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
 # ================================
 # ⚙️ BOT CONFIGURATION
 # ================================
@@ -10,6 +15,7 @@ ADMINS = [7127370646]
 # 📁 DATA FILE PATHS
 # ================================
 DATA_FILE = "data/users.json"
+LOCAL_DB_PATH = os.getenv("LOCAL_DB_PATH", "data/local.db")  # SQLite store behind utils/json_utils.py
 
 
 # ================================
@@ -70,6 +76,90 @@ RAZORPAY_API_BASE = "https://api.razorpay.com/v1"
 PAYMENT_CHECK_INTERVAL = 15  # seconds
 
 
+# ================================
+# 🌐 DEPLOYMENT MODE
+# ================================
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # "polling" or "webhook"
+
+# Webhook (public URL Telegram posts to, behind the reverse proxy)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "https://bot.example.com")
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token
+
+# Local aiohttp server the proxy forwards to
+WEBAPP_HOST = "127.0.0.1"
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))  # Processes sharing WEBAPP_PORT
+WEBHOOK_MAX_CONCURRENT_UPDATES = 64  # In-flight updates per worker
+WEBHOOK_DRAIN_TIMEOUT = 25           # Seconds to finish in-flight updates on shutdown
+
+# Per-user update ordering (see utils/update_scheduler.py)
+USER_QUEUE_LIMIT = 5  # Max queued/running updates per user before new ones are dropped
+
+# Shared FSM storage, required when WEBHOOK_WORKERS > 1 (empty = in-process memory)
+REDIS_URL = os.getenv("REDIS_URL", "")
+
+
+# ================================
+# 🔳 QR RENDERING
+# ================================
+QR_BOX_SIZE = 6          # Pixels per QR module (Telegram still scans cleanly)
+QR_BORDER = 2            # Quiet zone in modules
+QR_POOL_KIND = "thread"  # "thread" or "process"
+QR_WORKERS = 2           # Render pool size
+QR_MAX_PENDING = 32      # Max renders queued/in-flight at once
+QR_CACHE_SIZE = 256      # Cached PNGs keyed by order_id
+
+
+# ================================
+# 🔑 CREDENTIAL POOL
+# ================================
+CREDENTIAL_POOL_PLANS = ["netflix_4k", "prime_video", "pornhub"]  # Plans delivered from leased stock
+CREDENTIAL_POOL_SIZE = 3          # Leased credentials kept in memory per plan
+CREDENTIAL_POOL_LOW = 1           # Refill when a plan drops to this many
+CREDENTIAL_LEASE_TTL = 600        # Seconds a lease stays valid in the database
+CREDENTIAL_LEASE_MARGIN = 60      # Stop handing out a lease this long before it expires
+CREDENTIAL_POOL_REFILL_INTERVAL = 30  # Seconds between background refills
+
+
+# ================================
+# ⏰ SUBSCRIPTION EXPIRY
+# ================================
+SUBSCRIPTION_EXPIRY_INTERVAL = 300   # Seconds between expiry passes
+SUBSCRIPTION_REMIND_BEFORE = 72      # Hours before expiry to send the renewal reminder
+SUBSCRIPTION_EXPIRY_BATCH = 500      # Rows per keyset page / bulk status update
+
+# Bot-initiated messages (see utils/message_sender.py)
+SENDER_RATE = 25             # Messages per second across all chats (Telegram allows ~30)
+SENDER_CHAT_INTERVAL = 1.0   # Min seconds between messages to the same chat
+SENDER_MAX_RETRIES = 3       # Retries after a flood wait
+
+
+# ================================
+# 📊 METRICS
+# ================================
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # 0 disables; webhook worker N uses METRICS_PORT + N
+LOOP_LAG_INTERVAL = 0.5  # Seconds between event-loop lag probes
+
+# Data-layer tracing (see utils/db_instrumentation.py)
+DB_TRACE_MAX_CALLS = 15         # Warn when one update makes more Supabase calls than this
+DB_TRACE_REPEAT_THRESHOLD = 3   # Warn (N+1) when one query shape repeats this often in an update
+DB_SLOW_QUERY_MS = 300          # Single queries slower than this go to the slow-log
+DB_SLOW_UPDATE_MS = 1000        # Updates spending longer than this in the data layer go to the slow-log
+DB_SLOW_LOG_PATH = os.getenv("DB_SLOW_LOG_PATH", "logs/db_slow.log")
+
+# Buffered writes to the logs table (see utils/log_buffer.py)
+LOG_BUFFER_MAX_ROWS = 200          # Flush as soon as this many rows are queued (also the insert batch size)
+LOG_BUFFER_FLUSH_INTERVAL = 2.0    # Seconds between time-based flushes
+LOG_SPILL_PATH = os.getenv("LOG_SPILL_PATH", "logs/log_spill.jsonl")  # Rows kept here while the DB is unreachable
+
+# Monthly logs partitions (see utils/log_retention.py)
+LOG_RETENTION_MONTHS = 6           # Full months of logs kept besides the current one
+LOG_PARTITIONS_AHEAD = 2           # Future monthly partitions kept ready
+LOG_MAINTENANCE_INTERVAL = 6 * 3600  # Seconds between partition maintenance runs
+
+
 # ================================
 # � FORCE SUBSCRIBE
 # ================================
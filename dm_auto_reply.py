@@ -4,8 +4,12 @@ This script automatically replies to incoming direct messages on your personal T
 """
 
 from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError
+import asyncio
 import json
 import os
+import sqlite3
+import time
 from datetime import datetime, timedelta
 
 # Configuration
@@ -16,12 +20,42 @@ PHONE = '+447366497014'  # Your phone number with country code (e.g., +123456789
 # Get the directory where the script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(SCRIPT_DIR, 'config.json')
+STATE_DB_PATH = os.path.join(SCRIPT_DIR, 'dm_auto_reply_state.db')
+
+# Per-user state is forgotten this long after the user's last activity
+STATE_TTL = timedelta(days=7)
+STATE_PURGE_INTERVAL = 3600  # Seconds between sweeps of expired state
+
+# Outgoing replies (live + startup catch-up share one limiter)
+REPLY_RATE = 1.0            # Messages per second
+FLOOD_WAIT_RETRIES = 3      # Retries after a FloodWaitError
+CATCHUP_CONCURRENCY = 5     # Dialogs processed at once during catch-up
+CATCHUP_DIALOG_LIMIT = None # Dialogs scanned at startup (None = all)
+
+# Parsed config, reused until config.json's modification time changes
+_config_cache = {'mtime': None, 'config': None}
 
 # Load auto-reply message from config
 def load_config():
-    if os.path.exists(CONFIG_PATH):
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    try:
+        mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime is not None and mtime == _config_cache['mtime']:
+        return _config_cache['config']
+
+    if mtime is not None:
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except ValueError as e:
+            if _config_cache['config'] is None:
+                raise
+            # Caught mid-save: keep the last good config, retry on the next message
+            print(f"config.json unreadable ({e}), keeping previous config")
+            return _config_cache['config']
+        _config_cache.update(mtime=mtime, config=config)
+        return config
     else:
         # Default config
         config = {
@@ -33,20 +67,121 @@ def load_config():
         }
         with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=4)
+        _config_cache.update(mtime=os.stat(CONFIG_PATH).st_mtime_ns, config=config)
         return config
 
 # Initialize the client
 client = TelegramClient('session_name', API_ID, API_HASH)
 
-# Dictionary to track users: {user_id: {'stage': 'initial/yes_replied/ok_replied', 'last_auto_reply': datetime}}
-user_states = {}
+# Our own user ID, fetched once in main()
+MY_ID = None
+
+
+class UserStateStore:
+    """
+    Per-user stage and cooldown, kept in SQLite so it survives restarts
+    and memory stays flat however many users write in.
+
+    Rows expire STATE_TTL after the user's last activity.
+    """
+
+    def __init__(self, path, ttl=STATE_TTL):
+        self.ttl = ttl.total_seconds()
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_states ("
+            " user_id INTEGER PRIMARY KEY,"
+            " stage TEXT NOT NULL,"
+            " last_auto_reply REAL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_user_states_updated ON user_states(updated_at)")
+        self._last_purge = 0.0
+
+    def get(self, user_id):
+        """{'stage': ..., 'last_auto_reply': datetime or None}, or None if unknown/expired"""
+        row = self.conn.execute(
+            "SELECT stage, last_auto_reply FROM user_states WHERE user_id = ? AND updated_at >= ?",
+            (user_id, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'stage': row[0],
+            'last_auto_reply': datetime.fromtimestamp(row[1]) if row[1] is not None else None
+        }
+
+    def set(self, user_id, stage, last_auto_reply=None):
+        """Record the user's stage; last_auto_reply=None keeps the stored time"""
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO user_states (user_id, stage, last_auto_reply, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET stage = excluded.stage, "
+            "last_auto_reply = COALESCE(excluded.last_auto_reply, user_states.last_auto_reply), "
+            "updated_at = excluded.updated_at",
+            (user_id, stage, last_auto_reply.timestamp() if last_auto_reply else None, now)
+        )
+        self.purge_expired()
+
+    def delete(self, user_id):
+        self.conn.execute("DELETE FROM user_states WHERE user_id = ?", (user_id,))
+
+    def purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < STATE_PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self.conn.execute("DELETE FROM user_states WHERE updated_at < ?", (now - self.ttl,))
+
+
+class FloodWaitLimiter:
+    """
+    Spaces sends REPLY_RATE per second; a FloodWaitError pauses every sender
+    for the requested time, then the call is retried.
+    """
+
+    def __init__(self, rate=REPLY_RATE, max_retries=FLOOD_WAIT_RETRIES):
+        self.interval = 1.0 / rate
+        self.max_retries = max_retries
+        self.flood_waits = 0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            wait = self._next_at - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_at = max(self._next_at, loop.time()) + self.interval
+
+    async def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self._acquire()
+            try:
+                return await fn(*args, **kwargs)
+            except FloodWaitError as e:
+                self.flood_waits += 1
+                if attempt == self.max_retries:
+                    raise
+                print(f"Flood wait: pausing all replies for {e.seconds}s")
+                self._next_at = max(self._next_at, asyncio.get_running_loop().time() + e.seconds)
+
+
+limiter = FloodWaitLimiter()
+
+# Tracks users: {user_id: {'stage': 'initial/yes_replied/ok_replied', 'last_auto_reply': datetime}}
+user_states = UserStateStore(STATE_DB_PATH)
 
 def can_send_auto_reply(sender_id):
     """Check if user can receive auto-reply (24 hours cooldown)"""
-    if sender_id not in user_states:
+    state = user_states.get(sender_id)
+    if state is None:
         return True
     
-    last_reply = user_states[sender_id].get('last_auto_reply')
+    last_reply = state.get('last_auto_reply')
     if not last_reply:
         return True
     
@@ -59,85 +194,137 @@ def can_send_auto_reply(sender_id):
 @client.on(events.NewMessage(incoming=True, func=lambda e: e.is_private))
 async def auto_reply_handler(event):
     """Automatically reply to incoming private messages"""
+    sender = await event.get_sender()
+    await handle_private_message(sender, event.message.text, lambda text: limiter.call(event.reply, text))
+
+
+async def handle_private_message(sender, text, reply):
+    """
+    Run one incoming private message through the auto-reply stages.
+    `reply` is an async callable taking the text to send. Returns True if something was sent.
+    """
     config = load_config()
     
     # Check if auto-reply is enabled
     if not config.get('enabled', True):
-        return
+        return False
     
     # Get sender info
-    sender = await event.get_sender()
     sender_id = sender.id
     
     # Skip if user is in exclude list
     if sender_id in config.get('exclude_users', []):
         print(f"Skipping auto-reply for excluded user: {sender.first_name} ({sender_id})")
-        return
+        return False
     
     # Skip if message is from yourself
-    me = await client.get_me()
-    if sender_id == me.id:
-        return
+    if sender_id == MY_ID:
+        return False
     
     # Get message text
-    message_text = event.message.text.lower().strip() if event.message.text else ""
+    message_text = text.lower().strip() if text else ""
     
     # Reset command - clear user state
     if message_text == "/reset":
-        if sender_id in user_states:
-            del user_states[sender_id]
-        await event.reply("✅ Reset! Send any message to get the auto-reply again.")
-        return
-    
-    # Initialize user state if not exists
-    if sender_id not in user_states:
-        user_states[sender_id] = {'stage': 'new', 'last_auto_reply': None}
+        user_states.delete(sender_id)
+        await reply("✅ Reset! Send any message to get the auto-reply again.")
+        return True
     
-    current_stage = user_states[sender_id].get('stage', 'new')
+    state = user_states.get(sender_id) or {'stage': 'new', 'last_auto_reply': None}
+    current_stage = state.get('stage', 'new')
     
     # Stage 1: User replies with "yes" to get offer details
     if current_stage == 'initial' and message_text == "yes":
         offer_message = config.get('offer_message', '')
         if not offer_message:
             print(f"ERROR: offer_message is empty in config!")
-            await event.reply("Sorry, there was an error. Please contact support.")
-            return
-        await event.reply(offer_message)
-        user_states[sender_id]['stage'] = 'yes_replied'
+            await reply("Sorry, there was an error. Please contact support.")
+            return True
+        await reply(offer_message)
+        user_states.set(sender_id, 'yes_replied')
         print(f"Sent offer details to {sender.first_name} ({sender_id})")
-        return
+        return True
     
     # Stage 2: User replies with "ok" after seeing the offer
     if current_stage == 'yes_replied' and message_text == "ok":
         confirmation_message = config.get('confirmation_message', 'Thank you! Our staff will contact you shortly.')
-        await event.reply(confirmation_message)
-        user_states[sender_id]['stage'] = 'ok_replied'
+        await reply(confirmation_message)
+        user_states.set(sender_id, 'ok_replied')
         print(f"User {sender.first_name} ({sender_id}) confirmed with 'ok'")
-        return
+        return True
     
     # If user already has a stage (initial, yes_replied, or ok_replied), don't send auto-reply again
     if current_stage in ['initial', 'yes_replied', 'ok_replied']:
         print(f"User {sender.first_name} ({sender_id}) is at stage '{current_stage}', skipping auto-reply.")
-        return
+        return False
     
     # Check if user can receive auto-reply (24 hour cooldown)
     if not can_send_auto_reply(sender_id):
-        hours_left = 24 - (datetime.now() - user_states[sender_id]['last_auto_reply']).total_seconds() / 3600
+        hours_left = 24 - (datetime.now() - state['last_auto_reply']).total_seconds() / 3600
         print(f"User {sender.first_name} ({sender_id}) already received auto-reply. {hours_left:.1f} hours left until next one.")
-        return
+        return False
     
     # Send initial auto-reply with personalized first name
     auto_reply_template = config.get('auto_reply_message', 'Thanks for your message!')
     first_name = sender.first_name or "there"
     auto_reply = auto_reply_template.replace('{first_name}', first_name)
     
-    await event.reply(auto_reply)
+    await reply(auto_reply)
     
     # Update user state
-    user_states[sender_id]['stage'] = 'initial'
-    user_states[sender_id]['last_auto_reply'] = datetime.now()
+    user_states.set(sender_id, 'initial', datetime.now())
     
     print(f"Auto-replied to {first_name} ({sender_id}). Next auto-reply available in 24 hours.")
+    return True
+
+
+async def catch_up_missed_messages():
+    """
+    Reply to private chats that received messages while the script was offline.
+    Each unread dialog's latest message goes through the normal stages, so users
+    still in cooldown (persistent state) are skipped.
+    """
+    stats = {'scanned': 0, 'unread': 0, 'replied': 0, 'failed': 0}
+    slots = asyncio.Semaphore(CATCHUP_CONCURRENCY)
+    tasks = []
+    started = time.monotonic()
+
+    async def process(dialog):
+        try:
+            message = dialog.message
+            sent = await handle_private_message(
+                dialog.entity, message.text,
+                lambda text: limiter.call(client.send_message, dialog.entity, text, reply_to=message.id)
+            )
+            if sent:
+                stats['replied'] += 1
+        except Exception as e:
+            stats['failed'] += 1
+            print(f"Catch-up failed for {dialog.id}: {e}")
+        finally:
+            slots.release()
+
+    async for dialog in client.iter_dialogs(limit=CATCHUP_DIALOG_LIMIT):
+        stats['scanned'] += 1
+        entity = dialog.entity
+        if not dialog.is_user or getattr(entity, 'bot', False) or entity.id == MY_ID:
+            continue
+        # Unread and the last word is theirs
+        if dialog.unread_count == 0 or dialog.message is None or dialog.message.out:
+            continue
+        stats['unread'] += 1
+        await slots.acquire()
+        tasks.append(asyncio.create_task(process(dialog)))
+
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    print(
+        f"Catch-up done in {elapsed:.1f}s: {stats['scanned']} dialogs scanned, {stats['unread']} unread, "
+        f"{stats['replied']} replied, {stats['failed']} failed, {limiter.flood_waits} flood waits "
+        f"({stats['replied'] / max(elapsed, 1e-9):.2f} replies/s)"
+    )
+    return stats
+
 
 async def main():
     """Start the client"""
@@ -147,12 +334,16 @@ async def main():
     # Connect and start
     await client.start(phone=PHONE)
     print("Client started successfully!")
-    print(f"Logged in as: {(await client.get_me()).first_name}")
+    global MY_ID
+    me = await client.get_me()
+    MY_ID = me.id
+    print(f"Logged in as: {me.first_name}")
+
+    # Answer what arrived while we were offline (live messages are handled meanwhile)
+    asyncio.create_task(catch_up_missed_messages())
     
     # Keep the client running
     await client.run_until_disconnected()
 
 if __name__ == '__main__':
-    import asyncio
     asyncio.run(main())
-1
\ No newline at end of file
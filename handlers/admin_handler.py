@@ -4,8 +4,10 @@ from config.settings import ADMINS, PLANS
 from utils.supabase_db import (
     get_user, update_wallet, deduct_wallet, get_all_users, create_transaction, get_stock_counts
 )
+from utils.json_utils import get_recent_transactions, iter_user_ids, get_store_stats
 from utils.log_utils import send_log
 from utils.text_utils import toSmallCaps
+from utils.callback_router import callback_router
 import json
 import os
 from datetime import datetime
@@ -145,15 +147,14 @@ def register_admin(dp):
         if not is_admin(message.from_user.id):
             return
         
-        transactions = _read_transactions()
-        recent = list(transactions.values())[-10:]
+        recent = get_recent_transactions(10)
         
         if not recent:
             await message.answer(toSmallCaps("<b>📊 No Transactions Found</b>"), parse_mode="HTML")
             return
         
         text = toSmallCaps("<b>💳 RECENT TRANSACTIONS\n━━━━━━━━━━━━━━\n\n</b>")
-        for txn in reversed(recent):
+        for txn in recent:
             text += f"• User: {txn.get('user_id')} | ₹{txn.get('amount')} | {txn.get('description')}\n"
         
         await message.answer(text, parse_mode="HTML")
@@ -222,8 +223,7 @@ def register_admin(dp):
         if not is_admin(message.from_user.id):
             return
         
-        users_data = _read_all()
-        total_refs = sum(len(user.get("referrals", [])) for user in users_data.values())
+        total_refs = get_store_stats()["referrals"]
         
         await message.answer(
             toSmallCaps(f"<b>🎁 Total Referrals: {total_refs}</b>"),
@@ -241,13 +241,12 @@ def register_admin(dp):
             await message.answer(toSmallCaps("<b>Usage: /broadcast Your Message Here</b>"), parse_mode="HTML")
             return
         
-        users_data = _read_all()
         success = 0
         failed = 0
         
-        for user_id in users_data.keys():
+        for user_id in iter_user_ids():
             try:
-                await message.bot.send_message(int(user_id), text, parse_mode="HTML")
+                await message.bot.send_message(user_id, text, parse_mode="HTML")
                 success += 1
             except:
                 failed += 1
@@ -264,14 +263,12 @@ def register_admin(dp):
         if not is_admin(message.from_user.id):
             return
         
-        users_data = _read_all()
-        transactions = _read_transactions()
-        
-        total_users = len(users_data)
-        total_wallet = sum(user.get("wallet", 0) for user in users_data.values())
-        total_subs = sum(len(user.get("subscriptions", [])) for user in users_data.values())
-        total_refs = sum(len(user.get("referrals", [])) for user in users_data.values())
-        total_txns = len(transactions)
+        stats = get_store_stats()
+        total_users = stats["users"]
+        total_wallet = stats["wallet"]
+        total_subs = stats["subscriptions"]
+        total_refs = stats["referrals"]
+        total_txns = stats["transactions"]
         
         text = toSmallCaps(
             f"<b>📊 BOT STATISTICS\n"
@@ -347,7 +344,7 @@ def register_admin(dp):
             await message.answer(toSmallCaps(f"<b>❌ Error: {e}</b>"), parse_mode="HTML")
 
     # ========== CALLBACK HANDLERS ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("admin_"))
+    @callback_router.prefix("admin_")
     async def admin_callbacks(callback: types.CallbackQuery):
         if not is_admin(callback.from_user.id):
             await callback.answer("🚫 Unauthorized", show_alert=True)
@@ -2,6 +2,8 @@
 Advanced Admin Subscription Management Panel
 Button-based, no slash commands
 """
+from html import escape
+
 from aiogram import types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.dispatcher import FSMContext
@@ -9,16 +11,20 @@ from aiogram.dispatcher.filters.state import State, StatesGroup
 from config.settings import ADMINS
 from utils.supabase_db import (
     get_all_plans, get_plan, update_plan_price, toggle_plan_active, 
-    add_stock, get_stock_count, add_credentials, update_plan_details
+    add_stock, get_stock_count, add_credentials, update_plan_details,
+    get_pending_reclaims, count_pending_reclaims, approve_credential_reclaim, retire_credential_reclaim
 )
 from utils.log_utils import send_log
 from utils.text_utils import toSmallCaps
+from utils.callback_router import callback_router, pack
+from utils.screens import ADMIN_SUBS_TEXT, ADMIN_SUBS_KB
 
 
 class AdminStockStates(StatesGroup):
     waiting_for_credentials = State()
     waiting_for_price = State()
     waiting_for_description = State()
+    waiting_for_reclaim_credential = State()
 
 
 def register_admin_subs(dp):
@@ -28,7 +34,7 @@ def register_admin_subs(dp):
         return user_id in ADMINS
     
     # ========== MAIN SUBSCRIPTIONS PANEL ==========
-    @dp.callback_query_handler(lambda c: c.data == "admin_subs_main", state="*")
+    @callback_router.exact("admin_subs_main", state="*")
     async def admin_subs_main(callback: types.CallbackQuery, state: FSMContext):
         await state.finish()
         
@@ -36,27 +42,11 @@ def register_admin_subs(dp):
             await callback.answer("🚫 Unauthorized", show_alert=True)
             return
         
-        kb = InlineKeyboardMarkup(row_width=2)
-        kb.add(
-            InlineKeyboardButton(toSmallCaps("🎵 YouTube"), callback_data="admin_ott_youtube"),
-            InlineKeyboardButton(toSmallCaps("🎬 Prime Video"), callback_data="admin_ott_prime_video"),
-            InlineKeyboardButton(toSmallCaps("📺 Netflix"), callback_data="admin_ott_netflix_4k"),
-            InlineKeyboardButton(toSmallCaps("📦 Combo"), callback_data="admin_ott_combo"),
-            InlineKeyboardButton(toSmallCaps("🔞 Pornhub"), callback_data="admin_ott_pornhub"),
-        )
-        kb.add(InlineKeyboardButton(toSmallCaps("🔙 Back to Admin"), callback_data="admin_back"))
-        
-        text = toSmallCaps(
-            "<b>📦 SUBSCRIPTION MANAGEMENT\n"
-            "━━━━━━━━━━━━━━\n\n"
-            "Select OTT Platform To Manage:</b>"
-        )
-        
-        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+        await callback.message.edit_text(ADMIN_SUBS_TEXT, parse_mode="HTML", reply_markup=ADMIN_SUBS_KB)
         await callback.answer()
     
     # ========== OTT PLAN DETAILS ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("admin_ott_"), state="*")
+    @callback_router.prefix("admin_ott_", state="*")
     async def show_ott_details(callback: types.CallbackQuery, state: FSMContext):
         await state.finish()
         
@@ -107,7 +97,7 @@ def register_admin_subs(dp):
         await callback.answer()
     
     # ========== EDIT PRICE ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("edit_price_"), state="*")
+    @callback_router.prefix("edit_price_", state="*")
     async def edit_price_start(callback: types.CallbackQuery, state: FSMContext):
         if not is_admin(callback.from_user.id):
             await callback.answer("🚫 Unauthorized", show_alert=True)
@@ -153,7 +143,7 @@ def register_admin_subs(dp):
             await message.answer(toSmallCaps("<b>❌ Invalid price! Send a number.</b>"), parse_mode="HTML")
     
     # ========== EDIT DESCRIPTION ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("edit_desc_"), state="*")
+    @callback_router.prefix("edit_desc_", state="*")
     async def edit_desc_start(callback: types.CallbackQuery, state: FSMContext):
         if not is_admin(callback.from_user.id):
             await callback.answer("🚫 Unauthorized", show_alert=True)
@@ -194,7 +184,7 @@ def register_admin_subs(dp):
         await state.finish()
     
     # ========== ADD STOCK ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("add_stock_"), state="*")
+    @callback_router.prefix("add_stock_", state="*")
     async def add_stock_start(callback: types.CallbackQuery, state: FSMContext):
         if not is_admin(callback.from_user.id):
             await callback.answer("🚫 Unauthorized", show_alert=True)
@@ -278,7 +268,7 @@ def register_admin_subs(dp):
         await state.finish()
     
     # ========== VIEW STOCK ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("view_stock_"), state="*")
+    @callback_router.prefix("view_stock_", state="*")
     async def view_stock(callback: types.CallbackQuery, state: FSMContext):
         await state.finish()
         
@@ -309,7 +299,7 @@ def register_admin_subs(dp):
         await callback.answer()
     
     # ========== TOGGLE PLAN STATUS ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("toggle_"), state="*")
+    @callback_router.prefix("toggle_", state="*")
     async def toggle_plan(callback: types.CallbackQuery, state: FSMContext):
         await state.finish()
         
@@ -329,8 +319,120 @@ def register_admin_subs(dp):
         # Refresh the display
         await show_ott_details(callback, state)
     
+    # ========== RECLAIMED CREDENTIALS ==========
+    async def show_reclaim(message: types.Message, after_id: int = 0, edit: bool = True):
+        """Show the next credential awaiting review (one at a time, oldest first)"""
+        pending = count_pending_reclaims()
+        rows = get_pending_reclaims(limit=1, after_id=after_id) or get_pending_reclaims(limit=1)
+        
+        kb = InlineKeyboardMarkup(row_width=2)
+        if not rows:
+            text = toSmallCaps("<b>♻️ RECLAIMED CREDENTIALS\n━━━━━━━━━━━━━━\n\n✅ Nothing Awaiting Review</b>")
+        else:
+            reclaim = rows[0]
+            plan = get_plan(reclaim["plan_key"])
+            text = toSmallCaps(
+                f"<b>♻️ RECLAIMED CREDENTIALS\n"
+                f"━━━━━━━━━━━━━━\n\n"
+                f"📊 Awaiting Review: {pending}\n\n"
+                f"📦 Plan: {plan['ott_name'] if plan else reclaim['plan_key']}\n"
+                f"🆔 Stock: #{reclaim['stock_id']}\n"
+                f"🔑 Previous Credential:</b>\n"
+            ) + f"<code>{escape(reclaim.get('previous_credential') or '-')}</code>"
+            rid = reclaim["id"]
+            kb.add(InlineKeyboardButton(toSmallCaps("🔑 Load Rotated Password"), callback_data=pack("reclaim", "rotate", rid)))
+            kb.add(
+                InlineKeyboardButton(toSmallCaps("✅ Resell As Is"), callback_data=pack("reclaim", "keep", rid)),
+                InlineKeyboardButton(toSmallCaps("🗑 Retire"), callback_data=pack("reclaim", "retire", rid)),
+            )
+            kb.add(InlineKeyboardButton(toSmallCaps("⏭ Next"), callback_data=pack("reclaim", "next", rid)))
+        kb.add(InlineKeyboardButton(toSmallCaps("🔙 Back"), callback_data="admin_subs_main"))
+        
+        if edit:
+            await message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+        else:
+            await message.answer(text, parse_mode="HTML", reply_markup=kb)
+    
+    @callback_router.exact("admin_reclaims", state="*")
+    async def admin_reclaims(callback: types.CallbackQuery, state: FSMContext):
+        await state.finish()
+        
+        if not is_admin(callback.from_user.id):
+            await callback.answer("🚫 Unauthorized", show_alert=True)
+            return
+        
+        await show_reclaim(callback.message)
+        await callback.answer()
+    
+    @callback_router.action("reclaim", state="*")
+    async def reclaim_action(callback: types.CallbackQuery, state: FSMContext, callback_args: tuple = ()):
+        await state.finish()
+        
+        if not is_admin(callback.from_user.id):
+            await callback.answer("🚫 Unauthorized", show_alert=True)
+            return
+        
+        action, reclaim_id = callback_args[0], int(callback_args[1])
+        admin_id = callback.from_user.id
+        
+        if action == "rotate":
+            await state.update_data(reclaim_id=reclaim_id)
+            await AdminStockStates.waiting_for_reclaim_credential.set()
+            await callback.message.edit_text(
+                toSmallCaps(
+                    "<b>🔑 Send The Rotated Credential\n\n"
+                    "Format: email:password\n\n"
+                    "Send /cancel to abort</b>"
+                ),
+                parse_mode="HTML"
+            )
+            await callback.answer()
+            return
+        
+        if action == "keep":
+            stock = approve_credential_reclaim(reclaim_id, admin_id)
+            await callback.answer("✅ Back in stock" if stock else "⚠️ Already reviewed", show_alert=not stock)
+            if stock:
+                await send_log(f"♻️ *Credential Resold As Is*\nStock: #{stock['id']}\nBy: {admin_id}")
+        elif action == "retire":
+            retired = retire_credential_reclaim(reclaim_id, admin_id)
+            await callback.answer("🗑 Retired" if retired else "⚠️ Already reviewed", show_alert=not retired)
+        else:
+            await callback.answer()
+        
+        await show_reclaim(callback.message, after_id=reclaim_id if action == "next" else 0)
+    
+    @dp.message_handler(state=AdminStockStates.waiting_for_reclaim_credential)
+    async def reclaim_rotate_finish(message: types.Message, state: FSMContext):
+        if not is_admin(message.from_user.id):
+            return
+        
+        if message.text == "/cancel":
+            await state.finish()
+            await message.answer(toSmallCaps("<b>❌ Cancelled</b>"), parse_mode="HTML")
+            return
+        
+        credential = (message.text or "").strip()
+        if ":" not in credential or "\n" in credential:
+            await message.answer(
+                toSmallCaps("<b>❌ Send one credential\n\nFormat: email:password</b>"),
+                parse_mode="HTML"
+            )
+            return
+        
+        data = await state.get_data()
+        await state.finish()
+        
+        stock = approve_credential_reclaim(data.get("reclaim_id"), message.from_user.id, credential)
+        if stock:
+            await message.answer(toSmallCaps("<b>✅ Rotated Credential Back In Stock</b>"), parse_mode="HTML")
+            await send_log(f"♻️ *Credential Rotated*\nStock: #{stock['id']}\nBy: {message.from_user.id}")
+        else:
+            await message.answer(toSmallCaps("<b>⚠️ Already Reviewed</b>"), parse_mode="HTML")
+        await show_reclaim(message, edit=False)
+    
     # ========== BACK TO ADMIN ==========
-    @dp.callback_query_handler(lambda c: c.data == "admin_back", state="*")
+    @callback_router.exact("admin_back", state="*")
     async def admin_back(callback: types.CallbackQuery, state: FSMContext):
         await state.finish()
         
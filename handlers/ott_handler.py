@@ -2,15 +2,21 @@ from aiogram import types, Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from config.settings import PLANS, BOT_TOKEN, FORCE_SUBSCRIBE_CHANNEL_LINK
+from config.settings import PLANS, BOT_TOKEN
 from utils.supabase_db import (
     add_subscription, get_wallet_balance, deduct_wallet, get_plan, 
-    get_unused_credential, mark_credential_used, create_transaction,
+    get_unused_credential, create_transaction,
     allocate_combo_credentials, update_wallet
 )
 from utils.log_utils import log_event
 from utils.force_subscribe import is_user_subscribed
 from utils.text_utils import toSmallCaps
+from utils.callback_router import callback_router
+from utils.credential_pool import credential_pool
+from utils.screens import (
+    FORCE_SUBSCRIBE_TEXT, FORCE_SUBSCRIBE_KB, BUY_OTTS_TEXT, BUY_OTTS_KB,
+    PLAN_SCREENS, OTT_BACK_TO_MAIN_TEXT, OTT_BACK_TO_MAIN_KB
+)
 import random
 from datetime import datetime, timedelta
 
@@ -25,7 +31,7 @@ YT_LOGS_CHANNEL = -1002780521171
 
 def register_ott(dp):
     # 🎬 Main OTT Menu
-    @dp.callback_query_handler(lambda c: c.data == "menu_buy_otts")
+    @callback_router.exact("menu_buy_otts")
     async def menu_buy_otts(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         
@@ -33,146 +39,27 @@ def register_ott(dp):
         is_subscribed = await is_user_subscribed(user_id)
         if not is_subscribed:
             await callback_query.answer("⚠️ Please join our channel first!", show_alert=True)
-            force_subscribe_text = (
-                "👋 Hi, I am OTTSONLY Bot\n\n"
-                "Here you can get YouTube Premium at just ₹25.\n\n"
-                "👉 Join our official channel to access this store."
-            )
-            kb = InlineKeyboardMarkup(row_width=1)
-            kb.add(
-                InlineKeyboardButton("📢 JOIN CHANNEL", url=FORCE_SUBSCRIBE_CHANNEL_LINK),
-                InlineKeyboardButton("✅ VERIFY", callback_data="verify_subscription")
-            )
-            await callback_query.message.edit_text(force_subscribe_text, reply_markup=kb)
+            await callback_query.message.edit_text(FORCE_SUBSCRIBE_TEXT, reply_markup=FORCE_SUBSCRIBE_KB)
             return
         
-        kb = InlineKeyboardMarkup(row_width=1)
-        kb.add(
-            InlineKeyboardButton(toSmallCaps("📺 Netflix 4K"), callback_data="plan_netflix"),
-            InlineKeyboardButton(toSmallCaps("🎬 Prime Video"), callback_data="plan_prime"),
-            InlineKeyboardButton(toSmallCaps("🎵 YouTube Premium"), callback_data="plan_youtube"),
-            InlineKeyboardButton(toSmallCaps("🔥 Pornhub Premium"), callback_data="plan_pornhub"),
-            InlineKeyboardButton(toSmallCaps("🎁 Combo Pack"), callback_data="plan_combo"),
-            InlineKeyboardButton(toSmallCaps("⬅️ Back"), callback_data="back_to_main")
-        )
         await callback_query.message.edit_text(
-            toSmallCaps("<b>🎬 Choose Your OTT Platform:</b>"),
+            BUY_OTTS_TEXT,
             parse_mode="HTML",
-            reply_markup=kb
-        )
-        await callback_query.answer()
-
-    # --- PLAN DETAILS HANDLERS ---
-
-    @dp.callback_query_handler(lambda c: c.data == "plan_netflix")
-    async def plan_netflix(callback_query: types.CallbackQuery):
-        price = PLANS['netflix_4k']['price']
-        text = toSmallCaps(
-            f"<b>📺 NETFLIX PREMIUM 4K\n\n"
-            f"• Private Screen\n"
-            f"• TV/Laptop Supported\n"
-            f"• 4K + HDR\n"
-            f"• Price : 75₹ / Month\n\n"
-            f"🕒 Validity: 1 Month\n"
-            f"💳 PRICE: ₹{price}</b>"
-        )
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton(toSmallCaps("💰 Buy Now"), callback_data="buy:netflix_4k"))
-        kb.add(InlineKeyboardButton(toSmallCaps("⬅️ Back"), callback_data="menu_buy_otts"))
-        await callback_query.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-        await callback_query.answer()
-
-    @dp.callback_query_handler(lambda c: c.data == "plan_prime")
-    async def plan_prime(callback_query: types.CallbackQuery):
-        price = PLANS['prime_video']['price']
-        text = toSmallCaps(
-            f"<b>🎬 PRIME VIDEO\n\n"
-            f"• Private Single Screen\n"
-            f"• HD 1080p\n"
-            f"• No ads\n"
-            f"• Price : 35₹/Month\n\n"
-            f"🕒 Validity: 1 Month\n"
-            f"💳 PRICE: ₹{price}</b>"
-        )
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton(toSmallCaps("💰 Buy Now"), callback_data="buy:prime_video"))
-        kb.add(InlineKeyboardButton(toSmallCaps("⬅️ Back"), callback_data="menu_buy_otts"))
-        await callback_query.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-        await callback_query.answer()
-
-    @dp.callback_query_handler(lambda c: c.data == "plan_youtube")
-    async def plan_youtube(callback_query: types.CallbackQuery):
-        price = PLANS['youtube']['price']
-        text = toSmallCaps(
-            f"<b>▶️ YOUTUBE PREMIUM\n\n"
-            f"• No Ads\n"
-            f"• Background Play\n"
-            f"• YouTube Music\n"
-            f"• On your mail\n"
-            f"• Price 25₹/ Month\n\n"
-            f"🕒 Validity: 1 Month\n"
-            f"💳 PRICE: ₹{price}</b>"
+            reply_markup=BUY_OTTS_KB
         )
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton(toSmallCaps("💰 Buy Now"), callback_data="buy:youtube"))
-        kb.add(InlineKeyboardButton(toSmallCaps("⬅️ Back"), callback_data="menu_buy_otts"))
-        await callback_query.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
         await callback_query.answer()
 
-    @dp.callback_query_handler(lambda c: c.data == "plan_pornhub")
-    async def plan_pornhub(callback_query: types.CallbackQuery):
-        price = PLANS['pornhub']['price']
-        text = toSmallCaps(
-            f"<b>🔥 PORNHUB PREMIUM\n\n"
-            f"✅ Private Single Screen\n"
-            f"💎 Max Quality (1080p/4K)\n"
-            f"💻 TV / PC / Mobile Supported\n"
-            f"🕒 Validity: 1 Month\n"
-            f"💳 PRICE: ₹{price}</b>"
-        )
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton(toSmallCaps("💰 Buy Now"), callback_data="buy:pornhub"))
-        kb.add(InlineKeyboardButton(toSmallCaps("⬅️ Back"), callback_data="menu_buy_otts"))
-        await callback_query.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-        await callback_query.answer()
+    # --- PLAN DETAILS HANDLER ---
 
-    @dp.callback_query_handler(lambda c: c.data == "plan_combo")
-    async def plan_combo(callback_query: types.CallbackQuery):
-        price = PLANS['combo']['price']
-        text = toSmallCaps(
-            f"<b>🎁 OTT COMBO PACK\n\n"
-            f"📺 NETFLIX PREMIUM 4K\n"
-            f"• Private Screen\n"
-            f"• TV/Laptop Supported\n"
-            f"• 4K + HDR\n"
-            f"• Price: 75₹ / Month\n\n"
-            f"🎬 PRIME VIDEO\n"
-            f"• Private Single Screen\n"
-            f"• HD 1080p\n"
-            f"• No ads\n"
-            f"• Price: 35₹/Month\n\n"
-            f"▶️ YOUTUBE PREMIUM\n"
-            f"• No Ads\n"
-            f"• Background Play\n"
-            f"• YouTube Music\n"
-            f"• On your mail\n"
-            f"• Price: 25₹/ Month\n\n"
-            f"+\n\n"
-            f"🔞 FREE: PORNHUB PREMIUM\n"
-            f"• Full Access\n"
-            f"• HD Quality (free with combo)\n\n"
-            f"🕒 Validity: 1 Month\n"
-            f"💳 PRICE: ₹{price}</b>"
-        )
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton(toSmallCaps("💰 Buy Now"), callback_data="buy:combo"))
-        kb.add(InlineKeyboardButton(toSmallCaps("⬅️ Back"), callback_data="menu_buy_otts"))
+    @callback_router.exact(*PLAN_SCREENS)
+    async def plan_details(callback_query: types.CallbackQuery):
+        text, kb = PLAN_SCREENS[callback_query.data]
         await callback_query.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
         await callback_query.answer()
 
     # --- PURCHASE HANDLER ---
 
-    @dp.callback_query_handler(lambda c: c.data and c.data.startswith("buy:"), state="*")
+    @callback_router.prefix("buy:", state="*")
     async def buy_callback(callback_query: types.CallbackQuery, state: FSMContext):
         _, plan_key = callback_query.data.split(":", 1)
         plan = PLANS.get(plan_key)
@@ -284,7 +171,7 @@ def register_ott(dp):
                 )
                 await log_event("PURCHASE_FAILED", {
                     "user_id": uid,
-                    "name": message.from_user.full_name,
+                    "name": callback_query.from_user.full_name,
                     "username": username,
                     "plan_name": "Combo Plan",
                     "reason": f"Out of stock - Missing: {missing}"
@@ -386,7 +273,7 @@ def register_ott(dp):
             # Log combo purchase
             await log_event("PURCHASE_SUCCESS", {
                 "user_id": uid,
-                "name": message.from_user.full_name,
+                "name": callback_query.from_user.full_name,
                 "username": username,
                 "plan_name": "Combo Plan",
                 "price": price
@@ -396,9 +283,9 @@ def register_ott(dp):
             return
         
         # Regular flow for other plans
-        # Check stock availability
-        credential = get_unused_credential(plan_key)
-        if not credential:
+        # Check stock availability: leased hot pool first (no round-trip), shared stock otherwise
+        lease = credential_pool.take(plan_key)
+        if lease is None and not get_unused_credential(plan_key):
             await callback_query.message.answer(
                 toSmallCaps("<b>❌ Out Of Stock!\n\nThis Plan Is Temporarily Unavailable. Please Check Back Later.</b>"),
                 parse_mode="HTML"
@@ -417,6 +304,7 @@ def register_ott(dp):
         bal = get_wallet_balance(uid)
 
         if bal < price:
+            credential_pool.give_back(plan_key, lease)
             await callback_query.message.answer(
                 toSmallCaps("<b>❌ Insufficient Wallet Balance! Please Add Funds First.</b>"),
                 parse_mode="HTML"
@@ -434,15 +322,25 @@ def register_ott(dp):
         # Deduct wallet
         success = deduct_wallet(uid, price)
         if not success:
+            credential_pool.give_back(plan_key, lease)
             await callback_query.message.answer(toSmallCaps("<b>⚠️ Wallet Deduction Failed. Try Again.</b>"), parse_mode="HTML")
             await callback_query.answer()
             return
 
         # Mark credential as used
-        mark_credential_used(plan_key, credential, uid)
+        credential = credential_pool.deliver(plan_key, lease, uid)
+        if not credential:
+            # Stock ran out between the check and delivery
+            update_wallet(uid, price)
+            await callback_query.message.answer(
+                toSmallCaps("<b>❌ Out Of Stock!\n\nYour Wallet Has Been Refunded. Please Check Back Later.</b>"),
+                parse_mode="HTML"
+            )
+            await callback_query.answer()
+            return
         
-        # Add subscription
-        add_subscription(uid, plan_key)
+        # Add subscription (credential recorded so it can be reclaimed on expiry)
+        add_subscription(uid, plan_key, credential)
         new_balance = get_wallet_balance(uid)
         order_id = f"{plan_key.upper()}{random.randint(1000, 9999)}"
 
@@ -504,20 +402,13 @@ def register_ott(dp):
 
 
     # --- BACK TO MAIN MENU ---
-    @dp.callback_query_handler(lambda c: c.data == "back_to_main", state="*")
+    @callback_router.exact("back_to_main", state="*")
     async def back_to_main(callback: types.CallbackQuery, state: FSMContext):
         await state.finish()
-        kb = InlineKeyboardMarkup(row_width=1)
-        kb.add(
-            InlineKeyboardButton(toSmallCaps("💳 Add Funds"), callback_data="add_funds"),
-            InlineKeyboardButton(toSmallCaps("🎬 Buy OTT Subscriptions"), callback_data="menu_buy_otts"),
-            InlineKeyboardButton(toSmallCaps("🎁 Refer & Earn"), callback_data="refer"),
-            InlineKeyboardButton(toSmallCaps("⚙️ Settings"), callback_data="menu_settings")
-        )
         await callback.message.edit_text(
-            toSmallCaps("<b>🏠 Main Menu - Choose An Option Below:</b>"),
+            OTT_BACK_TO_MAIN_TEXT,
             parse_mode="HTML",
-            reply_markup=kb
+            reply_markup=OTT_BACK_TO_MAIN_KB
         )
         await callback.answer()
 
@@ -543,7 +434,7 @@ def register_ott(dp):
             reply_markup=kb
         )
     
-    @dp.callback_query_handler(lambda c: c.data == "yt_edit_email", state=YouTubeStates.confirming_email)
+    @callback_router.exact("yt_edit_email", state=YouTubeStates.confirming_email)
     async def youtube_edit_email(callback: types.CallbackQuery, state: FSMContext):
         await YouTubeStates.waiting_for_email.set()
         
@@ -558,7 +449,7 @@ def register_ott(dp):
         )
         await callback.answer()
     
-    @dp.callback_query_handler(lambda c: c.data == "yt_confirm_email", state=YouTubeStates.confirming_email)
+    @callback_router.exact("yt_confirm_email", state=YouTubeStates.confirming_email)
     async def youtube_confirm_email(callback: types.CallbackQuery, state: FSMContext):
         data = await state.get_data()
         email = data.get("email")
@@ -612,7 +503,7 @@ def register_ott(dp):
         await state.finish()
         await callback.answer()
     
-    @dp.callback_query_handler(lambda c: c.data and c.data.startswith("yt_done_"), state="*")
+    @callback_router.prefix("yt_done_", state="*")
     async def youtube_done_admin(callback: types.CallbackQuery):
         parts = callback.data.split("_", 3)  # Split into max 4 parts
         user_id = int(parts[2])
@@ -2,12 +2,13 @@ from aiogram import types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from utils.supabase_db import get_user, get_referral_stats
 from utils.text_utils import toSmallCaps
+from utils.callback_router import callback_router
 from config.settings import REFERRAL_BASE_URL, FORCE_SUBSCRIBE_CHANNEL_LINK
 from utils.force_subscribe import is_user_subscribed
 
 
 def register_profile(dp):
-    @dp.callback_query_handler(lambda c: c.data == "menu_profile")
+    @callback_router.exact("menu_profile")
     async def menu_profile(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         
@@ -66,7 +67,7 @@ def register_profile(dp):
 
 
     # ========== REFER & EARN MENU ==========
-    @dp.callback_query_handler(lambda c: c.data == "menu_refer")
+    @callback_router.exact("menu_refer")
     async def menu_refer(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         
@@ -142,7 +143,7 @@ def register_profile(dp):
 
 
     # ========== DETAILED REFERRAL STATS ==========
-    @dp.callback_query_handler(lambda c: c.data == "refer_stats")
+    @callback_router.exact("refer_stats")
     async def refer_stats(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         stats = get_referral_stats(user_id)
@@ -183,7 +184,7 @@ def register_profile(dp):
 
 
     # ========== WITHDRAW EARNINGS ==========
-    @dp.callback_query_handler(lambda c: c.data == "refer_withdraw")
+    @callback_router.exact("refer_withdraw")
     async def refer_withdraw(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         stats = get_referral_stats(user_id)
@@ -218,7 +219,7 @@ def register_profile(dp):
 
 
     # ========== REQUEST WITHDRAWAL ==========
-    @dp.callback_query_handler(lambda c: c.data == "refer_withdraw_request")
+    @callback_router.exact("refer_withdraw_request")
     async def refer_withdraw_request(callback_query: types.CallbackQuery):
         await callback_query.message.answer(
             toSmallCaps(
@@ -6,6 +6,8 @@ from aiogram.dispatcher import Dispatcher
 from config.settings import RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET, FORCE_SUBSCRIBE_CHANNEL_LINK
 from utils.supabase_db import update_wallet, get_user
 from utils.text_utils import toSmallCaps
+from utils.callback_router import callback_router
+from utils.metrics import PAYMENT_VERIFICATIONS
 from utils.log_utils import log_event
 from utils.force_subscribe import is_user_subscribed
 
@@ -13,7 +15,7 @@ from utils.force_subscribe import is_user_subscribed
 def register_wallet_handlers(dp: Dispatcher):
 
     # 💰 Main Add Funds Menu
-    @dp.callback_query_handler(lambda c: c.data == "add_funds")
+    @callback_router.exact("add_funds")
     async def add_funds_menu(callback: types.CallbackQuery):
         user_id = callback.from_user.id
         
@@ -49,7 +51,7 @@ def register_wallet_handlers(dp: Dispatcher):
         )
 
     # 🎯 Create Razorpay Order
-    @dp.callback_query_handler(lambda c: c.data.startswith("add_"))
+    @callback_router.prefix("add_")
     async def create_razorpay_order(callback: types.CallbackQuery):
         amount = int(callback.data.split("_")[1])
         user_id = callback.from_user.id
@@ -91,7 +93,7 @@ def register_wallet_handlers(dp: Dispatcher):
             )
 
     # ✅ Verify Payment + Referral Reward
-    @dp.callback_query_handler(lambda c: c.data.startswith("verify_payment_"))
+    @callback_router.prefix("verify_payment_")
     async def verify_payment(callback: types.CallbackQuery):
         _, order_id, amount = callback.data.split("_")
         amount = int(amount)
@@ -107,17 +109,20 @@ def register_wallet_handlers(dp: Dispatcher):
         )
 
         if res.status_code != 200:
+            PAYMENT_VERIFICATIONS.inc(gateway="razorpay", outcome="error")
             await callback.message.answer(toSmallCaps("<b>⚠️ Unable To Verify Payment, Please Try Again Later.</b>"), parse_mode="HTML")
             return
 
         data = res.json()
         if "items" not in data or len(data["items"]) == 0:
+            PAYMENT_VERIFICATIONS.inc(gateway="razorpay", outcome="pending")
             await callback.message.answer(toSmallCaps("<b>⚠️ No Payment Found Yet For This Order.</b>"), parse_mode="HTML")
             return
 
         payment = data["items"][0]
         status = payment["status"]
 
+        PAYMENT_VERIFICATIONS.inc(gateway="razorpay", outcome="success" if status == "captured" else "pending")
         if status == "captured":
             # ✅ Main wallet credit
             update_wallet(user_id, amount)
@@ -1,10 +1,13 @@
 from aiogram import types
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from utils.supabase_db import create_user_if_not_exists, get_user
 from utils.log_utils import log_event
 from utils.force_subscribe import is_user_subscribed
-from config.settings import REFERRAL_BASE_URL, FORCE_SUBSCRIBE_CHANNEL_LINK
-from utils.text_utils import toSmallCaps
+from utils.callback_router import callback_router
+from config.settings import REFERRAL_BASE_URL
+from utils.screens import (
+    FORCE_SUBSCRIBE_TEXT, FORCE_SUBSCRIBE_KB, WELCOME_TEMPLATE, MAIN_MENU_KB,
+    BACK_TO_MAIN_TEXT, BACK_TO_MAIN_KB
+)
 
 
 def register_start(dp):
@@ -27,21 +30,8 @@ def register_start(dp):
         is_subscribed = await is_user_subscribed(user_id)
         
         if not is_subscribed:
-            # Show force subscribe message
-            force_subscribe_text = (
-                "👋 Hi, I am OTTSONLY Bot\n\n"
-                "Here you can get YouTube Premium at just ₹25.\n\n"
-                "👉 Join our official channel to access this store."
-            )
-            
-            # Create keyboard with Join Channel and Verify buttons
-            kb = InlineKeyboardMarkup(row_width=1)
-            kb.add(
-                InlineKeyboardButton("📢 JOIN CHANNEL", url=FORCE_SUBSCRIBE_CHANNEL_LINK),
-                InlineKeyboardButton("✅ VERIFY", callback_data="verify_subscription")
-            )
-            
-            await message.answer(force_subscribe_text, reply_markup=kb)
+            # Show force subscribe message with Join Channel and Verify buttons
+            await message.answer(FORCE_SUBSCRIBE_TEXT, reply_markup=FORCE_SUBSCRIBE_KB)
             return
         
         # ============================================
@@ -82,32 +72,14 @@ def register_start(dp):
         referral_link = f"{REFERRAL_BASE_URL}{user_id}"
 
         # Welcome message
-        welcome_text = toSmallCaps(
-            f"<b>Welcome to ottsonly, {name}\n"
-            f"🚀 OTT SUBSCRIPTIONS AT BEST PRICES\n"
-            f"Netflix • Prime • YouTube • Spotify & more\n\n"
-            f"⚡ Instant access\n"
-            f"🔒 100% trusted\n"
-            f"💎 Premium quality</b>"
-        )
+        welcome_text = WELCOME_TEMPLATE.format(name=name)
 
-        # Inline keyboard
-        kb = InlineKeyboardMarkup(row_width=2)
-        kb.add(
-            InlineKeyboardButton(toSmallCaps("💳 Add Funds"), callback_data="menu_add_funds"),
-            InlineKeyboardButton(toSmallCaps("🎬 Buy OTTs"), callback_data="menu_buy_otts"),
-            InlineKeyboardButton(toSmallCaps("🎁 Refer & Earn"), callback_data="menu_refer"),
-            InlineKeyboardButton(toSmallCaps("👤 Profile"), callback_data="menu_profile"),
-            InlineKeyboardButton(toSmallCaps("📚 Tutorial"), url="https://t.me/+yEMiVMf-mkBmOWE1"),
-            InlineKeyboardButton(toSmallCaps("💬 Support"), url="https://t.me/ottsonly1")
-        )
-
-        await message.answer(welcome_text, parse_mode="HTML", reply_markup=kb)
+        await message.answer(welcome_text, parse_mode="HTML", reply_markup=MAIN_MENU_KB)
         # Removed noisy /start log - only log referral joins
 
 
     # ========== VERIFY SUBSCRIPTION CALLBACK ==========
-    @dp.callback_query_handler(lambda c: c.data == "verify_subscription")
+    @callback_router.exact("verify_subscription")
     async def verify_subscription(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         name = callback_query.from_user.full_name
@@ -123,26 +95,8 @@ def register_start(dp):
             create_user_if_not_exists(user_id, name)
             
             # Show main menu
-            welcome_text = toSmallCaps(
-                f"<b>Welcome to ottsonly, {name}\n"
-                f"🚀 OTT SUBSCRIPTIONS AT BEST PRICES\n"
-                f"Netflix • Prime • YouTube • Spotify & more\n\n"
-                f"⚡ Instant access\n"
-                f"🔒 100% trusted\n"
-                f"💎 Premium quality</b>"
-            )
-            
-            kb = InlineKeyboardMarkup(row_width=2)
-            kb.add(
-                InlineKeyboardButton(toSmallCaps("💳 Add Funds"), callback_data="menu_add_funds"),
-                InlineKeyboardButton(toSmallCaps("🎬 Buy OTTs"), callback_data="menu_buy_otts"),
-                InlineKeyboardButton(toSmallCaps("🎁 Refer & Earn"), callback_data="menu_refer"),
-                InlineKeyboardButton(toSmallCaps("👤 Profile"), callback_data="menu_profile"),
-                InlineKeyboardButton(toSmallCaps("📚 Tutorial"), url="https://t.me/+yEMiVMf-mkBmOWE1"),
-                InlineKeyboardButton(toSmallCaps("💬 Support"), url="https://t.me/ottsonly1")
-            )
-            
-            await callback_query.message.edit_text(welcome_text, parse_mode="HTML", reply_markup=kb)
+            welcome_text = WELCOME_TEMPLATE.format(name=name)
+            await callback_query.message.edit_text(welcome_text, parse_mode="HTML", reply_markup=MAIN_MENU_KB)
             
         else:
             # ❌ User has NOT joined yet
@@ -152,54 +106,23 @@ def register_start(dp):
             )
             
             # Keep showing the same Join + Verify buttons
-            force_subscribe_text = (
-                "👋 Hi, I am OTTSONLY Bot\n\n"
-                "Here you can get YouTube Premium at just ₹25.\n\n"
-                "👉 Join our official channel to access this store."
-            )
-            
-            kb = InlineKeyboardMarkup(row_width=1)
-            kb.add(
-                InlineKeyboardButton("📢 JOIN CHANNEL", url=FORCE_SUBSCRIBE_CHANNEL_LINK),
-                InlineKeyboardButton("✅ VERIFY", callback_data="verify_subscription")
-            )
-            
-            await callback_query.message.edit_text(force_subscribe_text, reply_markup=kb)
+            await callback_query.message.edit_text(FORCE_SUBSCRIBE_TEXT, reply_markup=FORCE_SUBSCRIBE_KB)
 
     # ========== BACK TO MAIN MENU ==========
-    @dp.callback_query_handler(lambda c: c.data == "back_to_main")
+    @callback_router.exact("back_to_main")
     async def back_to_main(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         
         # Force subscribe check
         is_subscribed = await is_user_subscribed(user_id)
         if not is_subscribed:
-            force_subscribe_text = (
-                "👋 Hi, I am OTTSONLY Bot\n\n"
-                "Here you can get YouTube Premium at just ₹25.\n\n"
-                "👉 Join our official channel to access this store."
-            )
-            kb = InlineKeyboardMarkup(row_width=1)
-            kb.add(
-                InlineKeyboardButton("📢 JOIN CHANNEL", url=FORCE_SUBSCRIBE_CHANNEL_LINK),
-                InlineKeyboardButton("✅ VERIFY", callback_data="verify_subscription")
-            )
-            await callback_query.message.edit_text(force_subscribe_text, reply_markup=kb)
+            await callback_query.message.edit_text(FORCE_SUBSCRIBE_TEXT, reply_markup=FORCE_SUBSCRIBE_KB)
             return
         
         # Show main menu
-        kb = InlineKeyboardMarkup(row_width=2)
-        kb.add(
-            InlineKeyboardButton(toSmallCaps("💳 Add Funds"), callback_data="menu_add_funds"),
-            InlineKeyboardButton(toSmallCaps("🎬 Buy OTT Subscriptions"), callback_data="menu_buy_otts"),
-            InlineKeyboardButton(toSmallCaps("🎁 Refer & Earn"), callback_data="menu_refer"),
-            InlineKeyboardButton(toSmallCaps("👤 Profile"), callback_data="menu_profile"),
-            InlineKeyboardButton(toSmallCaps("📚 Tutorial"), url="https://t.me/+yEMiVMf-mkBmOWE1"),
-            InlineKeyboardButton(toSmallCaps("💬 Support"), url="https://t.me/ottsonly1")
-        )
         await callback_query.message.edit_text(
-            toSmallCaps("<b>🏠 Main Menu — Choose An Option Below:</b>"),
+            BACK_TO_MAIN_TEXT,
             parse_mode="HTML",
-            reply_markup=kb
+            reply_markup=BACK_TO_MAIN_KB
         )
         await callback_query.answer()
@@ -2,21 +2,25 @@
 import time
 import random
 import string
-import qrcode
 import requests
-from io import BytesIO
 from datetime import datetime
 from aiogram import types
+from aiogram.dispatcher import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InputFile
 from config.settings import (
     UPI_ID,
     MERCHANT_ID,
     PAY_VERIFY_API,
-    FORCE_SUBSCRIBE_CHANNEL_LINK,
 )
 from utils.supabase_db import update_wallet, get_user, get_wallet_balance, create_user_if_not_exists
 from utils.log_utils import send_log, log_event
 from utils.text_utils import toSmallCaps
+from utils.qr_utils import render_qr
+from utils.callback_router import callback_router, pack
+from utils.metrics import PAYMENT_VERIFICATIONS
+from utils.screens import (
+    FORCE_SUBSCRIBE_TEXT, FORCE_SUBSCRIBE_KB, ADD_FUNDS_TEXT, ADD_FUNDS_KB, PAYMENT_QR_TEMPLATE
+)
 from utils.force_subscribe import is_user_subscribed
 
 
@@ -25,8 +29,8 @@ def register_wallet(dp):
     Handles wallet top-up using UPI QR code payment gateway with Paytm Merchant.
     """
 
-    # Track users waiting to enter custom amount
-    waiting_for_custom_amount = {}
+    # Users waiting to enter a custom amount are flagged in FSM storage data
+    # (not FSM state, so other commands keep working), shared across webhook workers
 
     # ========== HELPER FUNCTIONS ==========
     
@@ -35,8 +39,8 @@ def register_wallet(dp):
         ts = datetime.now().strftime("%Y%m%d%H%M%S")
         return f"M-{user_id}-{ts}"
 
-    def generate_qr(plan_name, amount, order_id):
-        """Generate UPI QR code for payment"""
+    async def generate_qr(plan_name, amount, order_id):
+        """Generate UPI QR code for payment (rendered in the QR worker pool)"""
         upi = (
             f"upi://pay?pa={UPI_ID}"
             f"&pn={plan_name}"
@@ -45,11 +49,7 @@ def register_wallet(dp):
             f"&am={amount}"
             f"&cu=INR"
         )
-        img = qrcode.make(upi)
-        bio = BytesIO()
-        bio.name = "payment_qr.png"
-        img.save(bio, "PNG")
-        bio.seek(0)
+        bio = await render_qr(upi)
         return bio, upi
 
     def verify_payment(order_id):
@@ -79,7 +79,7 @@ def register_wallet(dp):
             return None
 
     # ========== MENU: Add Funds ==========
-    @dp.callback_query_handler(lambda c: c.data == "menu_add_funds")
+    @callback_router.exact("menu_add_funds")
     async def menu_add_funds(callback_query: types.CallbackQuery):
         user_id = callback_query.from_user.id
         
@@ -87,36 +87,21 @@ def register_wallet(dp):
         is_subscribed = await is_user_subscribed(user_id)
         if not is_subscribed:
             await callback_query.answer("⚠️ Please join our channel first!", show_alert=True)
-            force_subscribe_text = (
-                "👋 Hi, I am OTTSONLY Bot\n\n"
-                "Here you can get YouTube Premium at just ₹25.\n\n"
-                "👉 Join our official channel to access this store."
-            )
-            kb = InlineKeyboardMarkup(row_width=1)
-            kb.add(
-                InlineKeyboardButton("📢 JOIN CHANNEL", url=FORCE_SUBSCRIBE_CHANNEL_LINK),
-                InlineKeyboardButton("✅ VERIFY", callback_data="verify_subscription")
-            )
-            await callback_query.message.edit_text(force_subscribe_text, reply_markup=kb)
+            await callback_query.message.edit_text(FORCE_SUBSCRIBE_TEXT, reply_markup=FORCE_SUBSCRIBE_KB)
             return
         
-        kb = InlineKeyboardMarkup(row_width=1)
-        kb.add(
-            InlineKeyboardButton(toSmallCaps("✏️ Enter Custom Amount"), callback_data="addfunds_custom")
-        )
-        kb.add(InlineKeyboardButton(toSmallCaps("⬅️ Back"), callback_data="back_to_main"))
         await callback_query.message.edit_text(
-            toSmallCaps("<b>💰 Add Funds To Your Wallet\n\nClick Below To Enter Any Amount You Want:</b>"),
+            ADD_FUNDS_TEXT,
             parse_mode="HTML",
-            reply_markup=kb,
+            reply_markup=ADD_FUNDS_KB,
         )
         await callback_query.answer()
 
     # ========== ASK FOR CUSTOM AMOUNT ==========
-    @dp.callback_query_handler(lambda c: c.data == "addfunds_custom")
-    async def ask_custom_amount(callback_query: types.CallbackQuery):
+    @callback_router.exact("addfunds_custom")
+    async def ask_custom_amount(callback_query: types.CallbackQuery, state: FSMContext):
         user_id = callback_query.from_user.id
-        waiting_for_custom_amount[user_id] = True
+        await state.update_data(waiting_for_custom_amount=True)
         
         # Delete previous messages for cleaner interface
         try:
@@ -133,15 +118,16 @@ def register_wallet(dp):
 
     # ========== HANDLE CUSTOM AMOUNT INPUT ==========
     @dp.message_handler(lambda message: message.text and message.text.isdigit())
-    async def handle_custom_amount_input(message: types.Message):
+    async def handle_custom_amount_input(message: types.Message, state: FSMContext):
         user_id = message.from_user.id
         
         # Check if user is waiting to enter custom amount
-        if user_id not in waiting_for_custom_amount:
+        data = await state.get_data()
+        if not data.get("waiting_for_custom_amount"):
             return  # Not waiting for custom amount
         
         # Clear the flag
-        del waiting_for_custom_amount[user_id]
+        await state.update_data(waiting_for_custom_amount=False)
         
         amount = int(message.text)
         
@@ -173,19 +159,13 @@ def register_wallet(dp):
             order_id = generate_order_id(user_id)
             
             # Generate QR code
-            qr_buffer, upi_string = generate_qr("OTTOnly Wallet", amount, order_id)
+            qr_buffer, upi_string = await generate_qr("OTTOnly Wallet", amount, order_id)
             
             # Send QR code image
-            text = toSmallCaps(
-                f"<b>💳 Payment QR Code Generated!\n\n"
-                f"💰 Amount: ₹{amount}\n"
-                f"🆔 Order ID: {order_id}\n\n"
-                f"📱 Scan QR Code To Pay\n"
-                f"Or Click 'Check Status' After Payment.</b>"
-            )
+            text = PAYMENT_QR_TEMPLATE.format(amount=amount, order_id=order_id)
 
             kb = InlineKeyboardMarkup().add(
-                InlineKeyboardButton(toSmallCaps("✅ Check Payment Status"), callback_data=f"checkpay_{order_id}_{amount}")
+                InlineKeyboardButton(toSmallCaps("✅ Check Payment Status"), callback_data=pack("checkpay", order_id, amount))
             )
             
             # Send QR code as photo
@@ -204,7 +184,7 @@ def register_wallet(dp):
             await send_log(f"❌ *Payment QR Failed (Custom)*\n👤 User: `{user_id}` (@{username})\n💰 Amount: ₹{amount}\n🚨 Error: {str(e)}")
 
     # ========== CREATE PAYMENT & SEND QR CODE ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("addfunds_") and c.data != "addfunds_custom")
+    @callback_router.prefix("addfunds_")
     async def process_addfunds(callback_query: types.CallbackQuery):
         amount = int(callback_query.data.split("_")[1])
         user_id = callback_query.from_user.id
@@ -215,19 +195,13 @@ def register_wallet(dp):
             order_id = generate_order_id(user_id)
             
             # Generate QR code
-            qr_buffer, upi_string = generate_qr("OTTOnly Wallet", amount, order_id)
+            qr_buffer, upi_string = await generate_qr("OTTOnly Wallet", amount, order_id)
             
             # Send QR code image
-            text = toSmallCaps(
-                f"<b>ðŸ’³ Payment QR Code Generated!\n\n"
-                f"ðŸ’° Amount: â‚¹{amount}\n"
-                f"ðŸ†” Order ID: {order_id}\n\n"
-                f"ðŸ“± Scan QR Code To Pay\n"
-                f"Or Click 'Check Status' After Payment.</b>"
-            )
+            text = PAYMENT_QR_TEMPLATE.format(amount=amount, order_id=order_id)
 
             kb = InlineKeyboardMarkup().add(
-                InlineKeyboardButton(toSmallCaps("âœ… Check Payment Status"), callback_data=f"checkpay_{order_id}_{amount}")
+                InlineKeyboardButton(toSmallCaps("âœ… Check Payment Status"), callback_data=pack("checkpay", order_id, amount))
             )
             
             # Send QR code as photo
@@ -251,13 +225,19 @@ def register_wallet(dp):
             await send_log(f"âŒ *Payment QR Failed*\nðŸ‘¤ User: `{user_id}` (@{username})\nðŸ’° Amount: â‚¹{amount}\nðŸš¨ Error: {str(e)}")
 
     # ========== CHECK PAYMENT STATUS ==========
-    @dp.callback_query_handler(lambda c: c.data.startswith("checkpay_"))
-    async def check_payment_status(callback_query: types.CallbackQuery):
+    @callback_router.action("checkpay")
+    @callback_router.prefix("checkpay_")
+    async def check_payment_status(callback_query: types.CallbackQuery, callback_args: tuple = ()):
         print(f"[PAYMENT CHECK] Handler triggered! Callback data: {callback_query.data}")
-        
-        # Parse callback data: checkpay_ORDER_ID_AMOUNT
-        parts = callback_query.data.split("_")
+
+        if callback_args:
+            # Structured data: pack("checkpay", ORDER_ID, AMOUNT)
+            parts = ["checkpay", *callback_args]
+        else:
+            # Legacy buttons on older messages: checkpay_ORDER_ID_AMOUNT
+            parts = callback_query.data.split("_")
         if len(parts) < 3:
+            PAYMENT_VERIFICATIONS.inc(gateway="paytm", outcome="invalid")
             await callback_query.answer("âŒ Invalid payment data", show_alert=True)
             return
             
@@ -285,6 +265,7 @@ def register_wallet(dp):
                 processed_payments = user_data.get("processed_payments", [])
                 
                 if order_id in processed_payments:
+                    PAYMENT_VERIFICATIONS.inc(gateway="paytm", outcome="duplicate")
                     await callback_query.message.edit_caption(
                         caption=toSmallCaps("<b>âœ… This Payment Was Already Processed!</b>"),
                         parse_mode="HTML"
@@ -303,6 +284,7 @@ def register_wallet(dp):
                 # Mark as processed
                 from utils.supabase_db import mark_payment_processed
                 mark_payment_processed(user_id, order_id)
+                PAYMENT_VERIFICATIONS.inc(gateway="paytm", outcome="success")
                 
                 # Show success popup
                 await callback_query.answer(
@@ -351,12 +333,14 @@ def register_wallet(dp):
                 
             else:
                 # Payment not found - show alert and keep button active
+                PAYMENT_VERIFICATIONS.inc(gateway="paytm", outcome="pending")
                 await callback_query.answer("⏳ Payment not confirmed yet. Please wait and try again.", show_alert=True)
                 print(f"[PAYMENT CHECK] Payment not found for order {order_id}")
                 
         except Exception as e:
             error_msg = f"❌ Error checking payment: {str(e)}"
             print(f"[PAYMENT CHECK ERROR] {error_msg}")
+            PAYMENT_VERIFICATIONS.inc(gateway="paytm", outcome="error")
             await callback_query.answer(error_msg, show_alert=True)
             await send_log(f"❌ *Payment Check Error*\n👤 User: `{user_id}`\n🆔 Order ID: `{order_id}`\n🚨 Error: {str(e)}")
 
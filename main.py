@@ -1,7 +1,6 @@
 import logging
 from aiogram import Bot, Dispatcher, executor, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
-from config.settings import BOT_TOKEN, ADMINS
+from config.settings import BOT_TOKEN, ADMINS, BOT_MODE, REDIS_URL
 from handlers import (
     start_handler,
     wallet_handler,
@@ -13,7 +12,17 @@ from handlers import (
     history_handler
 )
 from utils.json_utils import create_user_if_not_exists
+from utils.supabase_db import log_buffer
 from utils.log_utils import send_log
+from utils.qr_utils import shutdown_qr_pool
+from utils.credential_pool import credential_pool
+from utils.expiry_engine import SubscriptionExpiryEngine
+from utils.log_retention import LogRetentionJob
+from utils.webhook import make_storage, run_webhook
+from utils.update_scheduler import UserOrderingMiddleware
+from utils.callback_router import callback_router
+from utils.metrics import MetricsMiddleware, instrument_telegram, start_metrics_server
+from utils.db_instrumentation import DbTraceMiddleware
 
 
 # ===========================
@@ -21,16 +30,33 @@ from utils.log_utils import send_log
 # ===========================
 logging.basicConfig(level=logging.INFO)
 
-storage = MemoryStorage()
+storage = make_storage(REDIS_URL)
 bot = Bot(token=BOT_TOKEN, parse_mode="HTML")
 dp = Dispatcher(bot, storage=storage)
 
+# One update at a time per user (no double-spend on double taps), users in parallel
+dp.middleware.setup(UserOrderingMiddleware())
+dp.middleware.setup(MetricsMiddleware())
+dp.middleware.setup(DbTraceMiddleware())
+instrument_telegram()
+
+metrics_runner = None
+# Runs wherever on_startup runs: the polling process, or webhook worker 0 only
+expiry_engine = SubscriptionExpiryEngine(bot)
+log_retention = LogRetentionJob()
+
 
 # ===========================
 # 🚀 Bot Startup
 # ===========================
 async def on_startup(dispatcher):
+    global metrics_runner
     print("✅ OTTOnly Bot Started Successfully!")
+    if BOT_MODE != "webhook":
+        # Webhook workers each serve their own metrics (see utils/webhook.py)
+        metrics_runner = await start_metrics_server()
+    expiry_engine.start()
+    log_retention.start()
     await send_log("🚀 *OTTOnly Bot is now online and ready!*")
 
     # Ensure admin accounts exist
@@ -38,6 +64,19 @@ async def on_startup(dispatcher):
         create_user_if_not_exists(admin_id, "Admin")
 
 
+# ===========================
+# 🛑 Bot Shutdown
+# ===========================
+async def on_shutdown(dispatcher):
+    shutdown_qr_pool()
+    await credential_pool.close()
+    await expiry_engine.stop()
+    await log_retention.stop()
+    log_buffer.close()
+    if metrics_runner:
+        await metrics_runner.cleanup()
+
+
 # ===========================
 # 🏁 Register All Handlers
 # ===========================
@@ -51,13 +90,17 @@ admin_handler.register_admin(dp)
 admin_subs.register_admin_subs(dp)
 
 
-# Debug: Log all callbacks
-@dp.callback_query_handler(lambda c: True, state="*")
+# Debug: Log all callbacks no route accepts
+@callback_router.fallback
 async def debug_all_callbacks(callback: types.CallbackQuery):
     print(f"🔍 UNHANDLED CALLBACK: {callback.data} from user {callback.from_user.id}")
     await callback.answer("⚠️ Handler not found for this action", show_alert=True)
 
 
+# All callback queries go through one routing table
+callback_router.install(dp)
+
+
 # ===========================
 # ⚠️ Global Error Handler
 # ===========================
@@ -72,8 +115,11 @@ async def global_error_handler(update, error):
 
 
 # ===========================
-# ▶️ Start Polling
+# ▶️ Start Polling / Webhook
 # ===========================
 if __name__ == "__main__":
-    print("🚀 Starting OTTOnly Bot...")
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
+    print(f"🚀 Starting OTTOnly Bot ({BOT_MODE})...")
+    if BOT_MODE == "webhook":
+        run_webhook(dp, on_startup=on_startup, on_shutdown=on_shutdown)
+    else:
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,491 @@
+"""
+LOCAL STORE → SUPABASE MIGRATION
+=================================
+Streams the local user store into Supabase: the SQLite store (data/local.db,
+see utils/json_utils.py) when it exists, otherwise the legacy data/users.json
+and data/transactions.json.
+
+- Both sources are read incrementally: memory stays flat however many users there are
+- Rows go up as chunked upserts (--chunk rows per request), --workers requests in flight
+- Progress is checkpointed after every chunk; re-running resumes where it stopped
+- Upserts are keyed (users.telegram_id, transactions/subscriptions.import_key),
+  so chunks replayed after a crash never create duplicates
+- Finishes by comparing row counts and wallet totals with the same source
+
+USAGE:
+    python migrate_to_supabase.py                  # migrate (or resume) + verify
+    python migrate_to_supabase.py --restart        # ignore the checkpoint
+    python migrate_to_supabase.py --verify-only
+    python migrate_to_supabase.py --from-json      # legacy JSON files, even if data/local.db exists
+
+Run supabase_schema.sql first (section 13 adds the import_key columns).
+"""
+
+import argparse
+import asyncio
+import codecs
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+from config.settings import DATA_FILE, LOCAL_DB_PATH, PLANS
+
+load_dotenv()
+
+TRANSACTIONS_FILE = "data/transactions.json"
+CHECKPOINT_FILE = "data/.migration_checkpoint.json"
+MAX_ATTEMPTS = 4
+
+_WS = re.compile(r"\s*")
+
+
+# =====================================================
+# STREAMING JSON
+# =====================================================
+
+def iter_object_items(path: str, start: int = 0, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, object, int]]:
+    """
+    Yield (key, value, end_offset) for each member of the top-level JSON object in `path`.
+
+    end_offset is the byte offset just after the value; passing it back as `start`
+    resumes with the next member without re-reading what came before.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        f.seek(start)
+        buf = ""
+        base = start  # byte offset of buf[0]
+        eof = False
+        first = start == 0
+
+        def fill() -> bool:
+            nonlocal buf, eof
+            if eof:
+                return False
+            data = f.read(chunk_size)
+            eof = not data
+            buf += utf8.decode(data, final=eof)
+            return True
+
+        def consume(n: int):
+            nonlocal buf, base
+            base += len(buf[:n].encode("utf-8"))
+            buf = buf[n:]
+
+        def next_char() -> str:
+            while True:
+                pos = _WS.match(buf).end()
+                if pos < len(buf):
+                    consume(pos)
+                    return buf[0]
+                if not fill():
+                    raise ValueError(f"{path}: unexpected end of file at byte {base}")
+
+        def decode():
+            # A value flush with the buffer end may be truncated (e.g. a number): read more first
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf)
+                    if end < len(buf) or eof:
+                        consume(end)
+                        return value
+                except ValueError:
+                    if eof:
+                        raise
+                fill()
+
+        if first:
+            if next_char() != "{":
+                raise ValueError(f"{path}: top level is not a JSON object")
+            consume(1)
+
+        while True:
+            ch = next_char()
+            if ch == "}":
+                return
+            if not first:
+                if ch != ",":
+                    raise ValueError(f"{path}: expected ',' at byte {base}")
+                consume(1)
+                next_char()
+            first = False
+
+            key = decode()
+            if next_char() != ":":
+                raise ValueError(f"{path}: expected ':' at byte {base}")
+            consume(1)
+            next_char()
+            value = decode()
+            yield key, value, base
+
+
+# =====================================================
+# SOURCES
+# =====================================================
+# Each yields (user_id, value, resume_position) like iter_object_items; the
+# position goes into the checkpoint and is passed back as `start`.
+
+class JsonSource:
+    """The legacy JSON files, resumed by byte offset"""
+
+    label = "JSON"
+    checkpoint_prefix = ""
+
+    def __init__(self, users_file: str, transactions_file: str):
+        self.users_file = users_file
+        self.transactions_file = transactions_file
+
+    def users(self, start: int = 0) -> Iterator[Tuple[str, Dict, int]]:
+        if os.path.exists(self.users_file):
+            yield from iter_object_items(self.users_file, start)
+        else:
+            print(f"   ⚠️ {self.users_file} not found")
+
+    def transactions(self, start: int = 0) -> Iterator[Tuple[str, List, int]]:
+        if os.path.exists(self.transactions_file):
+            yield from iter_object_items(self.transactions_file, start)
+        else:
+            print(f"   ⚠️ {self.transactions_file} not found")
+
+
+class StoreSource:
+    """The live SQLite store, resumed by user ID"""
+
+    label = "SQLite"
+    checkpoint_prefix = "store_"
+
+    def users(self, start: int = 0) -> Iterator[Tuple[str, Dict, int]]:
+        from utils.json_utils import iter_users
+        for uid, user in iter_users(start):
+            yield str(uid), user, uid
+
+    def transactions(self, start: int = 0) -> Iterator[Tuple[str, List, int]]:
+        from utils.json_utils import iter_user_transactions
+        for uid, txns in iter_user_transactions(start):
+            yield str(uid), txns, uid
+
+
+# =====================================================
+# ROW MAPPING
+# =====================================================
+
+def user_row(uid: str, user: Dict) -> Dict:
+    return {
+        "telegram_id": int(uid),
+        "name": user.get("name") or "",
+        "wallet": user.get("wallet", 0),
+        "joined_at": user.get("joined_at") or datetime.utcnow().isoformat(),
+        "referred_by": user.get("referred_by"),
+        "referrals": [int(r) for r in user.get("referrals", [])],
+        "processed_payments": user.get("processed_payments", []),
+    }
+
+
+def subscription_rows(uid: str, user: Dict) -> List[Dict]:
+    now = datetime.utcnow().isoformat()
+    return [
+        {
+            "import_key": f"{uid}:{i}",
+            "telegram_id": int(uid),
+            "plan_key": sub["plan_key"],
+            "purchased_at": sub.get("bought_at"),
+            "expires_at": sub.get("expires_at"),
+            "status": "active" if (sub.get("expires_at") or "") > now else "expired",
+        }
+        for i, sub in enumerate(user.get("subscriptions", []))
+    ]
+
+
+def transaction_type(description: str, amount: int) -> str:
+    if description.startswith("Referral Bonus"):
+        return "referral_bonus"
+    if description.startswith("Purchased"):
+        return "purchase"
+    return "debit" if amount < 0 else "credit"
+
+
+def transaction_rows(uid: str, txns: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "import_key": f"{uid}:{i}",
+            "telegram_id": int(uid),
+            "description": t.get("description") or "",
+            "amount": t.get("amount", 0),
+            "transaction_type": transaction_type(t.get("description") or "", t.get("amount", 0)),
+            "timestamp": t.get("timestamp"),
+        }
+        for i, t in enumerate(txns)
+    ]
+
+
+# =====================================================
+# CHECKPOINT
+# =====================================================
+
+class Checkpoint:
+    """Resume position + totals per pipeline, rewritten atomically after every chunk"""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.state: Dict[str, Dict] = {}
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, name: str) -> Dict:
+        return self.state.setdefault(name, {"offset": 0, "rows": 0, "skipped": 0, "done": False})
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+# =====================================================
+# MIGRATOR
+# =====================================================
+
+class Migrator:
+    def __init__(self, client: Client, source, chunk: int, workers: int, checkpoint: Checkpoint):
+        self.client = client
+        self.source = source
+        self.chunk = chunk
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _execute(self, query_fn: Callable[[], object]):
+        """Run one request, retrying transient failures with backoff"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return query_fn().execute()
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                print(f"   ⚠️ Request failed ({e}), retry {attempt}/{MAX_ATTEMPTS - 1}")
+                time.sleep(2 ** attempt)
+
+    def _upsert(self, table: str, rows: List[Dict], on_conflict: str, ignore_duplicates: bool = False):
+        if rows:
+            self._execute(lambda: self.client.table(table).upsert(
+                rows, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates, returning="minimal"
+            ))
+
+    async def _pipeline(
+        self,
+        name: str,
+        read: Callable[[int], Iterator[Tuple[str, object, int]]],
+        build: Callable[[List[Tuple[str, object]]], Callable[[], int]]
+    ):
+        """
+        Stream read(position) in chunks and run build(chunk)() in the pool, at most `workers` at a time.
+        The checkpoint only advances past chunks whose predecessors have all finished.
+        """
+        name = self.source.checkpoint_prefix + name
+        progress = self.checkpoint.get(name)
+        if progress["done"]:
+            print(f"   ⏭️ {name}: already migrated ({progress['rows']} rows)")
+            return
+
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers)
+        finished: Dict[int, Tuple[int, int]] = {}  # seq -> (end_offset, rows)
+        next_seq = 0
+        tasks = []
+        started = time.perf_counter()
+
+        async def run(seq: int, job: Callable[[], int], end: int):
+            nonlocal next_seq
+            try:
+                rows = await loop.run_in_executor(self.executor, job)
+            finally:
+                slots.release()
+            finished[seq] = (end, rows)
+            while next_seq in finished:
+                progress["offset"], rows = finished.pop(next_seq)
+                progress["rows"] += rows
+                next_seq += 1
+            self.checkpoint.save()
+
+        items: List[Tuple[str, object]] = []
+        seq = 0
+        for key, value, end in read(progress["offset"]):
+            items.append((key, value))
+            if len(items) < self.chunk:
+                continue
+            await slots.acquire()
+            tasks.append(asyncio.ensure_future(run(seq, build(items), end)))
+            seq += 1
+            items = []
+            if seq % 20 == 0:
+                rate = progress["rows"] / max(time.perf_counter() - started, 1e-9)
+                print(f"   📤 {name}: {progress['rows']} rows committed ({rate:,.0f}/s)")
+            # Surface a failed chunk now instead of after the whole file
+            for t in [t for t in tasks if t.done()]:
+                tasks.remove(t)
+                t.result()
+        if items:
+            await slots.acquire()
+            tasks.append(asyncio.ensure_future(run(seq, build(items), end)))
+        await asyncio.gather(*tasks)
+
+        progress["done"] = True
+        self.checkpoint.save()
+        print(f"   ✅ {name}: {progress['rows']} rows in {time.perf_counter() - started:.1f}s")
+
+    # ---------- users (+ their subscriptions) ----------
+
+    def _users_job(self, items: List[Tuple[str, Dict]]) -> Callable[[], int]:
+        def job() -> int:
+            self._upsert("users", [user_row(uid, u) for uid, u in items], "telegram_id")
+            subs = [row for uid, u in items for row in subscription_rows(uid, u)]
+            self._upsert("subscriptions", subs, "import_key")
+            return len(items)
+        return job
+
+    # ---------- transactions ----------
+
+    def _transactions_job(self, known: Set[int]) -> Callable[[List[Tuple[str, List]]], Callable[[], int]]:
+        progress = self.checkpoint.get(self.source.checkpoint_prefix + "transactions")
+
+        def build(items: List[Tuple[str, List]]) -> Callable[[], int]:
+            rows = []
+            skipped = 0
+            for uid, txns in items:
+                if int(uid) not in known:
+                    # No user row to reference (FK): report instead of failing the chunk
+                    skipped += len(txns)
+                    continue
+                rows.extend(transaction_rows(uid, txns))
+
+            def job() -> int:
+                for start in range(0, len(rows), self.chunk):
+                    self._upsert("transactions", rows[start:start + self.chunk], "import_key")
+                progress["skipped"] += skipped
+                return len(rows)
+            return job
+        return build
+
+    async def migrate(self):
+        print("\n1️⃣ Plans referenced by subscriptions...")
+        self._upsert("plans", [
+            {"plan_key": key, "ott_name": plan["name"], "price": plan["price"]} for key, plan in PLANS.items()
+        ], "plan_key", ignore_duplicates=True)
+
+        print("\n2️⃣ Users + subscriptions...")
+        await self._pipeline("users", self.source.users, self._users_job)
+
+        print("\n3️⃣ Transactions...")
+        known = {int(uid) for uid, _, _ in self.source.users()}
+        await self._pipeline("transactions", self.source.transactions, self._transactions_job(known))
+        skipped = self.checkpoint.get(self.source.checkpoint_prefix + "transactions")["skipped"]
+        if skipped:
+            print(f"   ⚠️ {skipped} transactions skipped: their user is not in the {self.source.label} users")
+
+    # ---------- verification ----------
+
+    def verify(self) -> bool:
+        print("\n4️⃣ Verifying...")
+        local_wallets: Dict[int, int] = {}
+        local_subs = 0
+        for uid, user, _ in self.source.users():
+            local_wallets[int(uid)] = user.get("wallet", 0)
+            local_subs += len(user.get("subscriptions", []))
+        local_txns = sum(len(t) for uid, t, _ in self.source.transactions() if int(uid) in local_wallets)
+
+        # Keyset pages over users: count + wallet total for the migrated IDs only
+        remote_users = 0
+        remote_wallet = 0
+        last = None
+        while True:
+            query = self.client.table("users").select("telegram_id,wallet").order("telegram_id").limit(1000)
+            if last is not None:
+                query = query.gt("telegram_id", last)
+            page = self._execute(lambda: query).data
+            if not page:
+                break
+            for row in page:
+                if row["telegram_id"] in local_wallets:
+                    remote_users += 1
+                    remote_wallet += row["wallet"] or 0
+            last = page[-1]["telegram_id"]
+
+        def imported(table: str) -> int:
+            return self._execute(
+                lambda: self.client.table(table).select("id", count="exact")
+                .not_.is_("import_key", "null").limit(1)
+            ).count or 0
+
+        checks = [
+            ("Users", len(local_wallets), remote_users),
+            ("Wallet total", sum(local_wallets.values()), remote_wallet),
+            ("Subscriptions", local_subs, imported("subscriptions")),
+            ("Transactions", local_txns, imported("transactions")),
+        ]
+        ok = True
+        for label, local, remote in checks:
+            match = local == remote
+            ok &= match
+            print(f"   {'✅' if match else '❌'} {label}: {self.source.label} {local} | Supabase {remote}")
+        return ok
+
+
+# =====================================================
+# MAIN
+# =====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the local user store into Supabase")
+    parser.add_argument("--from-json", action="store_true",
+                        help=f"Read the legacy JSON files even when {LOCAL_DB_PATH} exists")
+    parser.add_argument("--users-file", default=DATA_FILE, help="Legacy users file (with --from-json)")
+    parser.add_argument("--transactions-file", default=TRANSACTIONS_FILE, help="Legacy transactions file (with --from-json)")
+    parser.add_argument("--chunk", type=int, default=500, help="Rows per upsert request")
+    parser.add_argument("--workers", type=int, default=4, help="Upsert requests in flight")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--verify-only", action="store_true")
+    args = parser.parse_args()
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        print("❌ Missing Supabase credentials. Check your .env file.")
+        raise SystemExit(1)
+
+    print("=" * 60)
+    print("🚚 LOCAL STORE → SUPABASE MIGRATION")
+    print("=" * 60)
+
+    # The SQLite store is the live copy; the JSON files stop changing once it has imported them
+    if os.path.exists(LOCAL_DB_PATH) and not args.from_json:
+        source = StoreSource()
+        print(f"Source: {LOCAL_DB_PATH}")
+    else:
+        source = JsonSource(args.users_file, args.transactions_file)
+        print(f"Source: {args.users_file}, {args.transactions_file}")
+
+    migrator = Migrator(
+        create_client(url, key), source, args.chunk, args.workers, Checkpoint(args.checkpoint, args.restart)
+    )
+    if not args.verify_only:
+        asyncio.run(migrator.migrate())
+    ok = migrator.verify()
+
+    print("\n" + "=" * 60)
+    print("✅ MIGRATION VERIFIED" if ok else "❌ MIGRATION MISMATCH - re-run to resume, then check the rows above")
+    print("=" * 60)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .config import settings
 from .database import get_db
 from .models import User
@@ -53,7 +54,7 @@ def decode_access_token(token: str) -> Optional[dict]:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Get current authenticated user"""
     credentials_exception = HTTPException(
@@ -72,7 +73,7 @@ async def get_current_user(
     if telegram_id is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if user is None:
         raise credentials_exception
     
@@ -119,8 +120,8 @@ def generate_referral_code(user_id: int) -> str:
     return f"REF{str(user_id).zfill(6)}{hash_str}"
 
 
-def log_admin_action(
-    db: Session,
+async def log_admin_action(
+    db: AsyncSession,
     admin_id: int,
     action_type: str,
     description: str,
@@ -141,7 +142,7 @@ def log_admin_action(
         description=description,
         ip_address=ip_address,
         user_agent=user_agent,
-        metadata=metadata
+        metadata_=metadata
     )
     db.add(log)
-    db.commit()
+    await db.commit()
@@ -10,6 +10,9 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "postgresql://localhost/ottsonly_referral"
+    DB_MAX_CONNECTIONS: int = 80    # Connection budget shared by all API workers (keep below Postgres max_connections)
+    DB_POOL_TIMEOUT: int = 10       # Seconds a request waits for a free connection
+    WEB_CONCURRENCY: int = 1        # Number of API worker processes (same env var uvicorn/gunicorn read)
     
     # Security
     SECRET_KEY: str = "change-this-secret-key-in-production"
@@ -32,7 +35,14 @@ class Settings(BaseSettings):
     LEVEL1_COMMISSION_AMOUNT: float = 28.00
     LEVEL2_COMMISSION_AMOUNT: float = 9.00
     COMMISSION_HOLD_HOURS: int = 24
+    SETTLEMENT_BATCH_SIZE: int = 5000  # Commissions released per transaction
+    COMMISSION_RELEASE_HORIZON_HOURS: int = 25  # Pending commissions kept in the in-memory release heap
+    COMMISSION_SWEEP_MINUTES: int = 60  # Backstop sweep for anything the release queue missed
     MIN_WITHDRAWAL_AMOUNT: float = 500.00
+    REFERRAL_TREE_MAX_DEPTH: int = 5  # Deepest level returned by /users/{id}/referral-tree
+    DASHBOARD_SNAPSHOT_SECONDS: int = 60  # Dashboard stats are recomputed at least this often
+    DASHBOARD_SNAPSHOT_MIN_SECONDS: int = 2  # After a write, a snapshot is still reused for this long
+    LEADERBOARD_RECONCILE_MINUTES: int = 60  # Leaderboard is rebuilt from the database this often
     
     # CORS
     FRONTEND_URL: str = "http://localhost:3000"
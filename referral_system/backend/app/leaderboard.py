@@ -0,0 +1,264 @@
+"""
+Referral leaderboard kept outside the database
+
+Referrers are ranked by total commission earned in a Redis sorted set
+(ZINCRBY on every credit/reversal, ZREVRANGE for top-N), with a small hash
+per referrer for display fields and click/buyer counters, so reading the
+leaderboard costs no SQL. When REDIS_URL is unset or unreachable an
+in-process fallback with the same interface is used (fine for local runs,
+per-worker only). The board is rebuilt from the database in one query when
+it starts empty, and again every LEADERBOARD_RECONCILE_MINUTES to repair any
+increment that failed. A referrer without display fields gets them from the
+database on their first increment.
+"""
+import bisect
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, func, or_
+from .config import settings
+from .database import AsyncSessionLocal
+from .models import User, Wallet, Referral
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = "referral:leaderboard"
+PROFILE_KEY = "referral:leaderboard:user:{}"
+PROFILE_FIELDS = ("telegram_id", "username", "first_name", "referral_code")
+
+
+class MemoryLeaderboard:
+    """In-process sorted leaderboard (reads are a slice of a sorted list)"""
+
+    def __init__(self):
+        self._scores: Dict[int, float] = {}
+        self._ranked: List[Tuple[float, int]] = []   # (-score, user_id), best first
+        self._details: Dict[int, Dict] = {}
+
+    async def incr_score(self, user_id: int, amount: float):
+        old = self._scores.get(user_id)
+        if old is not None:
+            del self._ranked[bisect.bisect_left(self._ranked, (-old, user_id))]
+        new = (old or 0.0) + amount
+        self._scores[user_id] = new
+        bisect.insort(self._ranked, (-new, user_id))
+
+    async def incr_field(self, user_id: int, field: str, amount: int = 1):
+        details = self._details.setdefault(user_id, {})
+        details[field] = details.get(field, 0) + amount
+
+    async def set_profile(self, user_id: int, profile: Dict):
+        self._details.setdefault(user_id, {}).update(profile)
+
+    async def has_profile(self, user_id: int) -> bool:
+        return "telegram_id" in self._details.get(user_id, {})
+
+    async def top(self, limit: int) -> List[Tuple[int, float, Dict]]:
+        return [
+            (user_id, -neg_score, dict(self._details.get(user_id, {})))
+            for neg_score, user_id in self._ranked[:limit]
+        ]
+
+    async def is_empty(self) -> bool:
+        return not self._scores
+
+    async def load(self, entries: Iterable[Tuple[int, float, Dict]]):
+        """Replace every score with `entries`"""
+        self._scores = {}
+        self._ranked = []
+        for user_id, score, details in entries:
+            await self.incr_score(user_id, score)
+            await self.set_profile(user_id, details)
+
+    async def close(self):
+        pass
+
+
+class RedisLeaderboard:
+    """Leaderboard in a Redis sorted set plus one hash per referrer"""
+
+    def __init__(self, client):
+        self._redis = client
+
+    async def incr_score(self, user_id: int, amount: float):
+        await self._redis.zincrby(LEADERBOARD_KEY, amount, user_id)
+
+    async def incr_field(self, user_id: int, field: str, amount: int = 1):
+        await self._redis.hincrby(PROFILE_KEY.format(user_id), field, amount)
+
+    async def set_profile(self, user_id: int, profile: Dict):
+        mapping = {k: v for k, v in profile.items() if v is not None}
+        if mapping:
+            await self._redis.hset(PROFILE_KEY.format(user_id), mapping=mapping)
+
+    async def has_profile(self, user_id: int) -> bool:
+        return await self._redis.hexists(PROFILE_KEY.format(user_id), "telegram_id")
+
+    async def top(self, limit: int) -> List[Tuple[int, float, Dict]]:
+        ranked = await self._redis.zrevrange(LEADERBOARD_KEY, 0, limit - 1, withscores=True)
+        if not ranked:
+            return []
+        pipe = self._redis.pipeline(transaction=False)
+        for member, _ in ranked:
+            pipe.hgetall(PROFILE_KEY.format(member))
+        profiles = await pipe.execute()
+        return [(int(member), score, details) for (member, score), details in zip(ranked, profiles)]
+
+    async def is_empty(self) -> bool:
+        return not await self._redis.exists(LEADERBOARD_KEY)
+
+    async def load(self, entries: Iterable[Tuple[int, float, Dict]]):
+        """Replace every score with `entries` (readers see the old or the new board)"""
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(LEADERBOARD_KEY)
+        for user_id, score, details in entries:
+            pipe.zadd(LEADERBOARD_KEY, {user_id: score})
+            mapping = {k: v for k, v in details.items() if v is not None}
+            if mapping:
+                pipe.hset(PROFILE_KEY.format(user_id), mapping=mapping)
+        await pipe.execute()
+
+    async def close(self):
+        await self._redis.close()
+
+
+class Leaderboard:
+    """
+    Facade used by the services. Updates never raise: a leaderboard hiccup
+    must not fail a payment, and a rebuild restores it.
+    """
+
+    def __init__(self):
+        self.backend = MemoryLeaderboard()
+        self._profiled = set()  # user ids known to have display fields on the board
+
+    async def start(self):
+        """Pick Redis when reachable, then seed the board if it is empty"""
+        if settings.REDIS_URL:
+            try:
+                import redis.asyncio as redis
+                client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+                await client.ping()
+                self.backend = RedisLeaderboard(client)
+            except Exception as e:
+                logger.warning(f"Redis unavailable ({e}); using in-memory leaderboard")
+
+        if await self.backend.is_empty():
+            async with AsyncSessionLocal() as db:
+                await self.rebuild(db)
+
+    async def stop(self):
+        await self.backend.close()
+
+    async def reconcile(self):
+        """Rebuild from the database, repairing scores left behind by failed updates"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.rebuild(db)
+        except Exception as e:
+            logger.error(f"Leaderboard reconcile failed: {e}")
+
+    async def rebuild(self, db):
+        """Seed (or replace) the board from wallets and referrals in one query"""
+        clicks = (
+            select(Referral.referrer_id, func.count(Referral.id).label("clicks"),
+                   func.count(Referral.id).filter(Referral.converted == True).label("buyers"))
+            .group_by(Referral.referrer_id)
+            .subquery()
+        )
+        rows = (await db.execute(
+            select(
+                User.id, User.telegram_id, User.username, User.first_name, User.referral_code,
+                func.coalesce(Wallet.total_earned, 0).label("earned"),
+                func.coalesce(clicks.c.clicks, 0).label("clicks"),
+                func.coalesce(clicks.c.buyers, 0).label("buyers")
+            )
+            .outerjoin(Wallet, Wallet.user_id == User.id)
+            .outerjoin(clicks, clicks.c.referrer_id == User.id)
+            .where(or_(Wallet.total_earned > 0, clicks.c.clicks > 0))
+        )).all()
+
+        await self.backend.load(
+            (row.id, float(row.earned), {
+                'telegram_id': row.telegram_id,
+                'username': row.username,
+                'first_name': row.first_name,
+                'referral_code': row.referral_code,
+                'clicks': row.clicks,
+                'buyers': row.buyers
+            })
+            for row in rows
+        )
+        self._profiled.update(row.id for row in rows)
+        logger.info(f"Leaderboard rebuilt with {len(rows)} referrers")
+
+    async def _ensure_profile(self, user_id: int):
+        """Copy display fields from the database the first time a referrer scores"""
+        if user_id in self._profiled:
+            return
+        if not await self.backend.has_profile(user_id):
+            async with AsyncSessionLocal() as db:
+                user = await db.get(User, user_id)
+            if user is None:
+                return
+            await self.backend.set_profile(user_id, {f: getattr(user, f) for f in PROFILE_FIELDS})
+        self._profiled.add(user_id)
+
+    async def record_commission(self, user_id: int, amount):
+        """Credit (positive) or reversal (negative) of commission earned"""
+        try:
+            await self.backend.incr_score(user_id, float(amount))
+            await self._ensure_profile(user_id)
+        except Exception as e:
+            logger.error(f"Leaderboard update failed: {e}")
+
+    async def record_click(self, referrer_id: Optional[int]):
+        if referrer_id is None:
+            return
+        try:
+            await self.backend.incr_field(referrer_id, 'clicks')
+            await self._ensure_profile(referrer_id)
+        except Exception as e:
+            logger.error(f"Leaderboard update failed: {e}")
+
+    async def record_conversions(self, referrer_ids: Iterable[int]):
+        try:
+            for referrer_id in referrer_ids:
+                await self.backend.incr_field(referrer_id, 'buyers')
+                await self._ensure_profile(referrer_id)
+        except Exception as e:
+            logger.error(f"Leaderboard update failed: {e}")
+
+    async def set_profile(self, user: User):
+        try:
+            await self.backend.set_profile(user.id, {f: getattr(user, f) for f in PROFILE_FIELDS})
+            self._profiled.add(user.id)
+        except Exception as e:
+            logger.error(f"Leaderboard update failed: {e}")
+
+    async def top(self, limit: int = 10) -> List[dict]:
+        """Top referrers by commission earned, best first"""
+        if limit < 1:
+            # ZREVRANGE 0 -1 would return the whole set
+            raise ValueError("limit must be at least 1")
+        result = []
+        for user_id, earned, details in await self.backend.top(limit):
+            clicks = int(details.get('clicks', 0))
+            buyers = int(details.get('buyers', 0))
+            telegram_id = details.get('telegram_id')
+            result.append({
+                'user_id': user_id,
+                'telegram_id': int(telegram_id) if telegram_id is not None else None,
+                'username': details.get('username'),
+                'first_name': details.get('first_name'),
+                'referral_code': details.get('referral_code'),
+                'stats': {
+                    'total_clicks': clicks,
+                    'total_buyers': buyers,
+                    'conversion_rate': round(buyers / clicks * 100, 2) if clicks > 0 else 0.0,
+                    'total_commission_earned': round(earned, 2)
+                }
+            })
+        return result
+
+
+leaderboard = Leaderboard()
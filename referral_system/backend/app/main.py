@@ -6,8 +6,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
 from .config import settings
+from .database import async_engine
 from .routers import admin_auth, admin_dashboard, api
 from .scheduler import start_scheduler
+from .release_queue import release_queue
+from .leaderboard import leaderboard
 
 # Configure logging
 logging.basicConfig(
@@ -56,6 +59,12 @@ async def startup_event():
     scheduler = start_scheduler()
     app.state.scheduler = scheduler
     
+    # Release held commissions as they fall due
+    await release_queue.start()
+    
+    # Referral leaderboard (Redis, or in-memory fallback)
+    await leaderboard.start()
+    
     logger.info("Application started successfully")
 
 
@@ -68,6 +77,12 @@ async def shutdown_event():
     if hasattr(app.state, 'scheduler'):
         app.state.scheduler.shutdown()
         logger.info("Scheduler stopped")
+    
+    await release_queue.stop()
+    await leaderboard.stop()
+    
+    # Close pooled database connections
+    await async_engine.dispose()
 
 
 @app.get("/")
@@ -38,7 +38,7 @@ class User(Base):
     # Relationships
     referrer = relationship("User", remote_side=[id], backref="referrals")
     wallet = relationship("Wallet", back_populates="user", uselist=False)
-    orders = relationship("Order", back_populates="user")
+    orders = relationship("Order", back_populates="user", foreign_keys="Order.user_id")
     
     __table_args__ = (
         CheckConstraint('referral_level IN (0, 1, 2)', name='check_referral_level'),
@@ -143,6 +143,8 @@ class WalletTransaction(Base):
         CheckConstraint("transaction_type IN ('commission_credit', 'withdrawal', 'refund', 'deduction', 'purchase')", name='check_transaction_type'),
         CheckConstraint("status IN ('pending', 'completed', 'cancelled')", name='check_status'),
         CheckConstraint('referral_level IN (1, 2) OR referral_level IS NULL', name='check_referral_level'),
+        Index('idx_wallet_transactions_pending_commission', 'id',
+              postgresql_where="status = 'pending' AND transaction_type = 'commission_credit'"),
     )
 
 
@@ -189,7 +191,7 @@ class AdminLog(Base):
     description = Column(Text)
     ip_address = Column(String(45))
     user_agent = Column(Text)
-    metadata = Column(JSONB)
+    metadata_ = Column("metadata", JSONB)  # "metadata" is reserved on declarative models
     created_at = Column(TIMESTAMP, default=datetime.utcnow, index=True)
 
 
@@ -202,7 +204,7 @@ class FraudFlag(Base):
     flag_type = Column(String(100), nullable=False, index=True)
     severity = Column(String(20), default='medium', index=True)
     description = Column(Text)
-    metadata = Column(JSONB)
+    metadata_ = Column("metadata", JSONB)  # "metadata" is reserved on declarative models
     auto_detected = Column(Boolean, default=True)
     flagged_by = Column(BigInteger, ForeignKey('users.id', ondelete='SET NULL'))
     resolved = Column(Boolean, default=False, index=True)
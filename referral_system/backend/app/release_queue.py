@@ -0,0 +1,141 @@
+"""
+Event-driven release of held commissions
+
+Pending commission_credit rows already carry an indexed available_at, which
+is the durable queue. This module keeps the part of it that falls due within
+COMMISSION_RELEASE_HORIZON_HOURS in an in-memory heap and sleeps until the
+earliest due time, then settles exactly those rows. New commissions are
+pushed as they are credited; anything further out is loaded when the horizon
+is reached, and a restart simply reloads the window from the database.
+Rows a settlement skips (locked by a refund) or loses to an error stay queued.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from .config import settings
+from .database import AsyncSessionLocal
+from .models import WalletTransaction
+
+logger = logging.getLogger(__name__)
+
+# Due rows a concurrent refund held locked are retried this much later
+LOCKED_RETRY_DELAY = timedelta(seconds=5)
+
+
+class CommissionReleaseQueue:
+    """Due-time heap of pending commissions with a single release worker"""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []   # (available_at, transaction id)
+        self._loaded_until: Optional[datetime] = None  # heap holds every pending row due up to here
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def push(self, transaction_id: int, available_at: datetime):
+        """Register a newly credited commission (call after its commit)"""
+        if self._loaded_until is None or available_at > self._loaded_until:
+            return  # Not started, or beyond the window: picked up by the next load
+        heapq.heappush(self._heap, (available_at, transaction_id))
+        if self._heap[0][1] == transaction_id:
+            self._wakeup.set()
+
+    async def start(self):
+        """Start the release worker on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the release worker"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _load_window(self):
+        """Load pending commissions due in (previous horizon, now + horizon]"""
+        window_start = self._loaded_until
+        # Move the horizon first so pushes that race this query land in the heap
+        self._loaded_until = datetime.utcnow() + timedelta(hours=settings.COMMISSION_RELEASE_HORIZON_HOURS)
+
+        query = select(WalletTransaction.available_at, WalletTransaction.id).where(
+            WalletTransaction.status == "pending",
+            WalletTransaction.transaction_type == "commission_credit",
+            WalletTransaction.available_at <= self._loaded_until
+        )
+        if window_start is not None:
+            query = query.where(WalletTransaction.available_at > window_start)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(query)).all()
+        except Exception:
+            # Retry this window on the next pass rather than leaving it to the sweep
+            self._loaded_until = window_start
+            raise
+
+        for available_at, transaction_id in rows:
+            heapq.heappush(self._heap, (available_at, transaction_id))
+        logger.info(f"Release queue loaded {len(rows)} pending commissions up to {self._loaded_until}")
+
+    async def _release_due(self):
+        """Pop everything that is due, settle those rows and re-queue any still pending"""
+        now = datetime.utcnow()
+        due: List[Tuple[datetime, int]] = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+        if not due:
+            return
+
+        from .services import PaymentService
+        due_ids = [transaction_id for _, transaction_id in due]
+        try:
+            async with AsyncSessionLocal() as db:
+                count = await PaymentService.release_commissions(db, due_ids)
+                # Settlement skips rows a refund has locked; cancelled ones are not pending any more
+                still_pending = set((await db.scalars(
+                    select(WalletTransaction.id).where(
+                        WalletTransaction.id.in_(due_ids),
+                        WalletTransaction.status == "pending"
+                    )
+                )).all())
+        except Exception:
+            for entry in due:
+                heapq.heappush(self._heap, entry)
+            raise
+
+        retry_at = now + LOCKED_RETRY_DELAY
+        for transaction_id in still_pending:
+            heapq.heappush(self._heap, (retry_at, transaction_id))
+        logger.info(f"Released {count} commissions" + (f", {len(still_pending)} locked for retry" if still_pending else ""))
+
+    async def _run(self):
+        while True:
+            try:
+                if self._loaded_until is None or datetime.utcnow() >= self._loaded_until:
+                    await self._load_window()
+
+                await self._release_due()
+
+                next_due = self._heap[0][0] if self._heap else self._loaded_until
+                delay = (min(next_due, self._loaded_until) - datetime.utcnow()).total_seconds()
+                if delay > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The periodic sweep in scheduler.py settles anything missed here
+                logger.error(f"Error releasing commissions: {e}")
+                await asyncio.sleep(30)
+
+
+release_queue = CommissionReleaseQueue()
@@ -2,7 +2,8 @@
 Admin authentication router
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from ..database import get_db
 from ..models import User
@@ -14,10 +15,10 @@ router = APIRouter(prefix="/admin/auth", tags=["Admin Auth"])
 
 
 @router.post("/login", response_model=TokenResponse)
-async def admin_login(credentials: AdminLogin, db: Session = Depends(get_db)):
+async def admin_login(credentials: AdminLogin, db: AsyncSession = Depends(get_db)):
     """Admin login endpoint"""
     # Find user by telegram ID
-    user = db.query(User).filter(User.telegram_id == credentials.telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == credentials.telegram_id))
     
     # For first-time super admin setup
     if credentials.telegram_id == settings.SUPER_ADMIN_TELEGRAM_ID and not user:
@@ -31,8 +32,8 @@ async def admin_login(credentials: AdminLogin, db: Session = Depends(get_db)):
             user_type="super_admin"
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     
     if not user:
         raise HTTPException(
@@ -69,11 +70,11 @@ async def create_admin(
     username: str,
     password: str,
     user_type: str = "admin",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new admin user (super admin only)"""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    existing_user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
     
@@ -87,7 +88,7 @@ async def create_admin(
         user_type=user_type
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return {"message": "Admin created successfully", "user_id": user.id}
@@ -2,7 +2,7 @@
 Admin dashboard router
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
 from ..database import get_db
@@ -20,10 +20,10 @@ router = APIRouter(prefix="/admin/dashboard", tags=["Admin Dashboard"])
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard statistics"""
-    stats = AdminService.get_dashboard_stats(db)
+    stats = await AdminService.get_dashboard_stats(db)
     return stats
 
 
@@ -38,10 +38,10 @@ async def get_users(
     page: int = 1,
     limit: int = 50,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get filtered user list"""
-    result = AdminService.get_users(
+    result = await AdminService.get_users(
         db=db,
         search=search,
         user_type=user_type,
@@ -64,10 +64,10 @@ async def get_orders(
     page: int = 1,
     limit: int = 50,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get filtered order list"""
-    result = AdminService.get_orders(
+    result = await AdminService.get_orders(
         db=db,
         search=search,
         payment_status=payment_status,
@@ -83,11 +83,19 @@ async def get_orders(
 async def get_referrer_performance(
     page: int = 1,
     limit: int = 50,
+    sort_by: str = "total_commission_earned",
+    sort_order: str = "desc",
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get referrer performance metrics"""
-    result = AdminService.get_referrer_performance(db=db, page=page, limit=limit)
+    try:
+        result = await AdminService.get_referrer_performance(
+            db=db, page=page, limit=limit, sort_by=sort_by, sort_order=sort_order
+        )
+    except ValueError as e:
+        # Invalid sort_by/sort_order; database errors go to the global handler
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
@@ -95,10 +103,10 @@ async def get_referrer_performance(
 async def get_payment_monitoring(
     days: int = 7,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get payment monitoring statistics"""
-    result = AdminService.get_payment_monitoring(db=db, days=days)
+    result = await AdminService.get_payment_monitoring(db=db, days=days)
     return result
 
 
@@ -106,10 +114,10 @@ async def get_payment_monitoring(
 async def get_kpi_metrics(
     days: int = 30,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get key performance indicators"""
-    result = AdminService.get_kpi_metrics(db=db, days=days)
+    result = await AdminService.get_kpi_metrics(db=db, days=days)
     return result
 
 
@@ -122,10 +130,10 @@ async def get_audit_logs(
     page: int = 1,
     limit: int = 100,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get admin audit logs"""
-    result = AdminService.get_audit_logs(
+    result = await AdminService.get_audit_logs(
         db=db,
         admin_id=admin_id,
         action_type=action_type,
@@ -1,8 +1,9 @@
 """
 Main API routers - Users, Orders, Referrals, Wallet, Withdrawals, Fraud Detection
 """
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from ..database import get_db
 from ..models import User
@@ -20,11 +21,11 @@ user_router = APIRouter(prefix="/users", tags=["Users"])
 async def create_user(
     user_data: UserCreate,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new user (called from Telegram bot)"""
     try:
-        user = ReferralService.create_user_with_referral(
+        user = await ReferralService.create_user_with_referral(
             db=db,
             telegram_id=user_data.telegram_id,
             username=user_data.username,
@@ -40,33 +41,39 @@ async def create_user(
 
 
 @user_router.get("/{telegram_id}", response_model=UserResponse)
-async def get_user(telegram_id: int, db: Session = Depends(get_db)):
+async def get_user(telegram_id: int, db: AsyncSession = Depends(get_db)):
     """Get user by telegram ID"""
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
 @user_router.get("/{telegram_id}/referral-stats")
-async def get_user_referral_stats(telegram_id: int, db: Session = Depends(get_db)):
+async def get_user_referral_stats(telegram_id: int, db: AsyncSession = Depends(get_db)):
     """Get user's referral statistics"""
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    stats = ReferralService.get_referral_stats(db, user.id)
+    stats = await ReferralService.get_referral_stats(db, user.id)
     return stats
 
 
 @user_router.get("/{telegram_id}/referral-tree")
-async def get_user_referral_tree(telegram_id: int, db: Session = Depends(get_db)):
-    """Get user's complete referral tree"""
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+async def get_user_referral_tree(
+    telegram_id: int,
+    max_depth: Optional[int] = Query(None, ge=1),
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get user's referral tree, paginated per level"""
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    tree = ReferralService.get_referral_tree(db, user.id)
+    tree = await ReferralService.get_referral_tree(db, user.id, max_depth=max_depth, page=page, limit=limit)
     return tree
 
 
@@ -76,11 +83,11 @@ order_router = APIRouter(prefix="/orders", tags=["Orders"])
 @order_router.post("/create", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new order"""
     try:
-        order = PaymentService.create_order(
+        order = await PaymentService.create_order(
             db=db,
             user_id=order_data.user_id,
             payment_method=order_data.payment_method,
@@ -96,11 +103,11 @@ async def create_order(
 async def process_payment_success(
     order_id: str,
     transaction_id: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Process successful payment"""
     try:
-        order = PaymentService.process_successful_payment(
+        order = await PaymentService.process_successful_payment(
             db=db,
             order_id=order_id,
             transaction_id=transaction_id
@@ -108,7 +115,7 @@ async def process_payment_success(
         
         # Run fraud checks
         if order.upi_id:
-            FraudDetectionService.run_fraud_checks(db, order.user_id, order.upi_id)
+            await FraudDetectionService.run_fraud_checks(db, order.user_id, order.upi_id)
         
         return order
     except Exception as e:
@@ -116,10 +123,10 @@ async def process_payment_success(
 
 
 @order_router.get("/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: str, db: Session = Depends(get_db)):
+async def get_order(order_id: str, db: AsyncSession = Depends(get_db)):
     """Get order by ID"""
     from ..models import Order
-    order = db.query(Order).filter(Order.order_id == order_id).first()
+    order = await db.scalar(select(Order).where(Order.order_id == order_id))
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
@@ -129,9 +136,9 @@ async def get_order(order_id: str, db: Session = Depends(get_db)):
 wallet_router = APIRouter(prefix="/wallet", tags=["Wallet"])
 
 @wallet_router.get("/{user_id}", response_model=WalletResponse)
-async def get_wallet(user_id: int, db: Session = Depends(get_db)):
+async def get_wallet(user_id: int, db: AsyncSession = Depends(get_db)):
     """Get user wallet"""
-    wallet = WalletService.get_wallet(db, user_id)
+    wallet = await WalletService.get_wallet(db, user_id)
     return wallet
 
 
@@ -140,10 +147,10 @@ async def get_wallet_transactions(
     user_id: int,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get wallet transaction history"""
-    transactions = WalletService.get_transaction_history(db, user_id, limit, offset)
+    transactions = await WalletService.get_transaction_history(db, user_id, limit, offset)
     return [
         {
             'id': t.id,
@@ -168,11 +175,11 @@ withdrawal_router = APIRouter(prefix="/withdrawals", tags=["Withdrawals"])
 async def create_withdrawal_request(
     withdrawal_data: WithdrawalCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a withdrawal request"""
     try:
-        withdrawal = WalletService.create_withdrawal_request(
+        withdrawal = await WalletService.create_withdrawal_request(
             db=db,
             user_id=current_user.id,
             amount=withdrawal_data.amount,
@@ -192,10 +199,10 @@ async def get_my_withdrawals(
     limit: int = 50,
     offset: int = 0,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's withdrawal history"""
-    withdrawals = WalletService.get_user_withdrawals(db, current_user.id, limit, offset)
+    withdrawals = await WalletService.get_user_withdrawals(db, current_user.id, limit, offset)
     return withdrawals
 
 
@@ -203,11 +210,11 @@ async def get_my_withdrawals(
 async def cancel_withdrawal(
     withdrawal_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Cancel a pending withdrawal"""
     try:
-        withdrawal = WalletService.cancel_withdrawal(db, withdrawal_id, current_user.id)
+        withdrawal = await WalletService.cancel_withdrawal(db, withdrawal_id, current_user.id)
         return withdrawal
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -220,10 +227,10 @@ async def get_all_withdrawals(
     limit: int = 100,
     offset: int = 0,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all withdrawal requests (admin only)"""
-    withdrawals = WalletService.get_all_withdrawals(db, status, limit, offset)
+    withdrawals = await WalletService.get_all_withdrawals(db, status, limit, offset)
     return withdrawals
 
 
@@ -233,15 +240,15 @@ async def approve_withdrawal(
     payment_reference: Optional[str] = None,
     admin_notes: Optional[str] = None,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Approve a withdrawal request"""
     try:
-        withdrawal = WalletService.approve_withdrawal(
+        withdrawal = await WalletService.approve_withdrawal(
             db, withdrawal_id, current_user.id, payment_reference, admin_notes
         )
         
-        log_admin_action(
+        await log_admin_action(
             db, current_user.id, "withdrawal_approved",
             f"Approved withdrawal {withdrawal_id}",
             "withdrawal", withdrawal.id
@@ -257,13 +264,13 @@ async def mark_withdrawal_paid(
     withdrawal_id: str,
     payment_reference: Optional[str] = None,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Mark withdrawal as paid"""
     try:
-        withdrawal = WalletService.mark_withdrawal_paid(db, withdrawal_id, payment_reference)
+        withdrawal = await WalletService.mark_withdrawal_paid(db, withdrawal_id, payment_reference)
         
-        log_admin_action(
+        await log_admin_action(
             db, current_user.id, "withdrawal_paid",
             f"Marked withdrawal {withdrawal_id} as paid",
             "withdrawal", withdrawal.id
@@ -280,15 +287,15 @@ async def reject_withdrawal(
     rejection_reason: str,
     admin_notes: Optional[str] = None,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Reject a withdrawal request"""
     try:
-        withdrawal = WalletService.reject_withdrawal(
+        withdrawal = await WalletService.reject_withdrawal(
             db, withdrawal_id, current_user.id, rejection_reason, admin_notes
         )
         
-        log_admin_action(
+        await log_admin_action(
             db, current_user.id, "withdrawal_rejected",
             f"Rejected withdrawal {withdrawal_id}: {rejection_reason}",
             "withdrawal", withdrawal.id
@@ -302,10 +309,10 @@ async def reject_withdrawal(
 @withdrawal_router.get("/admin/statistics")
 async def get_withdrawal_statistics(
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get withdrawal statistics"""
-    return WalletService.get_withdrawal_statistics(db)
+    return await WalletService.get_withdrawal_statistics(db)
 
 
 # Fraud Detection Router
@@ -318,10 +325,10 @@ async def get_fraud_flags(
     limit: int = 100,
     offset: int = 0,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all fraud flags"""
-    flags = FraudDetectionService.get_all_flags(db, severity, resolved, limit, offset)
+    flags = await FraudDetectionService.get_all_flags(db, severity, resolved, limit, offset)
     return flags
 
 
@@ -330,10 +337,10 @@ async def get_user_fraud_flags(
     user_id: int,
     include_resolved: bool = False,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get fraud flags for a specific user"""
-    flags = FraudDetectionService.get_user_flags(db, user_id, include_resolved)
+    flags = await FraudDetectionService.get_user_flags(db, user_id, include_resolved)
     return flags
 
 
@@ -341,10 +348,10 @@ async def get_user_fraud_flags(
 async def create_fraud_flag(
     flag_data: FraudFlagCreate,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a manual fraud flag"""
-    flag = FraudDetectionService.create_flag(
+    flag = await FraudDetectionService.create_flag(
         db=db,
         user_id=flag_data.user_id,
         flag_type=flag_data.flag_type,
@@ -354,7 +361,7 @@ async def create_fraud_flag(
         flagged_by=current_user.id
     )
     
-    log_admin_action(
+    await log_admin_action(
         db, current_user.id, "fraud_flag_created",
         f"Created fraud flag for user {flag_data.user_id}",
         "fraud_flag", flag.id
@@ -368,13 +375,13 @@ async def resolve_fraud_flag(
     flag_id: int,
     resolution_notes: Optional[str] = None,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Resolve a fraud flag"""
     try:
-        flag = FraudDetectionService.resolve_flag(db, flag_id, current_user.id, resolution_notes)
+        flag = await FraudDetectionService.resolve_flag(db, flag_id, current_user.id, resolution_notes)
         
-        log_admin_action(
+        await log_admin_action(
             db, current_user.id, "fraud_flag_resolved",
             f"Resolved fraud flag {flag_id}",
             "fraud_flag", flag.id
@@ -390,13 +397,13 @@ async def block_user(
     user_id: int,
     reason: str,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Block a user account"""
     try:
-        FraudDetectionService.block_user(db, user_id, current_user.id, reason)
+        await FraudDetectionService.block_user(db, user_id, current_user.id, reason)
         
-        log_admin_action(
+        await log_admin_action(
             db, current_user.id, "user_blocked",
             f"Blocked user {user_id}: {reason}",
             "user", user_id
@@ -411,13 +418,13 @@ async def block_user(
 async def unblock_user(
     user_id: int,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Unblock a user account"""
     try:
-        FraudDetectionService.unblock_user(db, user_id, current_user.id)
+        await FraudDetectionService.unblock_user(db, user_id, current_user.id)
         
-        log_admin_action(
+        await log_admin_action(
             db, current_user.id, "user_unblocked",
             f"Unblocked user {user_id}",
             "user", user_id
@@ -433,10 +440,10 @@ async def run_fraud_checks(
     user_id: int,
     upi_id: Optional[str] = None,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Run fraud detection checks on a user"""
-    flags = FraudDetectionService.run_fraud_checks(db, user_id, upi_id)
+    flags = await FraudDetectionService.run_fraud_checks(db, user_id, upi_id)
     return {"flags_created": flags}
 
 
@@ -446,10 +453,10 @@ settings_router = APIRouter(prefix="/settings", tags=["System Settings"])
 @settings_router.get("/all")
 async def get_all_settings(
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all system settings"""
-    settings = AdminService.get_system_settings(db)
+    settings = await AdminService.get_system_settings(db)
     return settings
 
 
@@ -458,15 +465,15 @@ async def update_setting(
     setting_key: str,
     update_data: SystemSettingUpdate,
     current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a system setting"""
     try:
-        setting = AdminService.update_system_setting(
+        setting = await AdminService.update_system_setting(
             db, setting_key, update_data.setting_value, current_user.id
         )
         
-        log_admin_action(
+        await log_admin_action(
             db, current_user.id, "setting_updated",
             f"Updated setting {setting_key} to {update_data.setting_value}",
             "system_setting", setting.id
@@ -484,10 +491,10 @@ referral_router = APIRouter(prefix="/referrals", tags=["Referrals"])
 async def track_referral_click(
     referral_data: ReferralClick,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Track a referral link click"""
-    success = ReferralService.track_referral_click(
+    success = await ReferralService.track_referral_click(
         db=db,
         referral_code=referral_data.referral_code,
         ip_address=referral_data.ip_address or request.client.host
@@ -498,9 +505,9 @@ async def track_referral_click(
 
 @referral_router.get("/leaderboard")
 async def get_referral_leaderboard(
-    limit: int = 10,
-    db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get top referrers leaderboard"""
-    leaderboard = ReferralService.get_top_referrers(db, limit)
+    leaderboard = await ReferralService.get_top_referrers(db, limit)
     return leaderboard
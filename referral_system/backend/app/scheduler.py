@@ -1,40 +1,79 @@
 """
 Background scheduled jobs for commission processing
 """
-from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import Session
-from .database import SessionLocal
-from .services import PaymentService
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from .database import AsyncSessionLocal
+from .services import PaymentService, AdminService
+from .config import settings
+from .leaderboard import leaderboard
 import logging
 
 logger = logging.getLogger(__name__)
 
-def process_pending_commissions_job():
+async def process_pending_commissions_job():
     """
-    Scheduled job to process pending commissions
-    Runs every hour to check for commissions past their 24h hold period
+    Scheduled sweep for pending commissions
+    Commissions are normally released on time by release_queue; this catches
+    anything it missed (errors, rows credited by another worker process).
+    Settlement commits per batch, so an interrupted run just resumes next time
     """
-    db: Session = SessionLocal()
-    try:
-        count = PaymentService.process_pending_commissions(db)
-        logger.info(f"Processed {count} pending commissions")
-    except Exception as e:
-        logger.error(f"Error processing pending commissions: {e}")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        try:
+            count = await PaymentService.process_pending_commissions(db)
+            logger.info(f"Processed {count} pending commissions")
+        except Exception as e:
+            logger.error(f"Error processing pending commissions: {e}")
+
+
+async def refresh_dashboard_snapshot_job():
+    """Rebuild the dashboard snapshot so admin page loads stay memory reads"""
+    async with AsyncSessionLocal() as db:
+        try:
+            await AdminService.get_dashboard_stats(db, refresh=True)
+        except Exception as e:
+            logger.error(f"Error refreshing dashboard snapshot: {e}")
+
+
+async def reconcile_leaderboard_job():
+    """Repair leaderboard scores that drifted from the database"""
+    await leaderboard.reconcile()
 
 
 def start_scheduler():
-    """Start the background scheduler"""
-    scheduler = BackgroundScheduler()
+    """Start the background scheduler (on the app's event loop)"""
+    scheduler = AsyncIOScheduler()
     
-    # Process pending commissions every hour
+    # Backstop sweep for pending commissions
     scheduler.add_job(
         process_pending_commissions_job,
         'interval',
-        hours=1,
+        minutes=settings.COMMISSION_SWEEP_MINUTES,
         id='process_pending_commissions',
-        replace_existing=True
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Keep the dashboard snapshot warm
+    scheduler.add_job(
+        refresh_dashboard_snapshot_job,
+        'interval',
+        seconds=settings.DASHBOARD_SNAPSHOT_SECONDS,
+        id='refresh_dashboard_snapshot',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Rebuild the leaderboard so a failed Redis update does not stick
+    scheduler.add_job(
+        reconcile_leaderboard_job,
+        'interval',
+        minutes=settings.LEADERBOARD_RECONCILE_MINUTES,
+        id='reconcile_leaderboard',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
     )
     
     scheduler.start()
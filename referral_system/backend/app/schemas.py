@@ -189,6 +189,8 @@ class DashboardStats(BaseModel):
     total_profit: Decimal
     pending_withdrawals: int
     pending_withdrawal_amount: Decimal
+    orders_today: int
+    snapshot_at: datetime
 
 
 class UserManagementFilter(BaseModel):
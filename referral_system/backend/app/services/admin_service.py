@@ -1,119 +1,150 @@
 """
 Admin panel service for dashboard and management
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, desc
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, or_, desc, cast, String, Numeric, true
+from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Optional, List, Dict
+from ..config import settings
 from ..models import (
     User, Order, Wallet, WalletTransaction, Withdrawal,
     Referral, ReferralStats, FraudFlag, SystemSetting, AdminLog
 )
 
 
+class _DashboardSnapshot:
+    """Last computed dashboard stats, shared by all requests in this worker"""
+    
+    def __init__(self):
+        self.stats: Optional[Dict] = None
+        self.taken_at: Optional[datetime] = None
+        self.dirty = False
+        self.lock = asyncio.Lock()
+    
+    def is_fresh(self) -> bool:
+        if self.stats is None:
+            return False
+        age = (datetime.utcnow() - self.taken_at).total_seconds()
+        if age >= settings.DASHBOARD_SNAPSHOT_SECONDS:
+            return False
+        return not (self.dirty and age >= settings.DASHBOARD_SNAPSHOT_MIN_SECONDS)
+    
+    def store(self, stats: Dict, taken_at: datetime):
+        self.stats = stats
+        self.taken_at = taken_at
+
+
+_dashboard_snapshot = _DashboardSnapshot()
+
+
+async def _count(db: AsyncSession, query) -> int:
+    """Row count of a filtered select, for pagination"""
+    return await db.scalar(select(func.count()).select_from(query.order_by(None).subquery())) or 0
+
+
 class AdminService:
     """Service for admin panel operations"""
     
     @staticmethod
-    def get_dashboard_stats(db: Session) -> Dict:
-        """Get comprehensive dashboard statistics"""
-        today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        
-        # New users today
-        new_users_today = db.query(func.count(User.id)).filter(
-            User.join_date >= today_start
-        ).scalar() or 0
-        
-        # Buyers today (users who made purchase today)
-        buyers_today = db.query(func.count(func.distinct(Order.user_id))).filter(
-            and_(
-                Order.created_at >= today_start,
-                Order.payment_status == "success"
-            )
-        ).scalar() or 0
-        
-        # Revenue today
-        revenue_today = db.query(func.sum(Order.selling_price)).filter(
-            and_(
-                Order.created_at >= today_start,
-                Order.payment_status == "success"
-            )
-        ).scalar() or Decimal('0')
-        
-        # Profit today (revenue - making cost)
-        profit_today = db.query(func.sum(Order.profit)).filter(
-            and_(
-                Order.created_at >= today_start,
-                Order.payment_status == "success"
-            )
-        ).scalar() or Decimal('0')
-        
-        # Referral payout today (commissions credited)
-        referral_payout_today = db.query(func.sum(WalletTransaction.amount)).filter(
-            and_(
-                WalletTransaction.created_at >= today_start,
-                WalletTransaction.transaction_type == "commission_credit",
-                WalletTransaction.status == "completed"
-            )
-        ).scalar() or Decimal('0')
-        
-        # Active referrers today (who got clicks/signups)
-        active_referrers_today = db.query(func.count(func.distinct(Referral.referrer_id))).filter(
-            Referral.clicked_at >= today_start
-        ).scalar() or 0
-        
-        # Total statistics
-        total_users = db.query(func.count(User.id)).scalar() or 0
-        
-        total_buyers = db.query(func.count(func.distinct(Order.user_id))).filter(
-            Order.payment_status == "success"
-        ).scalar() or 0
-        
-        total_revenue = db.query(func.sum(Order.selling_price)).filter(
-            Order.payment_status == "success"
-        ).scalar() or Decimal('0')
-        
-        total_profit = db.query(func.sum(Order.profit)).filter(
-            Order.payment_status == "success"
-        ).scalar() or Decimal('0')
-        
-        pending_withdrawals = db.query(func.count(Withdrawal.id)).filter(
-            Withdrawal.status == "pending"
-        ).scalar() or 0
-        
-        pending_withdrawal_amount = db.query(func.sum(Withdrawal.amount)).filter(
-            Withdrawal.status == "pending"
-        ).scalar() or Decimal('0')
-        
-        # Orders today
-        orders_today = db.query(func.count(Order.id)).filter(
-            and_(
-                Order.created_at >= today_start,
-                Order.payment_status == "success"
-            )
-        ).scalar() or 0
-        
-        return {
-            'new_users_today': new_users_today,
-            'buyers_today': buyers_today,
-            'revenue_today': float(revenue_today),
-            'net_profit_today': float(profit_today),
-            'referral_payout_today': float(referral_payout_today),
-            'active_referrers_today': active_referrers_today,
-            'orders_today': orders_today,
-            'total_users': total_users,
-            'total_buyers': total_buyers,
-            'total_revenue': float(total_revenue),
-            'total_profit': float(total_profit),
-            'pending_withdrawals': pending_withdrawals,
-            'pending_withdrawal_amount': float(pending_withdrawal_amount)
-        }
+    def _dashboard_query(today_start: datetime):
+        """All dashboard counters in one statement: one aggregate CTE per table"""
+        success = Order.payment_status == "success"
+        today_order = Order.created_at >= today_start
+        
+        users = select(
+            func.count(User.id).label("total_users"),
+            func.count(User.id).filter(User.join_date >= today_start).label("new_users_today")
+        ).cte("user_totals")
+        
+        orders = select(
+            func.count(func.distinct(Order.user_id)).label("total_buyers"),
+            func.coalesce(func.sum(Order.selling_price), 0).label("total_revenue"),
+            func.coalesce(func.sum(Order.profit), 0).label("total_profit"),
+            func.count(func.distinct(Order.user_id)).filter(today_order).label("buyers_today"),
+            func.coalesce(func.sum(Order.selling_price).filter(today_order), 0).label("revenue_today"),
+            func.coalesce(func.sum(Order.profit).filter(today_order), 0).label("profit_today"),
+            func.count(Order.id).filter(today_order).label("orders_today")
+        ).where(success).cte("order_totals")
+        
+        payouts = select(
+            func.coalesce(func.sum(WalletTransaction.amount), 0).label("referral_payout_today")
+        ).where(
+            WalletTransaction.created_at >= today_start,
+            WalletTransaction.transaction_type == "commission_credit",
+            WalletTransaction.status == "completed"
+        ).cte("payout_totals")
+        
+        referrers = select(
+            func.count(func.distinct(Referral.referrer_id)).label("active_referrers_today")
+        ).where(Referral.clicked_at >= today_start).cte("referrer_totals")
+        
+        withdrawals = select(
+            func.count(Withdrawal.id).label("pending_withdrawals"),
+            func.coalesce(func.sum(Withdrawal.amount), 0).label("pending_withdrawal_amount")
+        ).where(Withdrawal.status == "pending").cte("withdrawal_totals")
+        
+        # Each CTE is a single row, so the joins are 1x1
+        return (
+            select(users, orders, payouts, referrers, withdrawals)
+            .select_from(users)
+            .join(orders, true())
+            .join(payouts, true())
+            .join(referrers, true())
+            .join(withdrawals, true())
+        )
+    
+    @staticmethod
+    async def get_dashboard_stats(db: AsyncSession, refresh: bool = False) -> Dict:
+        """
+        Get comprehensive dashboard statistics
+        
+        Served from an in-memory snapshot. It is rebuilt when older than
+        DASHBOARD_SNAPSHOT_SECONDS, or after a write event once it is at least
+        DASHBOARD_SNAPSHOT_MIN_SECONDS old, so bursts of writes share one query.
+        """
+        if not refresh and _dashboard_snapshot.is_fresh():
+            return _dashboard_snapshot.stats
+        
+        async with _dashboard_snapshot.lock:
+            # Another request may have rebuilt it while we waited
+            if not refresh and _dashboard_snapshot.is_fresh():
+                return _dashboard_snapshot.stats
+            
+            _dashboard_snapshot.dirty = False
+            taken_at = datetime.utcnow()
+            today_start = datetime.combine(taken_at.date(), datetime.min.time())
+            row = (await db.execute(AdminService._dashboard_query(today_start))).one()
+            
+            stats = {
+                'new_users_today': row.new_users_today,
+                'buyers_today': row.buyers_today,
+                'revenue_today': float(row.revenue_today),
+                'net_profit_today': float(row.profit_today),
+                'referral_payout_today': float(row.referral_payout_today),
+                'active_referrers_today': row.active_referrers_today,
+                'orders_today': row.orders_today,
+                'total_users': row.total_users,
+                'total_buyers': row.total_buyers,
+                'total_revenue': float(row.total_revenue),
+                'total_profit': float(row.total_profit),
+                'pending_withdrawals': row.pending_withdrawals,
+                'pending_withdrawal_amount': float(row.pending_withdrawal_amount),
+                'snapshot_at': taken_at
+            }
+            _dashboard_snapshot.store(stats, taken_at)
+            return stats
+    
+    @staticmethod
+    def invalidate_dashboard_stats():
+        """Mark the dashboard snapshot stale after a write that changes its numbers"""
+        _dashboard_snapshot.dirty = True
     
     @staticmethod
-    def get_users(
-        db: Session,
+    async def get_users(
+        db: AsyncSession,
         search: Optional[str] = None,
         user_type: Optional[str] = None,
         is_buyer: Optional[bool] = None,
@@ -124,42 +155,42 @@ class AdminService:
         limit: int = 50
     ) -> Dict:
         """Get filtered and paginated user list"""
-        query = db.query(User)
+        query = select(User)
         
         # Apply filters
         if search:
-            query = query.filter(
+            query = query.where(
                 or_(
                     User.username.ilike(f"%{search}%"),
                     User.first_name.ilike(f"%{search}%"),
-                    User.telegram_id.cast(db.bind.dialect.NUMERIC).like(f"%{search}%")
+                    cast(User.telegram_id, String).like(f"%{search}%")
                 )
             )
         
         if user_type:
-            query = query.filter(User.user_type == user_type)
+            query = query.where(User.user_type == user_type)
         
         if is_buyer is not None:
             if is_buyer:
-                query = query.filter(User.total_orders > 0)
+                query = query.where(User.total_orders > 0)
             else:
-                query = query.filter(User.total_orders == 0)
+                query = query.where(User.total_orders == 0)
         
         if is_suspicious is not None:
-            query = query.filter(User.is_suspicious == is_suspicious)
+            query = query.where(User.is_suspicious == is_suspicious)
         
         if date_from:
-            query = query.filter(User.join_date >= date_from)
+            query = query.where(User.join_date >= date_from)
         
         if date_to:
-            query = query.filter(User.join_date <= date_to)
+            query = query.where(User.join_date <= date_to)
         
         # Get total count
-        total = query.count()
+        total = await _count(db, query)
         
         # Paginate
         offset = (page - 1) * limit
-        users = query.order_by(desc(User.join_date)).offset(offset).limit(limit).all()
+        users = (await db.scalars(query.order_by(desc(User.join_date)).offset(offset).limit(limit))).all()
         
         # Calculate pages
         pages = (total + limit - 1) // limit
@@ -173,8 +204,8 @@ class AdminService:
         }
     
     @staticmethod
-    def get_orders(
-        db: Session,
+    async def get_orders(
+        db: AsyncSession,
         search: Optional[str] = None,
         payment_status: Optional[str] = None,
         date_from: Optional[datetime] = None,
@@ -183,11 +214,11 @@ class AdminService:
         limit: int = 50
     ) -> Dict:
         """Get filtered and paginated order list"""
-        query = db.query(Order)
+        query = select(Order)
         
         # Apply filters
         if search:
-            query = query.filter(
+            query = query.where(
                 or_(
                     Order.order_id.ilike(f"%{search}%"),
                     Order.transaction_id.ilike(f"%{search}%")
@@ -195,20 +226,20 @@ class AdminService:
             )
         
         if payment_status:
-            query = query.filter(Order.payment_status == payment_status)
+            query = query.where(Order.payment_status == payment_status)
         
         if date_from:
-            query = query.filter(Order.created_at >= date_from)
+            query = query.where(Order.created_at >= date_from)
         
         if date_to:
-            query = query.filter(Order.created_at <= date_to)
+            query = query.where(Order.created_at <= date_to)
         
         # Get total count
-        total = query.count()
+        total = await _count(db, query)
         
         # Paginate
         offset = (page - 1) * limit
-        orders = query.order_by(desc(Order.created_at)).offset(offset).limit(limit).all()
+        orders = (await db.scalars(query.order_by(desc(Order.created_at)).offset(offset).limit(limit))).all()
         
         # Calculate pages
         pages = (total + limit - 1) // limit
@@ -222,52 +253,115 @@ class AdminService:
         }
     
     @staticmethod
-    def get_referrer_performance(
-        db: Session,
+    def _referrer_metrics():
+        """
+        Per-referrer metric columns: the cached ReferralStats row where one
+        exists, otherwise the same numbers aggregated set-based from
+        referrals, users and wallets.
+        """
+        clicks = (
+            select(
+                Referral.referrer_id,
+                func.count(Referral.id).label("clicks"),
+                func.count(func.distinct(Referral.referred_user_id)).label("referrals"),
+                func.count(Referral.id).filter(Referral.converted == True).label("buyers")
+            )
+            .group_by(Referral.referrer_id)
+            .subquery()
+        )
+        referred = aliased(User)
+        levels = (
+            select(
+                referred.referred_by,
+                func.count(referred.id).filter(referred.referral_level == 1).label("level1"),
+                func.count(referred.id).filter(referred.referral_level == 2).label("level2")
+            )
+            .where(referred.referred_by.isnot(None))
+            .group_by(referred.referred_by)
+            .subquery()
+        )
+        
+        computed_clicks = func.coalesce(clicks.c.clicks, 0)
+        computed_buyers = func.coalesce(clicks.c.buyers, 0)
+        metrics = {
+            'total_clicks': func.coalesce(ReferralStats.total_clicks, computed_clicks),
+            'total_referrals': func.coalesce(ReferralStats.total_referrals, clicks.c.referrals, 0),
+            'level1_referrals': func.coalesce(ReferralStats.level1_referrals, levels.c.level1, 0),
+            'level2_referrals': func.coalesce(ReferralStats.level2_referrals, levels.c.level2, 0),
+            'total_buyers': func.coalesce(ReferralStats.total_buyers, computed_buyers),
+            'conversion_rate': func.coalesce(
+                ReferralStats.conversion_rate,
+                func.round(cast(computed_buyers * 100, Numeric) / func.nullif(computed_clicks, 0), 2),
+                0
+            ),
+            'total_commission_earned': func.coalesce(ReferralStats.total_commission_earned, Wallet.total_earned, 0),
+            'total_commission_paid': func.coalesce(ReferralStats.total_commission_paid, Wallet.total_withdrawn, 0),
+            'pending_commission': func.coalesce(ReferralStats.pending_commission, Wallet.pending_balance, 0)
+        }
+        joins = [
+            (ReferralStats, ReferralStats.user_id == User.id),
+            (clicks, clicks.c.referrer_id == User.id),
+            (levels, levels.c.referred_by == User.id),
+            (Wallet, Wallet.user_id == User.id)
+        ]
+        return metrics, joins
+    
+    @staticmethod
+    async def get_referrer_performance(
+        db: AsyncSession,
         page: int = 1,
-        limit: int = 50
+        limit: int = 50,
+        sort_by: str = "total_commission_earned",
+        sort_order: str = "desc"
     ) -> Dict:
-        """Get referrer performance metrics"""
-        # Get users who are referrers or admins
-        query = db.query(User).filter(
-            User.user_type.in_(['referrer', 'admin', 'super_admin'])
+        """Get referrer performance metrics, sortable by any metric"""
+        metrics, joins = AdminService._referrer_metrics()
+        if sort_by not in metrics:
+            raise ValueError(f"Invalid sort_by, expected one of: {', '.join(metrics)}")
+        if sort_order not in ("asc", "desc"):
+            raise ValueError("Invalid sort_order, expected 'asc' or 'desc'")
+        
+        sort_column = metrics[sort_by]
+        sort_column = sort_column.asc() if sort_order == "asc" else sort_column.desc()
+        
+        # Get users who are referrers or admins, with every metric in one query
+        query = select(
+            User.id, User.telegram_id, User.username, User.first_name, User.referral_code, User.user_type,
+            *(column.label(name) for name, column in metrics.items()),
+            func.count().over().label("total_rows")
         )
+        for target, onclause in joins:
+            query = query.outerjoin(target, onclause)
+        query = query.where(User.user_type.in_(['referrer', 'admin', 'super_admin']))
         
-        total = query.count()
         offset = (page - 1) * limit
+        rows = (await db.execute(query.order_by(sort_column, User.id).offset(offset).limit(limit))).all()
         
-        users = query.offset(offset).limit(limit).all()
+        if rows:
+            total = rows[0].total_rows
+        else:
+            total = await _count(db, select(User.id).where(User.user_type.in_(['referrer', 'admin', 'super_admin'])))
         
         result = []
-        for user in users:
-            # Get stats
-            stats = db.query(ReferralStats).filter(ReferralStats.user_id == user.id).first()
-            
-            if not stats:
-                # Calculate on the fly
-                from .referral_service import ReferralService
-                stats_dict = ReferralService.get_referral_stats(db, user.id)
-            else:
-                stats_dict = {
-                    'total_clicks': stats.total_clicks,
-                    'total_referrals': stats.total_referrals,
-                    'level1_referrals': stats.level1_referrals,
-                    'level2_referrals': stats.level2_referrals,
-                    'total_buyers': stats.total_buyers,
-                    'conversion_rate': float(stats.conversion_rate),
-                    'total_commission_earned': float(stats.total_commission_earned),
-                    'total_commission_paid': float(stats.total_commission_paid),
-                    'pending_commission': float(stats.pending_commission)
-                }
-            
+        for row in rows:
             result.append({
-                'user_id': user.id,
-                'telegram_id': user.telegram_id,
-                'username': user.username,
-                'first_name': user.first_name,
-                'referral_code': user.referral_code,
-                'user_type': user.user_type,
-                'stats': stats_dict
+                'user_id': row.id,
+                'telegram_id': row.telegram_id,
+                'username': row.username,
+                'first_name': row.first_name,
+                'referral_code': row.referral_code,
+                'user_type': row.user_type,
+                'stats': {
+                    'total_clicks': row.total_clicks,
+                    'total_referrals': row.total_referrals,
+                    'level1_referrals': row.level1_referrals,
+                    'level2_referrals': row.level2_referrals,
+                    'total_buyers': row.total_buyers,
+                    'conversion_rate': float(row.conversion_rate),
+                    'total_commission_earned': float(row.total_commission_earned),
+                    'total_commission_paid': float(row.total_commission_paid),
+                    'pending_commission': float(row.pending_commission)
+                }
             })
         
         pages = (total + limit - 1) // limit
@@ -281,49 +375,49 @@ class AdminService:
         }
     
     @staticmethod
-    def get_payment_monitoring(db: Session, days: int = 7) -> Dict:
+    async def get_payment_monitoring(db: AsyncSession, days: int = 7) -> Dict:
         """Get payment monitoring statistics"""
         date_from = datetime.utcnow() - timedelta(days=days)
         
         # QR generated count (all orders created)
-        qr_generated = db.query(func.count(Order.id)).filter(
+        qr_generated = await db.scalar(select(func.count(Order.id)).where(
             Order.created_at >= date_from
-        ).scalar() or 0
+        )) or 0
         
         # Payment success count
-        payment_success = db.query(func.count(Order.id)).filter(
+        payment_success = await db.scalar(select(func.count(Order.id)).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "success"
             )
-        ).scalar() or 0
+        )) or 0
         
         # Payment failed
-        payment_failed = db.query(func.count(Order.id)).filter(
+        payment_failed = await db.scalar(select(func.count(Order.id)).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "failed"
             )
-        ).scalar() or 0
+        )) or 0
         
         # Payment pending (dropoffs)
-        payment_dropoff = db.query(func.count(Order.id)).filter(
+        payment_dropoff = await db.scalar(select(func.count(Order.id)).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "pending"
             )
-        ).scalar() or 0
+        )) or 0
         
         # Conversion rate
         conversion_rate = (payment_success / qr_generated * 100) if qr_generated > 0 else 0
         
         # Average order value
-        avg_order_value = db.query(func.avg(Order.selling_price)).filter(
+        avg_order_value = await db.scalar(select(func.avg(Order.selling_price)).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "success"
             )
-        ).scalar() or Decimal('0')
+        )) or Decimal('0')
         
         return {
             'period_days': days,
@@ -336,21 +430,21 @@ class AdminService:
         }
     
     @staticmethod
-    def get_system_settings(db: Session) -> List[SystemSetting]:
+    async def get_system_settings(db: AsyncSession) -> List[SystemSetting]:
         """Get all system settings"""
-        return db.query(SystemSetting).all()
+        return list((await db.scalars(select(SystemSetting))).all())
     
     @staticmethod
-    def update_system_setting(
-        db: Session,
+    async def update_system_setting(
+        db: AsyncSession,
         setting_key: str,
         setting_value: str,
         updated_by: int
     ) -> SystemSetting:
         """Update a system setting"""
-        setting = db.query(SystemSetting).filter(
+        setting = await db.scalar(select(SystemSetting).where(
             SystemSetting.setting_key == setting_key
-        ).first()
+        ))
         
         if not setting:
             raise ValueError("Setting not found")
@@ -359,14 +453,14 @@ class AdminService:
         setting.updated_by = updated_by
         setting.updated_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(setting)
+        await db.commit()
+        await db.refresh(setting)
         
         return setting
     
     @staticmethod
-    def get_audit_logs(
-        db: Session,
+    async def get_audit_logs(
+        db: AsyncSession,
         admin_id: Optional[int] = None,
         action_type: Optional[str] = None,
         date_from: Optional[datetime] = None,
@@ -375,24 +469,24 @@ class AdminService:
         limit: int = 100
     ) -> Dict:
         """Get admin audit logs"""
-        query = db.query(AdminLog)
+        query = select(AdminLog)
         
         if admin_id:
-            query = query.filter(AdminLog.admin_id == admin_id)
+            query = query.where(AdminLog.admin_id == admin_id)
         
         if action_type:
-            query = query.filter(AdminLog.action_type == action_type)
+            query = query.where(AdminLog.action_type == action_type)
         
         if date_from:
-            query = query.filter(AdminLog.created_at >= date_from)
+            query = query.where(AdminLog.created_at >= date_from)
         
         if date_to:
-            query = query.filter(AdminLog.created_at <= date_to)
+            query = query.where(AdminLog.created_at <= date_to)
         
-        total = query.count()
+        total = await _count(db, query)
         offset = (page - 1) * limit
         
-        logs = query.order_by(desc(AdminLog.created_at)).offset(offset).limit(limit).all()
+        logs = (await db.scalars(query.order_by(desc(AdminLog.created_at)).offset(offset).limit(limit))).all()
         
         pages = (total + limit - 1) // limit
         
@@ -405,60 +499,60 @@ class AdminService:
         }
     
     @staticmethod
-    def get_kpi_metrics(db: Session, days: int = 30) -> Dict:
+    async def get_kpi_metrics(db: AsyncSession, days: int = 30) -> Dict:
         """Get key performance indicators"""
         date_from = datetime.utcnow() - timedelta(days=days)
         
         # Daily buyers
-        daily_buyers = db.query(
+        daily_buyers = (await db.execute(select(
             func.date(Order.created_at).label('date'),
             func.count(func.distinct(Order.user_id)).label('buyers')
-        ).filter(
+        ).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "success"
             )
-        ).group_by(func.date(Order.created_at)).all()
+        ).group_by(func.date(Order.created_at)))).all()
         
         # Overall conversion rate
-        total_users = db.query(func.count(User.id)).filter(
+        total_users = await db.scalar(select(func.count(User.id)).where(
             User.join_date >= date_from
-        ).scalar() or 0
+        )) or 0
         
-        total_buyers = db.query(func.count(func.distinct(Order.user_id))).filter(
+        total_buyers = await db.scalar(select(func.count(func.distinct(Order.user_id))).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "success"
             )
-        ).scalar() or 0
+        )) or 0
         
         conversion_rate = (total_buyers / total_users * 100) if total_users > 0 else 0
         
         # Referral sales percentage
-        total_sales = db.query(func.count(Order.id)).filter(
+        total_sales = await db.scalar(select(func.count(Order.id)).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "success"
             )
-        ).scalar() or 0
+        )) or 0
         
-        referral_sales = db.query(func.count(Order.id)).filter(
+        referral_sales = await db.scalar(select(func.count(Order.id)).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "success",
                 Order.referral_source.isnot(None)
             )
-        ).scalar() or 0
+        )) or 0
         
         referral_sales_percent = (referral_sales / total_sales * 100) if total_sales > 0 else 0
         
         # Net profit per day
-        total_profit = db.query(func.sum(Order.profit)).filter(
+        total_profit = await db.scalar(select(func.sum(Order.profit)).where(
             and_(
                 Order.created_at >= date_from,
                 Order.payment_status == "success"
             )
-        ).scalar() or Decimal('0')
+        )) or Decimal('0')
         
         net_profit_per_day = float(total_profit) / days if days > 0 else 0
         
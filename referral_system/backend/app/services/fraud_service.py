@@ -1,8 +1,8 @@
 """
 Fraud detection and prevention service
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_
 from typing import List, Optional
 from datetime import datetime, timedelta
 from ..models import FraudFlag, User, Order, Referral
@@ -12,22 +12,22 @@ class FraudDetectionService:
     """Service for detecting and managing fraudulent activity"""
     
     @staticmethod
-    def check_duplicate_upi(db: Session, upi_id: str, user_id: int) -> bool:
+    async def check_duplicate_upi(db: AsyncSession, upi_id: str, user_id: int) -> bool:
         """Check if UPI ID has been used by multiple users"""
         if not upi_id:
             return False
         
         # Count how many different users have used this UPI
-        user_count = db.query(func.count(func.distinct(Order.user_id))).filter(
+        user_count = await db.scalar(select(func.count(func.distinct(Order.user_id))).where(
             and_(
                 Order.upi_id == upi_id,
                 Order.payment_status == "success"
             )
-        ).scalar() or 0
+        )) or 0
         
         if user_count > 1:
             # Flag the current user
-            FraudDetectionService.create_flag(
+            await FraudDetectionService.create_flag(
                 db=db,
                 user_id=user_id,
                 flag_type="duplicate_upi",
@@ -40,18 +40,18 @@ class FraudDetectionService:
         return False
     
     @staticmethod
-    def check_duplicate_device(db: Session, device_id: str, user_id: int) -> bool:
+    async def check_duplicate_device(db: AsyncSession, device_id: str, user_id: int) -> bool:
         """Check if device has been used by multiple users"""
         if not device_id:
             return False
         
         # Count how many different users have this device
-        user_count = db.query(func.count(User.id)).filter(
+        user_count = await db.scalar(select(func.count(User.id)).where(
             User.device_id == device_id
-        ).scalar() or 0
+        )) or 0
         
         if user_count > 2:  # Allow 2 users per device (family sharing)
-            FraudDetectionService.create_flag(
+            await FraudDetectionService.create_flag(
                 db=db,
                 user_id=user_id,
                 flag_type="duplicate_device",
@@ -64,18 +64,18 @@ class FraudDetectionService:
         return False
     
     @staticmethod
-    def check_duplicate_ip(db: Session, ip_address: str, user_id: int) -> bool:
+    async def check_duplicate_ip(db: AsyncSession, ip_address: str, user_id: int) -> bool:
         """Check if IP address has been used by multiple users"""
         if not ip_address:
             return False
         
         # Count how many different users have this IP
-        user_count = db.query(func.count(User.id)).filter(
+        user_count = await db.scalar(select(func.count(User.id)).where(
             User.ip_address == ip_address
-        ).scalar() or 0
+        )) or 0
         
         if user_count > 5:  # Allow multiple users per IP (shared networks)
-            FraudDetectionService.create_flag(
+            await FraudDetectionService.create_flag(
                 db=db,
                 user_id=user_id,
                 flag_type="duplicate_ip",
@@ -88,32 +88,32 @@ class FraudDetectionService:
         return False
     
     @staticmethod
-    def check_referral_pattern(db: Session, user_id: int) -> bool:
+    async def check_referral_pattern(db: AsyncSession, user_id: int) -> bool:
         """Check for suspicious referral patterns"""
         # Get referral stats
-        total_referrals = db.query(func.count(Referral.id)).filter(
+        total_referrals = await db.scalar(select(func.count(Referral.id)).where(
             and_(
                 Referral.referrer_id == user_id,
                 Referral.referred_user_id.isnot(None)
             )
-        ).scalar() or 0
+        )) or 0
         
         if total_referrals < 10:
             return False  # Not enough data
         
         # Check conversion rate
-        conversions = db.query(func.count(Referral.id)).filter(
+        conversions = await db.scalar(select(func.count(Referral.id)).where(
             and_(
                 Referral.referrer_id == user_id,
                 Referral.converted == True
             )
-        ).scalar() or 0
+        )) or 0
         
         conversion_rate = (conversions / total_referrals) * 100 if total_referrals > 0 else 0
         
         # Flag if very low conversion rate (potential fake referrals)
         if conversion_rate < 5 and total_referrals > 20:
-            FraudDetectionService.create_flag(
+            await FraudDetectionService.create_flag(
                 db=db,
                 user_id=user_id,
                 flag_type="high_referral_low_conversion",
@@ -130,25 +130,25 @@ class FraudDetectionService:
         return False
     
     @staticmethod
-    def check_rapid_signups(db: Session, user_id: int) -> bool:
+    async def check_rapid_signups(db: AsyncSession, user_id: int) -> bool:
         """Check if user is creating rapid referral signups"""
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             return False
         
         # Check signups in last 24 hours
         yesterday = datetime.utcnow() - timedelta(days=1)
         
-        recent_referrals = db.query(func.count(User.id)).filter(
+        recent_referrals = await db.scalar(select(func.count(User.id)).where(
             and_(
                 User.referred_by == user_id,
                 User.join_date >= yesterday
             )
-        ).scalar() or 0
+        )) or 0
         
         # Flag if more than 10 referrals in 24 hours
         if recent_referrals > 10:
-            FraudDetectionService.create_flag(
+            await FraudDetectionService.create_flag(
                 db=db,
                 user_id=user_id,
                 flag_type="suspicious_pattern",
@@ -164,10 +164,10 @@ class FraudDetectionService:
         return False
     
     @staticmethod
-    def check_same_user_referrals(db: Session, user_id: int) -> bool:
+    async def check_same_user_referrals(db: AsyncSession, user_id: int) -> bool:
         """Check if referrals are from similar looking accounts"""
         # Get all referrals
-        referrals = db.query(User).filter(User.referred_by == user_id).all()
+        referrals = (await db.scalars(select(User).where(User.referred_by == user_id))).all()
         
         if len(referrals) < 5:
             return False
@@ -181,7 +181,7 @@ class FraudDetectionService:
         unique_ips = len(set(ip_addresses))
         
         if len(device_ids) > 0 and unique_devices / len(device_ids) < 0.3:
-            FraudDetectionService.create_flag(
+            await FraudDetectionService.create_flag(
                 db=db,
                 user_id=user_id,
                 flag_type="suspicious_pattern",
@@ -197,8 +197,8 @@ class FraudDetectionService:
         return False
     
     @staticmethod
-    def create_flag(
-        db: Session,
+    async def create_flag(
+        db: AsyncSession,
         user_id: int,
         flag_type: str,
         severity: str,
@@ -209,13 +209,13 @@ class FraudDetectionService:
     ) -> FraudFlag:
         """Create a fraud flag"""
         # Check if similar flag already exists
-        existing_flag = db.query(FraudFlag).filter(
+        existing_flag = await db.scalar(select(FraudFlag).where(
             and_(
                 FraudFlag.user_id == user_id,
                 FraudFlag.flag_type == flag_type,
                 FraudFlag.resolved == False
             )
-        ).first()
+        ).limit(1))
         
         if existing_flag:
             return existing_flag
@@ -225,7 +225,7 @@ class FraudDetectionService:
             flag_type=flag_type,
             severity=severity,
             description=description,
-            metadata=metadata,
+            metadata_=metadata,
             auto_detected=auto_detected,
             flagged_by=flagged_by
         )
@@ -234,24 +234,24 @@ class FraudDetectionService:
         
         # Mark user as suspicious if high or critical severity
         if severity in ['high', 'critical']:
-            user = db.query(User).filter(User.id == user_id).first()
+            user = await db.get(User, user_id)
             if user:
                 user.is_suspicious = True
         
-        db.commit()
-        db.refresh(flag)
+        await db.commit()
+        await db.refresh(flag)
         
         return flag
     
     @staticmethod
-    def resolve_flag(
-        db: Session,
+    async def resolve_flag(
+        db: AsyncSession,
         flag_id: int,
         resolved_by: int,
         resolution_notes: Optional[str] = None
     ) -> FraudFlag:
         """Resolve a fraud flag"""
-        flag = db.query(FraudFlag).filter(FraudFlag.id == flag_id).first()
+        flag = await db.get(FraudFlag, flag_id)
         if not flag:
             raise ValueError("Flag not found")
         
@@ -261,97 +261,97 @@ class FraudDetectionService:
         flag.resolution_notes = resolution_notes
         
         # Check if user has any other unresolved flags
-        other_flags = db.query(FraudFlag).filter(
+        other_flags = await db.scalar(select(func.count(FraudFlag.id)).where(
             and_(
                 FraudFlag.user_id == flag.user_id,
                 FraudFlag.resolved == False,
                 FraudFlag.id != flag_id
             )
-        ).count()
+        ))
         
         # Remove suspicious status if no other flags
         if other_flags == 0:
-            user = db.query(User).filter(User.id == flag.user_id).first()
+            user = await db.get(User, flag.user_id)
             if user:
                 user.is_suspicious = False
         
-        db.commit()
-        db.refresh(flag)
+        await db.commit()
+        await db.refresh(flag)
         
         return flag
     
     @staticmethod
-    def get_user_flags(
-        db: Session,
+    async def get_user_flags(
+        db: AsyncSession,
         user_id: int,
         include_resolved: bool = False
     ) -> List[FraudFlag]:
         """Get all flags for a user"""
-        query = db.query(FraudFlag).filter(FraudFlag.user_id == user_id)
+        query = select(FraudFlag).where(FraudFlag.user_id == user_id)
         
         if not include_resolved:
-            query = query.filter(FraudFlag.resolved == False)
+            query = query.where(FraudFlag.resolved == False)
         
-        return query.order_by(FraudFlag.created_at.desc()).all()
+        return list((await db.scalars(query.order_by(FraudFlag.created_at.desc()))).all())
     
     @staticmethod
-    def get_all_flags(
-        db: Session,
+    async def get_all_flags(
+        db: AsyncSession,
         severity: Optional[str] = None,
         resolved: Optional[bool] = None,
         limit: int = 100,
         offset: int = 0
     ) -> List[FraudFlag]:
         """Get all fraud flags"""
-        query = db.query(FraudFlag)
+        query = select(FraudFlag)
         
         if severity:
-            query = query.filter(FraudFlag.severity == severity)
+            query = query.where(FraudFlag.severity == severity)
         
         if resolved is not None:
-            query = query.filter(FraudFlag.resolved == resolved)
+            query = query.where(FraudFlag.resolved == resolved)
         
-        return query.order_by(FraudFlag.created_at.desc()).offset(offset).limit(limit).all()
+        return list((await db.scalars(query.order_by(FraudFlag.created_at.desc()).offset(offset).limit(limit))).all())
     
     @staticmethod
-    def run_fraud_checks(db: Session, user_id: int, upi_id: Optional[str] = None) -> List[FraudFlag]:
+    async def run_fraud_checks(db: AsyncSession, user_id: int, upi_id: Optional[str] = None) -> List[FraudFlag]:
         """Run all fraud checks for a user"""
         flags = []
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             return flags
         
         # Check duplicate UPI
-        if upi_id and FraudDetectionService.check_duplicate_upi(db, upi_id, user_id):
+        if upi_id and await FraudDetectionService.check_duplicate_upi(db, upi_id, user_id):
             flags.append("duplicate_upi")
         
         # Check duplicate device
-        if user.device_id and FraudDetectionService.check_duplicate_device(db, user.device_id, user_id):
+        if user.device_id and await FraudDetectionService.check_duplicate_device(db, user.device_id, user_id):
             flags.append("duplicate_device")
         
         # Check duplicate IP
-        if user.ip_address and FraudDetectionService.check_duplicate_ip(db, user.ip_address, user_id):
+        if user.ip_address and await FraudDetectionService.check_duplicate_ip(db, user.ip_address, user_id):
             flags.append("duplicate_ip")
         
         # Check referral patterns
-        if FraudDetectionService.check_referral_pattern(db, user_id):
+        if await FraudDetectionService.check_referral_pattern(db, user_id):
             flags.append("high_referral_low_conversion")
         
         # Check rapid signups
-        if FraudDetectionService.check_rapid_signups(db, user_id):
+        if await FraudDetectionService.check_rapid_signups(db, user_id):
             flags.append("suspicious_pattern")
         
         # Check same user referrals
-        if FraudDetectionService.check_same_user_referrals(db, user_id):
+        if await FraudDetectionService.check_same_user_referrals(db, user_id):
             flags.append("suspicious_pattern")
         
         return flags
     
     @staticmethod
-    def block_user(db: Session, user_id: int, admin_id: int, reason: str):
+    async def block_user(db: AsyncSession, user_id: int, admin_id: int, reason: str):
         """Block a user account"""
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise ValueError("User not found")
         
@@ -359,7 +359,7 @@ class FraudDetectionService:
         user.is_suspicious = True
         
         # Create flag
-        FraudDetectionService.create_flag(
+        await FraudDetectionService.create_flag(
             db=db,
             user_id=user_id,
             flag_type="manual_flag",
@@ -369,25 +369,25 @@ class FraudDetectionService:
             flagged_by=admin_id
         )
         
-        db.commit()
+        await db.commit()
     
     @staticmethod
-    def unblock_user(db: Session, user_id: int, admin_id: int):
+    async def unblock_user(db: AsyncSession, user_id: int, admin_id: int):
         """Unblock a user account"""
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise ValueError("User not found")
         
         user.is_blocked = False
         
         # Resolve all manual flags
-        manual_flags = db.query(FraudFlag).filter(
+        manual_flags = (await db.scalars(select(FraudFlag).where(
             and_(
                 FraudFlag.user_id == user_id,
                 FraudFlag.flag_type == "manual_flag",
                 FraudFlag.resolved == False
             )
-        ).all()
+        ))).all()
         
         for flag in manual_flags:
             flag.resolved = True
@@ -395,4 +395,4 @@ class FraudDetectionService:
             flag.resolved_by = admin_id
             flag.resolution_notes = "User unblocked by admin"
         
-        db.commit()
+        await db.commit()
@@ -1,30 +1,33 @@
 """
 Payment processing and commission calculation service
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, and_
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Optional
+from typing import Optional, List
 import uuid
 from ..models import Order, User, Wallet, WalletTransaction
 from ..config import settings
+from ..release_queue import release_queue
+from ..leaderboard import leaderboard
 from .referral_service import ReferralService
+from .admin_service import AdminService
 
 
 class PaymentService:
     """Service for payment processing and commission calculation"""
     
     @staticmethod
-    def create_order(
-        db: Session,
+    async def create_order(
+        db: AsyncSession,
         user_id: int,
         payment_method: str = "upi",
         upi_id: Optional[str] = None,
         transaction_id: Optional[str] = None
     ) -> Order:
         """Create a new order"""
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise ValueError("User not found")
         
@@ -57,14 +60,14 @@ class PaymentService:
         )
         
         db.add(order)
-        db.commit()
-        db.refresh(order)
+        await db.commit()
+        await db.refresh(order)
         
         return order
     
     @staticmethod
-    def process_successful_payment(
-        db: Session,
+    async def process_successful_payment(
+        db: AsyncSession,
         order_id: str,
         transaction_id: Optional[str] = None
     ) -> Order:
@@ -77,7 +80,7 @@ class PaymentService:
         3. Marks referral as converted
         4. Creates pending commission entries (to be credited after 24h)
         """
-        order = db.query(Order).filter(Order.order_id == order_id).first()
+        order = await db.scalar(select(Order).where(Order.order_id == order_id))
         if not order:
             raise ValueError("Order not found")
         
@@ -91,27 +94,28 @@ class PaymentService:
             order.transaction_id = transaction_id
         
         # Update user stats
-        user = db.query(User).filter(User.id == order.user_id).first()
+        user = await db.get(User, order.user_id)
         user.total_spent += order.selling_price
         user.total_orders += 1
         user.last_active = datetime.utcnow()
         
         # Mark referral as converted (first purchase)
         if user.total_orders == 1:
-            ReferralService.mark_referral_converted(db, user.id)
+            await ReferralService.mark_referral_converted(db, user.id)
         
         # Process commissions if eligible
         if order.commission_eligible and not order.commission_processed:
-            PaymentService._create_pending_commissions(db, order)
+            await PaymentService._create_pending_commissions(db, order)
             order.commission_processed = True
         
-        db.commit()
-        db.refresh(order)
+        await db.commit()
+        await db.refresh(order)
+        AdminService.invalidate_dashboard_stats()
         
         return order
     
     @staticmethod
-    def _create_pending_commissions(db: Session, order: Order):
+    async def _create_pending_commissions(db: AsyncSession, order: Order):
         """
         Create pending commission entries for referrers
         
@@ -120,15 +124,15 @@ class PaymentService:
         - Level 2 referrer: 10% of profit = ₹9
         - Commission held for 24 hours before becoming withdrawable
         """
-        user = db.query(User).filter(User.id == order.user_id).first()
+        user = await db.get(User, order.user_id)
         
         if not user or not user.referred_by:
             return
         
         # Get level 1 referrer
-        level1_referrer = db.query(User).filter(User.id == user.referred_by).first()
+        level1_referrer = await db.get(User, user.referred_by)
         if level1_referrer and user.referral_level >= 1:
-            PaymentService._credit_commission(
+            await PaymentService._credit_commission(
                 db=db,
                 user_id=level1_referrer.id,
                 order_id=order.id,
@@ -139,9 +143,9 @@ class PaymentService:
         
         # Get level 2 referrer (referrer's referrer)
         if level1_referrer and level1_referrer.referred_by:
-            level2_referrer = db.query(User).filter(User.id == level1_referrer.referred_by).first()
+            level2_referrer = await db.get(User, level1_referrer.referred_by)
             if level2_referrer:
-                PaymentService._credit_commission(
+                await PaymentService._credit_commission(
                     db=db,
                     user_id=level2_referrer.id,
                     order_id=order.id,
@@ -151,8 +155,8 @@ class PaymentService:
                 )
     
     @staticmethod
-    def _credit_commission(
-        db: Session,
+    async def _credit_commission(
+        db: AsyncSession,
         user_id: int,
         order_id: int,
         amount: Decimal,
@@ -160,11 +164,18 @@ class PaymentService:
         description: str
     ):
         """Credit commission to user wallet (pending for 24 hours)"""
-        wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+        # Lock and re-read the wallet: settlement updates balances in SQL, so
+        # the += / -= below must not start from a stale read
+        wallet = await db.scalar(
+            select(Wallet)
+            .where(Wallet.user_id == user_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
         if not wallet:
             wallet = Wallet(user_id=user_id)
             db.add(wallet)
-            db.flush()
+            await db.flush()
         
         # Update wallet balances
         balance_before = wallet.total_balance
@@ -191,47 +202,129 @@ class PaymentService:
         )
         
         db.add(transaction)
-        db.commit()
+        await db.commit()
+        
+        # Wake the release worker at exactly this due time
+        release_queue.push(transaction.id, available_at)
+        await leaderboard.record_commission(user_id, amount)
     
     @staticmethod
-    def process_pending_commissions(db: Session):
+    def _settlement_batch(now: datetime, after_id: int, batch_size: int, ids: Optional[List[int]] = None):
         """
-        Process pending commissions that are past their hold period
-        This should be run as a scheduled job
+        One settlement batch as a single statement:
+        claim the next `batch_size` due commissions after `after_id` (keyset,
+        optionally restricted to `ids`), mark them completed, and move their per-wallet sum from pending to
+        withdrawable in one UPDATE ... FROM.
+        Returns (settled_count, last_settled_id).
         """
-        now = datetime.utcnow()
-        
-        # Find all pending transactions past their available_at time
-        pending_transactions = db.query(WalletTransaction).filter(
-            and_(
+        due = (
+            select(WalletTransaction.id)
+            .where(
                 WalletTransaction.status == "pending",
+                WalletTransaction.transaction_type == "commission_credit",
                 WalletTransaction.available_at <= now,
-                WalletTransaction.transaction_type == "commission_credit"
+                WalletTransaction.id > after_id
             )
-        ).all()
-        
-        for transaction in pending_transactions:
-            wallet = db.query(Wallet).filter(Wallet.id == transaction.wallet_id).first()
-            if wallet:
-                # Move from pending to withdrawable
-                wallet.pending_balance -= transaction.amount
-                wallet.withdrawable_balance += transaction.amount
-                
-                # Update transaction status
-                transaction.status = "completed"
-                transaction.credited_at = now
+            .order_by(WalletTransaction.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if ids is not None:
+            due = due.where(WalletTransaction.id.in_(ids))
+        due = due.cte("due")
+        settled = (
+            update(WalletTransaction)
+            .where(WalletTransaction.id == due.c.id)
+            .values(status="completed", credited_at=now)
+            .returning(WalletTransaction.id, WalletTransaction.wallet_id, WalletTransaction.amount)
+            .cte("settled")
+        )
+        per_wallet = (
+            select(settled.c.wallet_id, func.sum(settled.c.amount).label("amount"))
+            .group_by(settled.c.wallet_id)
+            .cte("per_wallet")
+        )
+        credited = (
+            update(Wallet)
+            .where(Wallet.id == per_wallet.c.wallet_id)
+            .values(
+                pending_balance=Wallet.pending_balance - per_wallet.c.amount,
+                withdrawable_balance=Wallet.withdrawable_balance + per_wallet.c.amount,
+                updated_at=now
+            )
+            .returning(Wallet.id)
+            .cte("credited")
+        )
+        return select(func.count(settled.c.id), func.max(settled.c.id)).add_cte(credited)
+    
+    @staticmethod
+    async def process_pending_commissions(
+        db: AsyncSession,
+        batch_size: Optional[int] = None,
+        after_id: int = 0
+    ) -> int:
+        """
+        Process pending commissions that are past their hold period
+        This should be run as a scheduled job
         
-        db.commit()
-        return len(pending_transactions)
+        Commissions are released in keyset batches of SETTLEMENT_BATCH_SIZE,
+        each committed on its own, so a crash or restart simply resumes with
+        whatever is still pending. Rows locked by a concurrent refund are
+        skipped and picked up by the next run.
+        """
+        batch_size = batch_size or settings.SETTLEMENT_BATCH_SIZE
+        now = datetime.utcnow()
+        total = 0
+        
+        while True:
+            count, last_id = (await db.execute(
+                PaymentService._settlement_batch(now, after_id, batch_size)
+            )).one()
+            await db.commit()
+            
+            if not count:
+                break
+            total += count
+            after_id = last_id
+            if count < batch_size:
+                break
+        
+        if total:
+            AdminService.invalidate_dashboard_stats()
+        return total
+    
+    @staticmethod
+    async def release_commissions(db: AsyncSession, transaction_ids: List[int]) -> int:
+        """Settle specific due commissions (used by the release queue)"""
+        batch_size = settings.SETTLEMENT_BATCH_SIZE
+        now = datetime.utcnow()
+        total = 0
+        
+        for start in range(0, len(transaction_ids), batch_size):
+            ids = sorted(transaction_ids[start:start + batch_size])
+            count, _ = (await db.execute(
+                PaymentService._settlement_batch(now, 0, batch_size, ids)
+            )).one()
+            await db.commit()
+            total += count
+        
+        if total:
+            AdminService.invalidate_dashboard_stats()
+        return total
     
     @staticmethod
-    def process_wallet_payment(
-        db: Session,
+    async def process_wallet_payment(
+        db: AsyncSession,
         user_id: int,
         amount: Decimal
     ) -> bool:
         """Process payment from user wallet"""
-        wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+        wallet = await db.scalar(
+            select(Wallet)
+            .where(Wallet.user_id == user_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
         if not wallet:
             return False
         
@@ -258,20 +351,20 @@ class PaymentService:
         )
         
         db.add(transaction)
-        db.commit()
+        await db.commit()
         
         return True
     
     @staticmethod
-    def refund_order(
-        db: Session,
+    async def refund_order(
+        db: AsyncSession,
         order_id: str,
         reason: Optional[str] = None
     ) -> Order:
         """
         Refund an order and reverse commissions
         """
-        order = db.query(Order).filter(Order.order_id == order_id).first()
+        order = await db.scalar(select(Order).where(Order.order_id == order_id))
         if not order:
             raise ValueError("Order not found")
         
@@ -282,35 +375,51 @@ class PaymentService:
         order.payment_status = "refunded"
         
         # Update user stats
-        user = db.query(User).filter(User.id == order.user_id).first()
+        user = await db.get(User, order.user_id)
         user.total_spent -= order.selling_price
         user.total_orders -= 1
         
         # Reverse commissions if they were credited
         if order.commission_processed:
-            PaymentService._reverse_commissions(db, order.id)
+            await PaymentService._reverse_commissions(db, order.id)
         
         # Refund to wallet if it was a wallet payment
         if order.is_wallet_payment:
-            PaymentService._refund_to_wallet(db, order.user_id, order.selling_price, order.order_id)
+            await PaymentService._refund_to_wallet(db, order.user_id, order.selling_price, order.order_id)
         
-        db.commit()
-        db.refresh(order)
+        await db.commit()
+        await db.refresh(order)
+        AdminService.invalidate_dashboard_stats()
         
         return order
     
     @staticmethod
-    def _reverse_commissions(db: Session, order_id: int):
+    async def _reverse_commissions(db: AsyncSession, order_id: int):
         """Reverse commissions for a refunded order"""
-        transactions = db.query(WalletTransaction).filter(
-            and_(
-                WalletTransaction.order_id == order_id,
-                WalletTransaction.transaction_type == "commission_credit"
+        # Lock the commission rows first (settlement takes them in the same
+        # order and skips locked ones), then each wallet, re-reading both so
+        # the pending/withdrawable split and balances are current
+        transactions = (await db.scalars(
+            select(WalletTransaction)
+            .where(
+                and_(
+                    WalletTransaction.order_id == order_id,
+                    WalletTransaction.transaction_type == "commission_credit"
+                )
             )
-        ).all()
+            .order_by(WalletTransaction.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )).all()
         
+        reversed_amounts = []
         for transaction in transactions:
-            wallet = db.query(Wallet).filter(Wallet.id == transaction.wallet_id).first()
+            wallet = await db.scalar(
+                select(Wallet)
+                .where(Wallet.id == transaction.wallet_id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
             if wallet:
                 # Deduct commission
                 balance_before = wallet.total_balance
@@ -341,17 +450,26 @@ class PaymentService:
                 
                 # Cancel original transaction
                 transaction.status = "cancelled"
+                reversed_amounts.append((wallet.user_id, transaction.amount))
+        
+        await db.commit()
         
-        db.commit()
+        for user_id, amount in reversed_amounts:
+            await leaderboard.record_commission(user_id, -amount)
     
     @staticmethod
-    def _refund_to_wallet(db: Session, user_id: int, amount: Decimal, order_id: str):
+    async def _refund_to_wallet(db: AsyncSession, user_id: int, amount: Decimal, order_id: str):
         """Refund amount to user wallet"""
-        wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+        wallet = await db.scalar(
+            select(Wallet)
+            .where(Wallet.user_id == user_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
         if not wallet:
             wallet = Wallet(user_id=user_id)
             db.add(wallet)
-            db.flush()
+            await db.flush()
         
         balance_before = wallet.total_balance
         wallet.withdrawable_balance += amount
@@ -371,4 +489,4 @@ class PaymentService:
         )
         
         db.add(transaction)
-        db.commit()
+        await db.commit()
@@ -1,20 +1,23 @@
 """
 Referral tracking and management service
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, and_, or_, case, literal
 from datetime import datetime
 from typing import Optional, List
-from .models import User, Referral, ReferralStats, Wallet
-from .auth import generate_referral_code
+from ..models import User, Referral, ReferralStats, Wallet
+from ..auth import generate_referral_code
+from ..config import settings
+from ..leaderboard import leaderboard
+from .admin_service import AdminService
 
 
 class ReferralService:
     """Service for managing referral operations"""
     
     @staticmethod
-    def create_user_with_referral(
-        db: Session,
+    async def create_user_with_referral(
+        db: AsyncSession,
         telegram_id: int,
         username: Optional[str],
         first_name: Optional[str],
@@ -31,7 +34,7 @@ class ReferralService:
         - Their referrer's referrer (if exists) gets level 2 tracking
         """
         # Check if user already exists
-        existing_user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        existing_user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
         if existing_user:
             return existing_user
         
@@ -41,7 +44,7 @@ class ReferralService:
         referred_by_id = None
         
         if referred_by_code:
-            referrer = db.query(User).filter(User.referral_code == referred_by_code).first()
+            referrer = await db.scalar(select(User).where(User.referral_code == referred_by_code))
             if referrer:
                 referred_by_id = referrer.id
                 referral_level = 1
@@ -60,7 +63,7 @@ class ReferralService:
         )
         
         db.add(new_user)
-        db.flush()  # Get the ID
+        await db.flush()  # Get the ID
         
         # Generate and set referral code
         new_user.referral_code = generate_referral_code(new_user.id)
@@ -92,19 +95,25 @@ class ReferralService:
                 )
                 db.add(level2_referral)
         
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
+        
+        AdminService.invalidate_dashboard_stats()
+        await leaderboard.set_profile(new_user)
+        if referrer:
+            await leaderboard.record_click(referrer.id)
+            await leaderboard.record_click(referrer.referred_by)
         
         return new_user
     
     @staticmethod
-    def track_referral_click(
-        db: Session,
+    async def track_referral_click(
+        db: AsyncSession,
         referral_code: str,
         ip_address: Optional[str] = None
     ) -> bool:
         """Track a referral link click"""
-        referrer = db.query(User).filter(User.referral_code == referral_code).first()
+        referrer = await db.scalar(select(User).where(User.referral_code == referral_code))
         if not referrer:
             return False
         
@@ -115,72 +124,75 @@ class ReferralService:
             level=1
         )
         db.add(click)
-        db.commit()
+        await db.commit()
+        
+        AdminService.invalidate_dashboard_stats()
+        await leaderboard.record_click(referrer.id)
         
         return True
     
     @staticmethod
-    def mark_referral_converted(
-        db: Session,
+    async def mark_referral_converted(
+        db: AsyncSession,
         user_id: int
     ):
         """Mark referrals as converted when user makes first purchase"""
         # Update all referral records for this user
-        referrals = db.query(Referral).filter(
-            Referral.referred_user_id == user_id,
-            Referral.converted == False
-        ).all()
+        referrer_ids = (await db.scalars(
+            update(Referral)
+            .where(Referral.referred_user_id == user_id, Referral.converted == False)
+            .values(converted=True, converted_at=datetime.utcnow())
+            .returning(Referral.referrer_id)
+        )).all()
         
-        for referral in referrals:
-            referral.converted = True
-            referral.converted_at = datetime.utcnow()
+        await db.commit()
         
-        db.commit()
+        await leaderboard.record_conversions(referrer_ids)
     
     @staticmethod
-    def get_referral_stats(db: Session, user_id: int) -> dict:
+    async def get_referral_stats(db: AsyncSession, user_id: int) -> dict:
         """Get comprehensive referral statistics for a user"""
         # Get or create stats record
-        stats = db.query(ReferralStats).filter(ReferralStats.user_id == user_id).first()
+        stats = await db.scalar(select(ReferralStats).where(ReferralStats.user_id == user_id))
         
         if not stats:
             # Calculate fresh stats
-            total_clicks = db.query(func.count(Referral.id)).filter(
+            total_clicks = await db.scalar(select(func.count(Referral.id)).where(
                 Referral.referrer_id == user_id
-            ).scalar() or 0
+            )) or 0
             
-            total_referrals = db.query(func.count(func.distinct(Referral.referred_user_id))).filter(
+            total_referrals = await db.scalar(select(func.count(func.distinct(Referral.referred_user_id))).where(
                 and_(
                     Referral.referrer_id == user_id,
                     Referral.referred_user_id.isnot(None)
                 )
-            ).scalar() or 0
+            )) or 0
             
-            level1_referrals = db.query(func.count(User.id)).filter(
+            level1_referrals = await db.scalar(select(func.count(User.id)).where(
                 and_(
                     User.referred_by == user_id,
                     User.referral_level == 1
                 )
-            ).scalar() or 0
+            )) or 0
             
-            level2_referrals = db.query(func.count(User.id)).filter(
+            level2_referrals = await db.scalar(select(func.count(User.id)).where(
                 and_(
                     User.referred_by == user_id,
                     User.referral_level == 2
                 )
-            ).scalar() or 0
+            )) or 0
             
-            total_buyers = db.query(func.count(Referral.id)).filter(
+            total_buyers = await db.scalar(select(func.count(Referral.id)).where(
                 and_(
                     Referral.referrer_id == user_id,
                     Referral.converted == True
                 )
-            ).scalar() or 0
+            )) or 0
             
             conversion_rate = (total_buyers / total_clicks * 100) if total_clicks > 0 else 0
             
             # Get wallet data
-            wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+            wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id))
             
             stats_dict = {
                 'total_clicks': total_clicks,
@@ -197,8 +209,8 @@ class ReferralService:
             # Create stats record
             stats = ReferralStats(user_id=user_id, **stats_dict)
             db.add(stats)
-            db.commit()
-            db.refresh(stats)
+            await db.commit()
+            await db.refresh(stats)
         
         return {
             'total_clicks': stats.total_clicks,
@@ -213,45 +225,117 @@ class ReferralService:
         }
     
     @staticmethod
-    def update_referral_stats(db: Session, user_id: int):
+    async def update_referral_stats(db: AsyncSession, user_id: int):
         """Update cached referral statistics"""
-        stats_dict = ReferralService.get_referral_stats(db, user_id)
+        stats_dict = await ReferralService.get_referral_stats(db, user_id)
         
-        stats = db.query(ReferralStats).filter(ReferralStats.user_id == user_id).first()
+        stats = await db.scalar(select(ReferralStats).where(ReferralStats.user_id == user_id))
         if stats:
             for key, value in stats_dict.items():
                 setattr(stats, key, value)
             stats.last_updated = datetime.utcnow()
-            db.commit()
+            await db.commit()
     
     @staticmethod
-    def get_user_referrals(
-        db: Session,
+    async def get_user_referrals(
+        db: AsyncSession,
         user_id: int,
         level: Optional[int] = None
     ) -> List[User]:
         """Get all users referred by a specific user"""
-        query = db.query(User).filter(User.referred_by == user_id)
+        query = select(User).where(User.referred_by == user_id)
         
         if level:
-            query = query.filter(User.referral_level == level)
+            query = query.where(User.referral_level == level)
         
-        return query.all()
+        return list((await db.scalars(query)).all())
     
     @staticmethod
-    def get_referral_tree(db: Session, user_id: int) -> dict:
-        """Get complete referral tree for a user"""
-        user = db.query(User).filter(User.id == user_id).first()
+    async def get_referral_tree(
+        db: AsyncSession,
+        user_id: int,
+        max_depth: Optional[int] = None,
+        page: int = 1,
+        limit: int = 50
+    ) -> dict:
+        """
+        Get complete referral tree for a user
+        
+        One recursive query walks users.referred_by down to `max_depth` levels
+        and returns, per level, the totals (users, spend, orders, buyers) plus
+        page `page` of that level's users (`limit` per level).
+        """
+        if page < 1 or limit < 1 or (max_depth is not None and max_depth < 1):
+            raise ValueError("page, limit and max_depth must be at least 1")
+        
+        user = await db.get(User, user_id)
         if not user:
             return {}
         
-        # Get level 1 referrals
-        level1_users = ReferralService.get_user_referrals(db, user_id, level=1)
+        if max_depth is None:
+            max_depth = settings.REFERRAL_TREE_MAX_DEPTH
+        max_depth = min(max_depth, settings.REFERRAL_TREE_MAX_DEPTH)
+        offset = (page - 1) * limit
+        
+        # Descendants with their depth below user_id
+        tree = (
+            select(User.id, literal(1).label("depth"))
+            .where(User.referred_by == user_id)
+            .cte("tree", recursive=True)
+        )
+        tree = tree.union_all(
+            select(User.id, (tree.c.depth + 1).label("depth"))
+            .join(tree, User.referred_by == tree.c.id)
+            .where(tree.c.depth < max_depth)
+        )
         
-        # Get level 2 referrals (referrals of referrals)
-        level2_users = []
-        for l1_user in level1_users:
-            level2_users.extend(ReferralService.get_user_referrals(db, l1_user.id, level=1))
+        level = tree.c.depth
+        ranked = (
+            select(
+                tree.c.depth,
+                User.id,
+                User.telegram_id,
+                User.username,
+                User.first_name,
+                User.total_spent,
+                User.total_orders,
+                func.row_number().over(partition_by=level, order_by=(User.join_date, User.id)).label("rn"),
+                func.count().over(partition_by=level).label("level_users"),
+                func.sum(User.total_spent).over(partition_by=level).label("level_spent"),
+                func.sum(User.total_orders).over(partition_by=level).label("level_orders"),
+                func.count(case((User.total_orders > 0, 1))).over(partition_by=level).label("level_buyers")
+            )
+            .join(tree, User.id == tree.c.id)
+            .subquery()
+        )
+        # Row 1 of every level is always returned so its totals survive paging past the end
+        rows = (await db.execute(
+            select(ranked)
+            .where(or_(ranked.c.rn == 1, ranked.c.rn.between(offset + 1, offset + limit)))
+            .order_by(ranked.c.depth, ranked.c.rn)
+        )).all()
+        
+        levels = {}
+        for row in rows:
+            entry = levels.setdefault(row.depth, {
+                'depth': row.depth,
+                'total_users': row.level_users,
+                'total_spent': float(row.level_spent or 0),
+                'total_orders': int(row.level_orders or 0),
+                'total_buyers': row.level_buyers,
+                'page': page,
+                'pages': (row.level_users + limit - 1) // limit,
+                'users': []
+            })
+            if offset < row.rn <= offset + limit:
+                entry['users'].append({
+                    'id': row.id,
+                    'telegram_id': row.telegram_id,
+                    'username': row.username,
+                    'first_name': row.first_name,
+                    'total_spent': float(row.total_spent or 0),
+                    'total_orders': row.total_orders
+                })
         
         return {
             'user': {
@@ -260,52 +344,14 @@ class ReferralService:
                 'username': user.username,
                 'referral_code': user.referral_code
             },
-            'level1': [
-                {
-                    'id': u.id,
-                    'telegram_id': u.telegram_id,
-                    'username': u.username,
-                    'total_spent': float(u.total_spent),
-                    'total_orders': u.total_orders
-                }
-                for u in level1_users
-            ],
-            'level2': [
-                {
-                    'id': u.id,
-                    'telegram_id': u.telegram_id,
-                    'username': u.username,
-                    'total_spent': float(u.total_spent),
-                    'total_orders': u.total_orders
-                }
-                for u in level2_users
-            ],
-            'stats': ReferralService.get_referral_stats(db, user_id)
+            'max_depth': max_depth,
+            'levels': [levels[depth] for depth in sorted(levels)],
+            'level1': levels[1]['users'] if 1 in levels else [],
+            'level2': levels[2]['users'] if 2 in levels else [],
+            'stats': await ReferralService.get_referral_stats(db, user_id)
         }
     
     @staticmethod
-    def get_top_referrers(db: Session, limit: int = 10) -> List[dict]:
-        """Get leaderboard of top referrers by earnings"""
-        top_stats = db.query(ReferralStats).order_by(
-            ReferralStats.total_commission_earned.desc()
-        ).limit(limit).all()
-        
-        result = []
-        for stat in top_stats:
-            user = db.query(User).filter(User.id == stat.user_id).first()
-            if user:
-                result.append({
-                    'user_id': user.id,
-                    'telegram_id': user.telegram_id,
-                    'username': user.username,
-                    'first_name': user.first_name,
-                    'referral_code': user.referral_code,
-                    'stats': {
-                        'total_clicks': stat.total_clicks,
-                        'total_buyers': stat.total_buyers,
-                        'conversion_rate': float(stat.conversion_rate),
-                        'total_commission_earned': float(stat.total_commission_earned)
-                    }
-                })
-        
-        return result
+    async def get_top_referrers(db: AsyncSession, limit: int = 10) -> List[dict]:
+        """Get leaderboard of top referrers by earnings (served from the leaderboard, no SQL)"""
+        return await leaderboard.top(limit)
@@ -1,50 +1,51 @@
 """
 Wallet and withdrawal management service
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, desc
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional, List
 import uuid
 from ..models import Wallet, WalletTransaction, Withdrawal, User
 from ..config import settings
+from .admin_service import AdminService
 
 
 class WalletService:
     """Service for wallet operations"""
     
     @staticmethod
-    def get_wallet(db: Session, user_id: int) -> Optional[Wallet]:
+    async def get_wallet(db: AsyncSession, user_id: int) -> Optional[Wallet]:
         """Get user wallet"""
-        wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+        wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id))
         
         if not wallet:
             # Create wallet if it doesn't exist
             wallet = Wallet(user_id=user_id)
             db.add(wallet)
-            db.commit()
-            db.refresh(wallet)
+            await db.commit()
+            await db.refresh(wallet)
         
         return wallet
     
     @staticmethod
-    def get_transaction_history(
-        db: Session,
+    async def get_transaction_history(
+        db: AsyncSession,
         user_id: int,
         limit: int = 50,
         offset: int = 0
     ) -> List[WalletTransaction]:
         """Get wallet transaction history"""
-        transactions = db.query(WalletTransaction).filter(
+        transactions = await db.scalars(select(WalletTransaction).where(
             WalletTransaction.user_id == user_id
-        ).order_by(desc(WalletTransaction.created_at)).offset(offset).limit(limit).all()
+        ).order_by(desc(WalletTransaction.created_at)).offset(offset).limit(limit))
         
-        return transactions
+        return list(transactions.all())
     
     @staticmethod
-    def create_withdrawal_request(
-        db: Session,
+    async def create_withdrawal_request(
+        db: AsyncSession,
         user_id: int,
         amount: Decimal,
         withdrawal_method: str = "upi",
@@ -59,19 +60,19 @@ class WalletService:
             raise ValueError(f"Minimum withdrawal amount is ₹{settings.MIN_WITHDRAWAL_AMOUNT}")
         
         # Get wallet
-        wallet = WalletService.get_wallet(db, user_id)
+        wallet = await WalletService.get_wallet(db, user_id)
         
         # Check if sufficient balance
         if wallet.withdrawable_balance < amount:
             raise ValueError("Insufficient withdrawable balance")
         
         # Check for pending withdrawals
-        pending_withdrawals = db.query(Withdrawal).filter(
+        pending_withdrawals = await db.scalar(select(func.count(Withdrawal.id)).where(
             and_(
                 Withdrawal.user_id == user_id,
                 Withdrawal.status == "pending"
             )
-        ).count()
+        ))
         
         if pending_withdrawals > 0:
             raise ValueError("You already have a pending withdrawal request")
@@ -113,23 +114,24 @@ class WalletService:
         )
         
         db.add(transaction)
-        db.commit()
-        db.refresh(withdrawal)
+        await db.commit()
+        await db.refresh(withdrawal)
+        AdminService.invalidate_dashboard_stats()
         
         return withdrawal
     
     @staticmethod
-    def approve_withdrawal(
-        db: Session,
+    async def approve_withdrawal(
+        db: AsyncSession,
         withdrawal_id: str,
         admin_id: int,
         payment_reference: Optional[str] = None,
         admin_notes: Optional[str] = None
     ) -> Withdrawal:
         """Approve a withdrawal request"""
-        withdrawal = db.query(Withdrawal).filter(
+        withdrawal = await db.scalar(select(Withdrawal).where(
             Withdrawal.withdrawal_id == withdrawal_id
-        ).first()
+        ))
         
         if not withdrawal:
             raise ValueError("Withdrawal request not found")
@@ -144,21 +146,22 @@ class WalletService:
         withdrawal.payment_reference = payment_reference
         withdrawal.admin_notes = admin_notes
         
-        db.commit()
-        db.refresh(withdrawal)
+        await db.commit()
+        await db.refresh(withdrawal)
+        AdminService.invalidate_dashboard_stats()
         
         return withdrawal
     
     @staticmethod
-    def mark_withdrawal_paid(
-        db: Session,
+    async def mark_withdrawal_paid(
+        db: AsyncSession,
         withdrawal_id: str,
         payment_reference: Optional[str] = None
     ) -> Withdrawal:
         """Mark withdrawal as paid"""
-        withdrawal = db.query(Withdrawal).filter(
+        withdrawal = await db.scalar(select(Withdrawal).where(
             Withdrawal.withdrawal_id == withdrawal_id
-        ).first()
+        ))
         
         if not withdrawal:
             raise ValueError("Withdrawal request not found")
@@ -173,44 +176,45 @@ class WalletService:
             withdrawal.payment_reference = payment_reference
         
         # Update wallet
-        wallet = db.query(Wallet).filter(Wallet.id == withdrawal.wallet_id).first()
+        wallet = await db.get(Wallet, withdrawal.wallet_id)
         balance_before = wallet.total_balance
         wallet.total_balance -= withdrawal.amount
         wallet.total_withdrawn += withdrawal.amount
         balance_after = wallet.total_balance
         
         # Update transaction
-        transaction = db.query(WalletTransaction).filter(
+        transaction = await db.scalar(select(WalletTransaction).where(
             and_(
                 WalletTransaction.wallet_id == wallet.id,
                 WalletTransaction.transaction_type == "withdrawal",
                 WalletTransaction.description.like(f"%{withdrawal_id}%"),
                 WalletTransaction.status == "pending"
             )
-        ).first()
+        ).limit(1))
         
         if transaction:
             transaction.status = "completed"
             transaction.balance_after = balance_after
             transaction.credited_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(withdrawal)
+        await db.commit()
+        await db.refresh(withdrawal)
+        AdminService.invalidate_dashboard_stats()
         
         return withdrawal
     
     @staticmethod
-    def reject_withdrawal(
-        db: Session,
+    async def reject_withdrawal(
+        db: AsyncSession,
         withdrawal_id: str,
         admin_id: int,
         rejection_reason: str,
         admin_notes: Optional[str] = None
     ) -> Withdrawal:
         """Reject a withdrawal request"""
-        withdrawal = db.query(Withdrawal).filter(
+        withdrawal = await db.scalar(select(Withdrawal).where(
             Withdrawal.withdrawal_id == withdrawal_id
-        ).first()
+        ))
         
         if not withdrawal:
             raise ValueError("Withdrawal request not found")
@@ -226,40 +230,41 @@ class WalletService:
         withdrawal.admin_notes = admin_notes
         
         # Refund to withdrawable balance
-        wallet = db.query(Wallet).filter(Wallet.id == withdrawal.wallet_id).first()
+        wallet = await db.get(Wallet, withdrawal.wallet_id)
         wallet.withdrawable_balance += withdrawal.amount
         
         # Cancel transaction
-        transaction = db.query(WalletTransaction).filter(
+        transaction = await db.scalar(select(WalletTransaction).where(
             and_(
                 WalletTransaction.wallet_id == wallet.id,
                 WalletTransaction.transaction_type == "withdrawal",
                 WalletTransaction.description.like(f"%{withdrawal_id}%"),
                 WalletTransaction.status == "pending"
             )
-        ).first()
+        ).limit(1))
         
         if transaction:
             transaction.status = "cancelled"
         
-        db.commit()
-        db.refresh(withdrawal)
+        await db.commit()
+        await db.refresh(withdrawal)
+        AdminService.invalidate_dashboard_stats()
         
         return withdrawal
     
     @staticmethod
-    def cancel_withdrawal(
-        db: Session,
+    async def cancel_withdrawal(
+        db: AsyncSession,
         withdrawal_id: str,
         user_id: int
     ) -> Withdrawal:
         """User cancels their own withdrawal request"""
-        withdrawal = db.query(Withdrawal).filter(
+        withdrawal = await db.scalar(select(Withdrawal).where(
             and_(
                 Withdrawal.withdrawal_id == withdrawal_id,
                 Withdrawal.user_id == user_id
             )
-        ).first()
+        ))
         
         if not withdrawal:
             raise ValueError("Withdrawal request not found")
@@ -271,88 +276,87 @@ class WalletService:
         withdrawal.status = "cancelled"
         
         # Refund to withdrawable balance
-        wallet = db.query(Wallet).filter(Wallet.id == withdrawal.wallet_id).first()
+        wallet = await db.get(Wallet, withdrawal.wallet_id)
         wallet.withdrawable_balance += withdrawal.amount
         
         # Cancel transaction
-        transaction = db.query(WalletTransaction).filter(
+        transaction = await db.scalar(select(WalletTransaction).where(
             and_(
                 WalletTransaction.wallet_id == wallet.id,
                 WalletTransaction.transaction_type == "withdrawal",
                 WalletTransaction.description.like(f"%{withdrawal_id}%"),
                 WalletTransaction.status == "pending"
             )
-        ).first()
+        ).limit(1))
         
         if transaction:
             transaction.status = "cancelled"
         
-        db.commit()
-        db.refresh(withdrawal)
+        await db.commit()
+        await db.refresh(withdrawal)
+        AdminService.invalidate_dashboard_stats()
         
         return withdrawal
     
     @staticmethod
-    def get_user_withdrawals(
-        db: Session,
+    async def get_user_withdrawals(
+        db: AsyncSession,
         user_id: int,
         limit: int = 50,
         offset: int = 0
     ) -> List[Withdrawal]:
         """Get user's withdrawal history"""
-        withdrawals = db.query(Withdrawal).filter(
+        withdrawals = await db.scalars(select(Withdrawal).where(
             Withdrawal.user_id == user_id
-        ).order_by(desc(Withdrawal.requested_at)).offset(offset).limit(limit).all()
+        ).order_by(desc(Withdrawal.requested_at)).offset(offset).limit(limit))
         
-        return withdrawals
+        return list(withdrawals.all())
     
     @staticmethod
-    def get_all_withdrawals(
-        db: Session,
+    async def get_all_withdrawals(
+        db: AsyncSession,
         status: Optional[str] = None,
         limit: int = 100,
         offset: int = 0
     ) -> List[Withdrawal]:
         """Get all withdrawal requests (admin)"""
-        query = db.query(Withdrawal)
+        query = select(Withdrawal)
         
         if status:
-            query = query.filter(Withdrawal.status == status)
+            query = query.where(Withdrawal.status == status)
         
-        withdrawals = query.order_by(desc(Withdrawal.requested_at)).offset(offset).limit(limit).all()
+        withdrawals = await db.scalars(query.order_by(desc(Withdrawal.requested_at)).offset(offset).limit(limit))
         
-        return withdrawals
+        return list(withdrawals.all())
     
     @staticmethod
-    def get_withdrawal_statistics(db: Session) -> dict:
+    async def get_withdrawal_statistics(db: AsyncSession) -> dict:
         """Get withdrawal statistics"""
-        from sqlalchemy import func
+        total_withdrawals = await db.scalar(select(func.count(Withdrawal.id))) or 0
         
-        total_withdrawals = db.query(func.count(Withdrawal.id)).scalar() or 0
-        
-        pending_count = db.query(func.count(Withdrawal.id)).filter(
+        pending_count = await db.scalar(select(func.count(Withdrawal.id)).where(
             Withdrawal.status == "pending"
-        ).scalar() or 0
+        )) or 0
         
-        pending_amount = db.query(func.sum(Withdrawal.amount)).filter(
+        pending_amount = await db.scalar(select(func.sum(Withdrawal.amount)).where(
             Withdrawal.status == "pending"
-        ).scalar() or Decimal('0')
+        )) or Decimal('0')
         
-        approved_count = db.query(func.count(Withdrawal.id)).filter(
+        approved_count = await db.scalar(select(func.count(Withdrawal.id)).where(
             Withdrawal.status == "approved"
-        ).scalar() or 0
+        )) or 0
         
-        paid_count = db.query(func.count(Withdrawal.id)).filter(
+        paid_count = await db.scalar(select(func.count(Withdrawal.id)).where(
             Withdrawal.status == "paid"
-        ).scalar() or 0
+        )) or 0
         
-        paid_amount = db.query(func.sum(Withdrawal.amount)).filter(
+        paid_amount = await db.scalar(select(func.sum(Withdrawal.amount)).where(
             Withdrawal.status == "paid"
-        ).scalar() or Decimal('0')
+        )) or Decimal('0')
         
-        rejected_count = db.query(func.count(Withdrawal.id)).filter(
+        rejected_count = await db.scalar(select(func.count(Withdrawal.id)).where(
             Withdrawal.status == "rejected"
-        ).scalar() or 0
+        )) or 0
         
         return {
             'total_withdrawals': total_withdrawals,
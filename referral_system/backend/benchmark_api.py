@@ -0,0 +1,110 @@
+"""
+Load benchmark for the referral API
+
+Runs N concurrent clients against a running server for a fixed duration and
+reports requests/sec and latency percentiles. A slow admin query is mixed in
+so a blocked event loop shows up as collapsed throughput on the cheap routes.
+
+Usage:
+    uvicorn app.main:app --workers 1 &
+    python benchmark_api.py --url http://localhost:8000 --telegram-id 123456789 \
+        --concurrency 50 --duration 20 [--token <admin JWT>]
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def _client(
+    http: httpx.AsyncClient,
+    paths: List[str],
+    deadline: float,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+    offset: int
+):
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await http.get(path)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok:
+            latencies[path].append(elapsed)
+        else:
+            errors[path] += 1
+
+
+async def run_benchmark(url: str, telegram_id: int, concurrency: int, duration: float, token: str = None):
+    """Hammer read endpoints from `concurrency` clients for `duration` seconds"""
+    paths = [
+        f"/users/{telegram_id}",
+        f"/users/{telegram_id}/referral-stats",
+        "/referrals/leaderboard?limit=10",
+    ]
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+        paths.append("/admin/dashboard/stats")
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30) as http:
+        # Warm up the connection pools on both sides
+        await asyncio.gather(*(http.get(p) for p in paths), return_exceptions=True)
+
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            _client(http, paths, deadline, latencies, errors, n)
+            for n in range(concurrency)
+        ))
+        wall = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"\n📊 {concurrency} clients, {wall:.1f}s against {url}")
+    print(f"   Throughput: {total / wall:,.0f} req/s ({total:,} ok, {sum(errors.values()):,} errors)")
+    print(f"   {'route':<45} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for path in paths:
+        values = latencies[path]
+        print(
+            f"   {path:<45} {len(values) / wall:>8,.0f} "
+            f"{_percentile(values, 50) * 1000:>8.1f} "
+            f"{_percentile(values, 95) * 1000:>8.1f} "
+            f"{_percentile(values, 99) * 1000:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load benchmark for the referral API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--telegram-id", type=int, required=True, help="Existing user to read")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--token", help="Admin JWT to include /admin/dashboard/stats in the mix")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.url, args.telegram_id, args.concurrency, args.duration, args.token))
+
+
+if __name__ == "__main__":
+    main()
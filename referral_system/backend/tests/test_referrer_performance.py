@@ -0,0 +1,111 @@
+"""
+AdminService.get_referrer_performance against a real PostgreSQL database
+
+Set TEST_DATABASE_URL (e.g. postgresql://postgres@localhost/referral_test)
+to run; the tables are created and dropped around the test.
+"""
+import asyncio
+import os
+from decimal import Decimal
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _with_seeded_db(check):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.database import Base, async_engine
+    from app.models import User, Wallet, Referral, ReferralStats
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        Session = async_sessionmaker(async_engine, expire_on_commit=False)
+        async with Session() as db:
+            for i in range(1, 5):
+                db.add(User(id=i, telegram_id=100 + i, referral_code=f"R{i}", username=f"u{i}", user_type="referrer"))
+            await db.flush()
+            for i in range(1, 5):
+                db.add(Wallet(user_id=i, total_earned=Decimal(i * 7), total_withdrawn=0, pending_balance=Decimal(i)))
+            for i in range(5, 12):
+                db.add(User(id=i, telegram_id=100 + i, referral_code=f"R{i}", referred_by=1 + i % 3,
+                            referral_level=1, user_type="customer"))
+            await db.flush()
+            # referrer 1: 3 clicks / 2 buyers, referrer 2: 3 / 1, referrer 3: 2 / 1
+            for j in range(8):
+                db.add(Referral(referrer_id=1 + j % 3, referred_user_id=5 + j % 7, referral_code="x",
+                                level=1, converted=j % 2 == 0))
+            # referrer 4 has a cached stats row, which wins over the computed values
+            db.add(ReferralStats(user_id=4, total_clicks=99, total_referrals=1, level1_referrals=1,
+                                 level2_referrals=0, total_buyers=9, conversion_rate=Decimal("9.09"),
+                                 total_commission_earned=Decimal("500"), total_commission_paid=0,
+                                 pending_commission=0))
+            await db.commit()
+
+            await check(db)
+    finally:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await async_engine.dispose()
+
+
+def test_metrics_computed_and_cached():
+    from app.services import AdminService
+
+    async def check(db):
+        result = await AdminService.get_referrer_performance(db, page=1, limit=10)
+        assert result['total'] == 4
+        stats = {row['user_id']: row['stats'] for row in result['data']}
+
+        assert [row['user_id'] for row in result['data']] == [4, 3, 2, 1]
+        assert stats[1]['total_clicks'] == 3
+        assert stats[1]['total_buyers'] == 2
+        assert stats[1]['conversion_rate'] == 66.67
+        assert stats[2]['conversion_rate'] == 33.33
+        assert stats[3]['level1_referrals'] == 3
+        assert stats[3]['total_commission_earned'] == 21.0
+        assert stats[3]['pending_commission'] == 3.0
+        assert stats[4]['total_clicks'] == 99
+        assert stats[4]['total_commission_earned'] == 500.0
+
+    _run(_with_seeded_db(check))
+
+
+@pytest.mark.parametrize("sort_by", [
+    "total_clicks", "total_referrals", "level1_referrals", "level2_referrals", "total_buyers",
+    "conversion_rate", "total_commission_earned", "total_commission_paid", "pending_commission"
+])
+def test_every_sort_key_executes(sort_by):
+    from app.services import AdminService
+
+    async def check(db):
+        asc = await AdminService.get_referrer_performance(db, limit=2, sort_by=sort_by, sort_order="asc")
+        desc = await AdminService.get_referrer_performance(db, limit=2, sort_by=sort_by, sort_order="desc")
+        assert asc['total'] == desc['total'] == 4
+        assert len(asc['data']) == len(desc['data']) == 2
+        assert asc['data'][0]['stats'][sort_by] <= desc['data'][0]['stats'][sort_by]
+
+    _run(_with_seeded_db(check))
+
+
+def test_invalid_sort_rejected():
+    from app.services import AdminService
+
+    async def check(db):
+        with pytest.raises(ValueError):
+            await AdminService.get_referrer_performance(db, sort_by="bogus")
+        with pytest.raises(ValueError):
+            await AdminService.get_referrer_performance(db, sort_order="sideways")
+
+    _run(_with_seeded_db(check))
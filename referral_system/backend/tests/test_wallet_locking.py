@@ -0,0 +1,85 @@
+"""
+Wallet balance updates racing commission settlement, against PostgreSQL
+
+Set TEST_DATABASE_URL (e.g. postgresql://postgres@localhost/referral_test)
+to run; the tables are created and dropped around the test.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+
+async def _race():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.database import Base, async_engine
+    from app.models import User, Wallet, WalletTransaction, Order
+    from app.services import PaymentService
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(async_engine, expire_on_commit=False)
+    try:
+        async with Session() as db:
+            db.add(User(id=1, telegram_id=101, referral_code="R1"))
+            db.add(User(id=2, telegram_id=102, referral_code="R2"))
+            await db.flush()
+            db.add(Wallet(id=1, user_id=1, total_balance=Decimal(37), pending_balance=Decimal(28),
+                          withdrawable_balance=Decimal(9), total_earned=Decimal(37)))
+            db.add(Order(id=1, order_id="O1", user_id=2, plan_name="p", selling_price=135, making_cost=42,
+                         profit=93, payment_status="success", commission_processed=True))
+            await db.flush()
+            db.add(WalletTransaction(id=1001, wallet_id=1, user_id=1, order_id=1,
+                                     transaction_type="commission_credit", amount=Decimal(28),
+                                     balance_before=0, balance_after=28, status="pending",
+                                     available_at=datetime.utcnow() - timedelta(hours=1)))
+            await db.commit()
+
+        async def settle():
+            # Hold the settlement's wallet lock while the other two read
+            async with Session() as db:
+                await db.execute(PaymentService._settlement_batch(datetime.utcnow(), 0, 100))
+                await asyncio.sleep(0.5)
+                await db.commit()
+
+        async def credit():
+            await asyncio.sleep(0.1)
+            async with Session() as db:
+                await db.get(Wallet, 1)  # stale copy in the identity map
+                await PaymentService._credit_commission(db, 1, 1, Decimal(5), 1, "credit")
+
+        async def pay():
+            await asyncio.sleep(0.2)
+            async with Session() as db:
+                await db.get(Wallet, 1)
+                return await PaymentService.process_wallet_payment(db, 1, Decimal(30))
+
+        _, _, paid = await asyncio.gather(settle(), credit(), pay())
+
+        async with Session() as db:
+            wallet = await db.get(Wallet, 1)
+            return paid, wallet.pending_balance, wallet.withdrawable_balance, wallet.total_balance
+    finally:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await async_engine.dispose()
+
+
+def test_credit_and_payment_wait_for_settlement():
+    paid, pending, withdrawable, total = asyncio.run(_race())
+
+    # 28 settled to withdrawable, +5 pending credit, -30 wallet payment
+    assert paid is True
+    assert pending == Decimal(5)
+    assert withdrawable == Decimal(7)
+    assert total == Decimal(12)
@@ -139,6 +139,9 @@ CREATE INDEX idx_wallet_transactions_order_id ON wallet_transactions(order_id);
 CREATE INDEX idx_wallet_transactions_type ON wallet_transactions(transaction_type);
 CREATE INDEX idx_wallet_transactions_status ON wallet_transactions(status);
 CREATE INDEX idx_wallet_transactions_available_at ON wallet_transactions(available_at);
+-- Keyset scan for the settlement job: only commissions still on hold
+CREATE INDEX idx_wallet_transactions_pending_commission ON wallet_transactions(id)
+    WHERE status = 'pending' AND transaction_type = 'commission_credit';
 
 -- =====================================================
 -- TABLE: withdrawals
@@ -176,6 +176,265 @@ CREATE TRIGGER update_plan_stock_on_update
     FOR EACH ROW
     EXECUTE FUNCTION update_plan_stock_count();
 
+-- =====================================================
+-- 9. CREDENTIAL LEASES (per-instance hot pool)
+-- =====================================================
+-- Each bot process leases a few unused stock rows per plan and delivers from memory.
+-- A lease is only valid until lease_expires_at; expired leases are available again
+-- without any cleanup job.
+ALTER TABLE stocks ADD COLUMN IF NOT EXISTS leased_by TEXT;
+ALTER TABLE stocks ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+
+-- Unused stock only: stays small and hot however many credentials have been sold
+CREATE INDEX IF NOT EXISTS idx_stocks_available ON stocks(plan_key, id) WHERE is_used = false;
+
+-- Atomically lease up to p_count available rows to p_instance
+CREATE OR REPLACE FUNCTION lease_stock(p_plan_key TEXT, p_instance TEXT, p_count INTEGER, p_ttl_seconds INTEGER)
+RETURNS SETOF stocks AS $$
+    UPDATE stocks
+    SET leased_by = p_instance,
+        lease_expires_at = NOW() + make_interval(secs => p_ttl_seconds)
+    WHERE id IN (
+        SELECT id FROM stocks
+        WHERE plan_key = p_plan_key
+          AND is_used = false
+          AND (leased_by IS NULL OR lease_expires_at < NOW())
+        ORDER BY id
+        LIMIT p_count
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Deliver a leased row in one round-trip; returns no row if the lease was lost
+CREATE OR REPLACE FUNCTION claim_leased_stock(p_id INTEGER, p_instance TEXT, p_telegram_id BIGINT)
+RETURNS SETOF stocks AS $$
+    UPDATE stocks
+    SET is_used = true,
+        used_by = p_telegram_id,
+        used_at = NOW(),
+        leased_by = NULL,
+        lease_expires_at = NULL
+    WHERE id = p_id
+      AND is_used = false
+      AND leased_by = p_instance
+      AND lease_expires_at > NOW()
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Return undelivered leases (all of p_instance's when p_ids is NULL)
+CREATE OR REPLACE FUNCTION release_stock_leases(p_instance TEXT, p_ids INTEGER[] DEFAULT NULL)
+RETURNS INTEGER AS $$
+    WITH released AS (
+        UPDATE stocks
+        SET leased_by = NULL, lease_expires_at = NULL
+        WHERE leased_by = p_instance
+          AND is_used = false
+          AND (p_ids IS NULL OR id = ANY(p_ids))
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM released;
+$$ LANGUAGE sql;
+
+-- =====================================================
+-- 10. SUBSCRIPTION EXPIRY
+-- =====================================================
+-- The expiry job pages through active subscriptions by (expires_at, id).
+-- Expired rows leave the partial index, so each pass only touches the
+-- window that just passed, however large the table grows.
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_subscriptions_active_expiry
+    ON subscriptions(expires_at, id) WHERE status = 'active';
+
+-- =====================================================
+-- 11. CREDENTIAL RECLAIMS
+-- =====================================================
+-- When a subscription expires, the stock row it was sold from is queued here.
+-- An admin rotates the password and approves it (the same stock row returns to
+-- the unused pool with the new credential) or retires it for good.
+CREATE TABLE IF NOT EXISTS credential_reclaims (
+    id SERIAL PRIMARY KEY,
+    stock_id INTEGER NOT NULL REFERENCES stocks(id) ON DELETE CASCADE,
+    subscription_id INTEGER REFERENCES subscriptions(id) ON DELETE SET NULL,
+    plan_key TEXT NOT NULL,
+    previous_credential TEXT,
+    status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'approved', 'retired')),
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    reviewed_at TIMESTAMPTZ,
+    reviewed_by BIGINT
+);
+
+-- One open review per stock row; the review queue is read oldest first
+CREATE UNIQUE INDEX IF NOT EXISTS idx_credential_reclaims_open
+    ON credential_reclaims(stock_id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_credential_reclaims_pending
+    ON credential_reclaims(id) WHERE status = 'pending';
+
+-- Sold stock by buyer, used to find the row behind an expired subscription
+CREATE INDEX IF NOT EXISTS idx_stocks_sold_by ON stocks(used_by, plan_key) WHERE is_used = true;
+
+-- Queue the stock rows behind a batch of expired subscriptions.
+-- Subscriptions that recorded their credential match it exactly; older ones match
+-- every row the user bought for that plan, but only once no active subscription remains.
+CREATE OR REPLACE FUNCTION queue_credential_reclaims(p_subscription_ids INTEGER[])
+RETURNS INTEGER AS $$
+    WITH queued AS (
+        INSERT INTO credential_reclaims (stock_id, subscription_id, plan_key, previous_credential)
+        SELECT DISTINCT ON (st.id) st.id, sub.id, sub.plan_key, st.credential
+        FROM subscriptions sub
+        JOIN stocks st
+          ON st.used_by = sub.telegram_id
+         AND st.plan_key = sub.plan_key
+         AND st.is_used = true
+        WHERE sub.id = ANY(p_subscription_ids)
+          AND sub.status = 'expired'
+          AND (
+              st.credential = sub.credential
+              OR (sub.credential IS NULL AND NOT EXISTS (
+                  SELECT 1 FROM subscriptions active
+                  WHERE active.telegram_id = sub.telegram_id
+                    AND active.plan_key = sub.plan_key
+                    AND active.status = 'active'
+              ))
+          )
+        ORDER BY st.id, sub.id
+        ON CONFLICT (stock_id) WHERE status = 'pending' DO NOTHING
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM queued;
+$$ LANGUAGE sql;
+
+-- Approve a review: the stock row goes back to the unused pool, optionally
+-- with the rotated credential. Returns the stock row, or nothing if already reviewed.
+CREATE OR REPLACE FUNCTION approve_credential_reclaim(p_id INTEGER, p_credential TEXT, p_admin BIGINT)
+RETURNS SETOF stocks AS $$
+    WITH reviewed AS (
+        UPDATE credential_reclaims
+        SET status = 'approved', reviewed_at = NOW(), reviewed_by = p_admin
+        WHERE id = p_id AND status = 'pending'
+        RETURNING stock_id
+    )
+    UPDATE stocks
+    SET credential = COALESCE(p_credential, stocks.credential),
+        is_used = false,
+        used_by = NULL,
+        used_at = NULL,
+        leased_by = NULL,
+        lease_expires_at = NULL
+    FROM reviewed
+    WHERE stocks.id = reviewed.stock_id
+    RETURNING stocks.*;
+$$ LANGUAGE sql;
+
+-- =====================================================
+-- 12. LOGS TABLE (partitioned by month)
+-- =====================================================
+-- One partition per calendar month. Retention drops whole partitions (no
+-- DELETE, no vacuum debt) and activity lookups only touch the months they need.
+
+-- An older unpartitioned logs table is kept as logs_unpartitioned and copied below
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE relname = 'logs' AND relkind = 'r' AND relnamespace = 'public'::regnamespace
+    ) THEN
+        ALTER TABLE logs RENAME TO logs_unpartitioned;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS logs (
+    id BIGSERIAL,
+    event_type TEXT NOT NULL,
+    telegram_id BIGINT,
+    username TEXT,
+    details JSONB DEFAULT '{}'::jsonb,
+    message TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows outside the monthly partitions (e.g. copied history)
+CREATE TABLE IF NOT EXISTS logs_default PARTITION OF logs DEFAULT;
+
+-- Defined on the parent, created on every partition
+CREATE INDEX IF NOT EXISTS idx_logs_user_time ON logs(telegram_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_logs_event_time ON logs(event_type, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_logs_created_at ON logs(created_at DESC);
+
+-- Create partitions for this month and the next p_months_ahead months
+CREATE OR REPLACE FUNCTION ensure_log_partitions(p_months_ahead INTEGER DEFAULT 2)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        v_month := (date_trunc('month', NOW()) + make_interval(months => i))::DATE;
+        v_name := 'logs_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass('public.' || v_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month, (v_month + INTERVAL '1 month')::DATE
+            );
+            v_created := v_created + 1;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Drop monthly partitions older than p_keep_months full months; returns dropped names
+CREATE OR REPLACE FUNCTION drop_log_partitions(p_keep_months INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_cutoff DATE := (date_trunc('month', NOW()) - make_interval(months => p_keep_months))::DATE;
+    v_part RECORD;
+BEGIN
+    FOR v_part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.logs'::regclass
+          AND c.relname ~ '^logs_[0-9]{4}_[0-9]{2}$'
+          AND to_date(substring(c.relname FROM 6), 'YYYY_MM') < v_cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', v_part.relname);
+        RETURN NEXT v_part.relname;
+    END LOOP;
+
+    -- The default partition only holds history; it ages out row by row
+    DELETE FROM logs_default WHERE created_at < v_cutoff;
+    RETURN;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+SELECT ensure_log_partitions();
+
+-- Copy history from an older unpartitioned table once (drop logs_unpartitioned_copied after checking)
+DO $$
+BEGIN
+    IF to_regclass('public.logs_unpartitioned') IS NOT NULL THEN
+        INSERT INTO logs (event_type, telegram_id, username, details, message, created_at)
+        SELECT event_type, telegram_id, username, COALESCE(details, '{}'::jsonb), message, COALESCE(created_at, NOW())
+        FROM logs_unpartitioned;
+        ALTER TABLE logs_unpartitioned RENAME TO logs_unpartitioned_copied;
+    END IF;
+END $$;
+
+-- =====================================================
+-- 13. JSON IMPORT KEYS (migrate_to_supabase.py)
+-- =====================================================
+-- "<telegram_id>:<position>" of the row in the legacy JSON files, so a resumed
+-- migration upserts instead of inserting the same history twice
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS import_key TEXT;
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS import_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_import_key ON transactions(import_key);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_subscriptions_import_key ON subscriptions(import_key);
+
 -- =====================================================
 -- SCHEMA COMPLETE
 -- =====================================================
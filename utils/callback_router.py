@@ -0,0 +1,269 @@
+"""
+CALLBACK ROUTER
+================
+Dispatches callback queries through lookup tables instead of a linear filter scan.
+
+- Exact callback_data -> dict lookup, O(1)
+- Prefix routes ("buy:", "checkpay_") -> character trie, O(len(data)), most specific prefix wins
+- Versioned callback_data built with pack() ("1|action|arg|...") is parsed once and
+  routed by action; handlers that declare a `callback_args` parameter receive the args
+- FSM state rules match aiogram's: state=None (default) only without a state,
+  "*" for any state, or a State / StatesGroup / list of them
+
+Handlers register declaratively and the router is installed as the single
+callback_query handler:
+
+    @callback_router.exact("menu_buy_otts")
+    async def menu_buy_otts(callback_query): ...
+
+    @callback_router.prefix("buy:", state="*")
+    async def buy_callback(callback_query, state): ...
+
+    callback_router.install(dp)
+"""
+
+import inspect
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.dispatcher.handler import ctx_data
+
+CALLBACK_VERSION = "1"
+CALLBACK_SEP = "|"
+CALLBACK_MAX_BYTES = 64  # Telegram limit for callback_data
+
+
+# =====================================================
+# STRUCTURED CALLBACK DATA
+# =====================================================
+
+def pack(action: str, *args: Any) -> str:
+    """
+    Encode structured callback_data: "1|action|arg1|arg2".
+
+    Raises:
+        ValueError: If a part contains the separator or the result exceeds 64 bytes
+    """
+    parts = [CALLBACK_VERSION, action, *(str(a) for a in args)]
+    for part in parts[1:]:
+        if CALLBACK_SEP in part:
+            raise ValueError(f"callback_data part may not contain {CALLBACK_SEP!r}: {part!r}")
+    data = CALLBACK_SEP.join(parts)
+    if len(data.encode("utf-8")) > CALLBACK_MAX_BYTES:
+        raise ValueError(f"callback_data exceeds {CALLBACK_MAX_BYTES} bytes: {data!r}")
+    return data
+
+
+def unpack(data: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """Decode pack() output into (action, args); None for legacy callback_data"""
+    if not data.startswith(CALLBACK_VERSION + CALLBACK_SEP):
+        return None
+    _, action, *args = data.split(CALLBACK_SEP)
+    return action, tuple(args)
+
+
+# =====================================================
+# ROUTES
+# =====================================================
+
+class _Route:
+    __slots__ = ("handler", "states", "wants_state", "wants_args")
+
+    def __init__(self, handler: Callable, state):
+        self.handler = handler
+        self.states = _normalize_state(state)
+        params = inspect.signature(handler).parameters
+        self.wants_state = "state" in params
+        self.wants_args = "callback_args" in params
+
+    def accepts(self, current_state: Optional[str]) -> bool:
+        if self.states is None:
+            return True
+        return current_state in self.states
+
+
+def _normalize_state(state) -> Optional[frozenset]:
+    """Turn a state spec into a set of state names (None = any state)"""
+    if state == "*":
+        return None
+    specs = state if isinstance(state, (list, tuple, set)) else [state]
+    names = set()
+    for spec in specs:
+        if spec is None:
+            names.add(None)
+        elif isinstance(spec, State):
+            names.add(spec.state)
+        elif inspect.isclass(spec) and issubclass(spec, StatesGroup):
+            names.update(spec.all_states_names)
+        else:
+            names.add(spec)
+    return frozenset(names)
+
+
+class _TrieNode:
+    __slots__ = ("children", "routes")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.routes: List[_Route] = []
+
+
+class CallbackRouter:
+    """Exact-match dict + prefix trie dispatcher for callback queries"""
+
+    def __init__(self):
+        self._exact: Dict[str, List[_Route]] = {}
+        self._actions: Dict[str, List[_Route]] = {}
+        self._trie = _TrieNode()
+        self._fallback: Optional[_Route] = None
+        self._dp: Optional[Dispatcher] = None
+
+    # ========== REGISTRATION ==========
+
+    def exact(self, *values: str, state=None):
+        """Route callback_data equal to any of `values`"""
+        def decorator(handler):
+            route = _Route(handler, state)
+            for value in values:
+                self._exact.setdefault(value, []).append(route)
+            return handler
+        return decorator
+
+    def prefix(self, value: str, state=None):
+        """Route callback_data starting with `value`"""
+        def decorator(handler):
+            node = self._trie
+            for char in value:
+                node = node.children.setdefault(char, _TrieNode())
+            node.routes.append(_Route(handler, state))
+            return handler
+        return decorator
+
+    def action(self, name: str, state=None):
+        """Route pack(name, ...) callback_data; handler may take `callback_args`"""
+        def decorator(handler):
+            self._actions.setdefault(name, []).append(_Route(handler, state))
+            return handler
+        return decorator
+
+    def fallback(self, handler):
+        """Handler for callbacks no route accepts"""
+        self._fallback = _Route(handler, "*")
+        return handler
+
+    def install(self, dp: Dispatcher):
+        """Register the router as the dispatcher's only callback_query handler"""
+        self._dp = dp
+        dp.register_callback_query_handler(self.dispatch, state="*")
+
+    # ========== LOOKUP ==========
+
+    def candidates(self, data: str) -> Tuple[Iterable[_Route], Tuple[str, ...]]:
+        """
+        Routes that could handle `data`, most specific first, plus parsed args.
+
+        Cost depends on len(data), not on how many routes are registered.
+        """
+        unpacked = unpack(data)
+        if unpacked is not None:
+            action, args = unpacked
+            return self._actions.get(action, ()), args
+
+        exact = self._exact.get(data)
+        prefixed = []
+        node = self._trie
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.routes:
+                prefixed.append(node.routes)
+
+        if not prefixed:
+            return exact or (), ()
+        routes = list(exact or ())
+        for level in reversed(prefixed):
+            routes.extend(level)
+        return routes, ()
+
+    def match(self, data: str, current_state: Optional[str]) -> Tuple[Optional[_Route], Tuple[str, ...]]:
+        routes, args = self.candidates(data)
+        for route in routes:
+            if route.accepts(current_state):
+                return route, args
+        return self._fallback, args
+
+    # ========== DISPATCH ==========
+
+    async def dispatch(self, callback_query: types.CallbackQuery):
+        dp = self._dp or Dispatcher.get_current()
+        fsm = dp.current_state()
+        current_state = await fsm.get_state()
+
+        route, args = self.match(callback_query.data or "", current_state)
+        if route is None:
+            return
+
+        # Lets MetricsMiddleware label the callback with the route, not the router
+        data = ctx_data.get(None)
+        if data is not None:
+            data["callback_route"] = route.handler.__name__
+
+        kwargs = {}
+        if route.wants_state:
+            kwargs["state"] = fsm
+        if route.wants_args:
+            kwargs["callback_args"] = args
+        return await route.handler(callback_query, **kwargs)
+
+
+# Shared router the handler modules register on
+callback_router = CallbackRouter()
+
+
+# ============================================
+# BENCHMARK (For Reference)
+# ============================================
+if __name__ == "__main__":
+    import time
+
+    async def _noop(callback_query):
+        pass
+
+    exact_keys = [f"menu_item_{i}" for i in range(80)]
+    prefix_keys = [f"pfx{i}_" for i in range(40)] + ["buy:", "checkpay_", "admin_", "admin_ott_"]
+
+    router = CallbackRouter()
+    linear = []
+    for key in exact_keys:
+        router.exact(key)(_noop)
+        linear.append(lambda data, key=key: data == key)
+    for key in prefix_keys:
+        router.prefix(key)(_noop)
+        linear.append(lambda data, key=key: data.startswith(key))
+
+    samples = [exact_keys[-1], "admin_ott_netflix_4k", "checkpay_M-7127370646-20260101120000_500", pack("checkpay", "M-1", 50)]
+    router.action("checkpay")(_noop)
+    runs = 100_000
+
+    print("=" * 60)
+    print(f"Callback Dispatch Benchmark ({len(exact_keys) + len(prefix_keys) + 1} routes)")
+    print("=" * 60)
+    for data in samples:
+        start = time.perf_counter()
+        for _ in range(runs):
+            for check in linear:
+                if check(data):
+                    break
+        linear_ns = (time.perf_counter() - start) / runs * 1e9
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            router.match(data, None)
+        router_ns = (time.perf_counter() - start) / runs * 1e9
+
+        print(f"\n{data}")
+        print(f"  Linear filter scan : {linear_ns:>8,.0f} ns/callback")
+        print(f"  CallbackRouter     : {router_ns:>8,.0f} ns/callback")
+    print("\n" + "=" * 60)
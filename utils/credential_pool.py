@@ -0,0 +1,178 @@
+"""
+CREDENTIAL POOL
+================
+Per-plan in-memory pool of pre-leased credentials for instant delivery.
+
+- A background refiller leases small batches of unused stock rows to this process
+  (lease_stock RPC: atomic, SKIP LOCKED, with an expiry)
+- Purchases pop a lease from memory and claim it in one round-trip
+- Leases nearing expiry are dropped from memory; the database treats expired leases
+  as available again, so nothing is lost if the process dies
+- On shutdown all undelivered leases are released immediately
+- If the pool is empty or a lease was lost, delivery falls back to the shared stock table
+"""
+
+import asyncio
+import os
+import socket
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+from config.settings import (
+    CREDENTIAL_POOL_PLANS,
+    CREDENTIAL_POOL_SIZE,
+    CREDENTIAL_POOL_LOW,
+    CREDENTIAL_LEASE_TTL,
+    CREDENTIAL_LEASE_MARGIN,
+    CREDENTIAL_POOL_REFILL_INTERVAL,
+)
+from utils.supabase_db import (
+    lease_stock,
+    claim_leased_credential,
+    release_stock_leases,
+    get_unused_credential,
+    mark_credential_used,
+)
+from utils.metrics import cache_lookup
+
+
+class Lease:
+    __slots__ = ("stock_id", "credential", "expires")
+
+    def __init__(self, stock_id: int, credential: str, expires: float):
+        self.stock_id = stock_id
+        self.credential = credential
+        self.expires = expires  # time.monotonic() deadline for handing it out
+
+
+class CredentialPool:
+    """
+    Hot pool of leased credentials, one deque per plan.
+
+    Usage:
+        lease = credential_pool.take(plan_key)          # memory only
+        credential = credential_pool.deliver(plan_key, lease, telegram_id)
+        await credential_pool.close()                   # on shutdown
+    """
+
+    def __init__(self, plan_keys: Iterable[str] = CREDENTIAL_POOL_PLANS, size: int = CREDENTIAL_POOL_SIZE,
+                 low: int = CREDENTIAL_POOL_LOW, ttl: int = CREDENTIAL_LEASE_TTL,
+                 margin: int = CREDENTIAL_LEASE_MARGIN, interval: float = CREDENTIAL_POOL_REFILL_INTERVAL):
+        self.size = size
+        self.low = low
+        self.ttl = ttl
+        self.margin = margin
+        self.interval = interval
+        self._pools: Dict[str, Deque[Lease]] = {plan_key: deque() for plan_key in plan_keys}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def instance_id(self) -> str:
+        # Evaluated per call: webhook workers fork after import and must not share leases
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    # ========== PURCHASE PATH ==========
+
+    def take(self, plan_key: str) -> Optional[Lease]:
+        """Pop a still-valid lease for `plan_key` (no I/O); None if the pool is empty"""
+        pool = self._pools.get(plan_key)
+        if pool is None:
+            return None
+        self._ensure_refiller()
+
+        now = time.monotonic()
+        lease = None
+        while pool:
+            candidate = pool.popleft()
+            if candidate.expires > now:
+                lease = candidate
+                break
+            # Too close to expiry: let it lapse back into stock
+
+        cache_lookup("credential_pool", lease is not None)
+        if len(pool) <= self.low and self._wake:
+            self._wake.set()
+        return lease
+
+    def give_back(self, plan_key: str, lease: Optional[Lease]):
+        """Return an undelivered lease (e.g. insufficient balance) to the front of the pool"""
+        if lease is not None and lease.expires > time.monotonic():
+            self._pools[plan_key].appendleft(lease)
+
+    def deliver(self, plan_key: str, lease: Optional[Lease], telegram_id: int) -> Optional[str]:
+        """
+        Mark a credential used for `telegram_id` and return it.
+
+        Uses the lease when it is still ours, otherwise the shared stock table.
+        Returns None when no credential could be delivered.
+        """
+        if lease is not None and claim_leased_credential(lease.stock_id, self.instance_id, telegram_id):
+            return lease.credential
+        credential = get_unused_credential(plan_key)
+        if credential and mark_credential_used(plan_key, credential, telegram_id):
+            return credential
+        return None
+
+    # ========== REFILLER ==========
+
+    def _ensure_refiller(self):
+        if self._task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._refill_loop())
+
+    async def _refill_loop(self):
+        while True:
+            for plan_key in self._pools:
+                try:
+                    await self.refill(plan_key)
+                except Exception as e:
+                    print(f"⚠️ [CREDENTIAL POOL] Refill failed for {plan_key}: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def refill(self, plan_key: str):
+        pool = self._pools[plan_key]
+        now = time.monotonic()
+        while pool and pool[0].expires <= now:
+            pool.popleft()
+        missing = self.size - len(pool)
+        if missing <= 0 or len(pool) > self.low:
+            return
+
+        # Data layer is synchronous; keep the event loop free while leasing
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(None, lease_stock, plan_key, self.instance_id, missing, self.ttl)
+        deadline = time.monotonic() + self.ttl - self.margin
+        pool.extend(Lease(row["id"], row["credential"], deadline) for row in rows)
+
+    # ========== SHUTDOWN ==========
+
+    def held_ids(self) -> List[int]:
+        return [lease.stock_id for pool in self._pools.values() for lease in pool]
+
+    async def close(self):
+        """Stop refilling and release every undelivered lease"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        ids = self.held_ids()
+        for pool in self._pools.values():
+            pool.clear()
+        if ids:
+            loop = asyncio.get_running_loop()
+            released = await loop.run_in_executor(None, release_stock_leases, self.instance_id, ids)
+            print(f"🔑 Released {released} credential leases")
+
+
+# Shared pool for this process (webhook workers each get their own after fork)
+credential_pool = CredentialPool()
@@ -0,0 +1,291 @@
+"""
+DATA-LAYER INSTRUMENTATION
+===========================
+Latency, error and round-trip accounting for utils/supabase_db.py.
+
+- instrument_functions() times every public data-layer function
+- InstrumentedClient wraps the Supabase client so each query's execute() is observed;
+  failures are attributed to the data-layer function that issued them, even when
+  that function catches the exception and returns a default
+- DbTraceMiddleware gives every Telegram update a trace: each query is recorded as
+  table, operation, filter shape (columns only, never values) and duration
+
+Per update it warns when:
+- more than DB_TRACE_MAX_CALLS queries run (fan-out)
+- the same query shape runs DB_TRACE_REPEAT_THRESHOLD times (N+1)
+
+Flagged or slow updates and slow single queries are written to DB_SLOW_LOG_PATH.
+"""
+
+import functools
+import inspect
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from config.settings import (
+    DB_TRACE_MAX_CALLS,
+    DB_TRACE_REPEAT_THRESHOLD,
+    DB_SLOW_QUERY_MS,
+    DB_SLOW_UPDATE_MS,
+    DB_SLOW_LOG_PATH,
+)
+from utils.metrics import DB_SECONDS, DB_ERRORS
+
+log = logging.getLogger(__name__)
+
+# Data-layer function currently running (outermost wins for nested calls)
+current_db_function: ContextVar[Optional[str]] = ContextVar("current_db_function", default=None)
+
+
+def _timed(fn: Callable) -> Callable:
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if current_db_function.get() is not None:
+            # Nested data-layer call: accounted to the outer function
+            return fn(*args, **kwargs)
+        token = current_db_function.set(name)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not getattr(e, "_db_counted", False):
+                DB_ERRORS.inc(function=name)
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - start, function=name)
+            current_db_function.reset(token)
+
+    return wrapper
+
+
+def instrument_functions(namespace: Dict[str, Any], module_name: str):
+    """Wrap every public function defined in `module_name` (pass the module's globals())"""
+    for name, obj in list(namespace.items()):
+        if (
+            not name.startswith("_")
+            and inspect.isfunction(obj)
+            and obj.__module__ == module_name
+            and not inspect.iscoroutinefunction(obj)
+        ):
+            namespace[name] = _timed(obj)
+
+
+# =====================================================
+# SLOW-LOG
+# =====================================================
+
+_slow_log: Optional[logging.Logger] = None
+
+
+def _get_slow_log() -> logging.Logger:
+    global _slow_log
+    if _slow_log is None:
+        _slow_log = logging.getLogger("db_slow")
+        _slow_log.propagate = False
+        _slow_log.setLevel(logging.INFO)
+        try:
+            os.makedirs(os.path.dirname(DB_SLOW_LOG_PATH) or ".", exist_ok=True)
+            handler = logging.FileHandler(DB_SLOW_LOG_PATH, encoding="utf-8")
+        except OSError as e:
+            print(f"⚠️ DB slow-log unavailable ({DB_SLOW_LOG_PATH}): {e}")
+            handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        _slow_log.addHandler(handler)
+    return _slow_log
+
+
+# =====================================================
+# UPDATE TRACES
+# =====================================================
+
+class UpdateTrace:
+    """Supabase round-trips caused by one Telegram update"""
+
+    __slots__ = ("label", "calls", "shapes", "warnings", "start")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.calls: List[Tuple[str, str, float]] = []  # (function, shape, seconds)
+        self.shapes: Counter = Counter()
+        self.warnings: List[str] = []
+        self.start = time.perf_counter()
+
+    def record(self, function: str, shape: str, seconds: float):
+        self.calls.append((function, shape, seconds))
+        self.shapes[shape] += 1
+
+        if len(self.calls) == DB_TRACE_MAX_CALLS + 1:
+            self._warn(f"{len(self.calls)} queries in one update (limit {DB_TRACE_MAX_CALLS})")
+        if self.shapes[shape] == DB_TRACE_REPEAT_THRESHOLD:
+            self._warn(f"N+1 suspected: {shape} repeated {DB_TRACE_REPEAT_THRESHOLD}x from {function}")
+
+    def _warn(self, message: str):
+        self.warnings.append(message)
+        log.warning(f"⚠️ [DB TRACE] {self.label}: {message}")
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(seconds for _, _, seconds in self.calls)
+
+    def summary(self) -> str:
+        lines = [
+            f"[UPDATE] {self.label} queries={len(self.calls)} "
+            f"db_ms={self.db_seconds * 1000:.1f} total_ms={(time.perf_counter() - self.start) * 1000:.1f}"
+        ]
+        lines += [f"  ! {warning}" for warning in self.warnings]
+        for shape, count in self.shapes.most_common():
+            ms = sum(s for _, sh, s in self.calls if sh == shape) * 1000
+            lines.append(f"  {count:>3}x {ms:>8.1f}ms  {shape}")
+        return "\n".join(lines)
+
+    def finish(self):
+        if not self.calls:
+            return
+        if self.warnings or self.db_seconds * 1000 >= DB_SLOW_UPDATE_MS:
+            _get_slow_log().info(self.summary())
+
+
+current_trace: ContextVar[Optional[UpdateTrace]] = ContextVar("current_db_trace", default=None)
+
+_trace_listeners: List[Callable[[UpdateTrace], None]] = []
+
+
+def add_trace_listener(listener: Callable[[UpdateTrace], None]):
+    """Call `listener(trace)` for every finished update trace (runs in the update's context)"""
+    _trace_listeners.append(listener)
+
+
+def _update_label(update: types.Update) -> str:
+    """Short description of an update for trace output (no free-form user text)"""
+    if update.callback_query:
+        return f"#{update.update_id} callback:{update.callback_query.data}"
+    if update.message:
+        text = update.message.text or ""
+        return f"#{update.update_id} message:{text.split()[0] if text.startswith('/') else '<text>'}"
+    return f"#{update.update_id} update"
+
+
+class DbTraceMiddleware(BaseMiddleware):
+    """
+    Opens a trace per update and writes it to the slow-log when flagged.
+
+    Usage:
+        dp.middleware.setup(DbTraceMiddleware())
+    """
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        data["_db_trace_token"] = current_trace.set(UpdateTrace(_update_label(update)))
+
+    async def on_post_process_update(self, update: types.Update, results, data: dict):
+        token = data.pop("_db_trace_token", None)
+        if token is None:
+            return
+        trace = current_trace.get()
+        current_trace.reset(token)
+        if trace is not None:
+            trace.finish()
+            for listener in _trace_listeners:
+                listener(trace)
+
+
+# =====================================================
+# CLIENT WRAPPER
+# =====================================================
+
+# Builder methods whose first argument is a column name (kept in the query shape)
+_COLUMN_METHODS = {
+    "eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is_", "in_",
+    "contains", "contained_by", "order", "filter",
+}
+_OPERATIONS = {"select", "insert", "update", "upsert", "delete"}
+
+
+class _QueryProxy:
+    """Forwards the postgrest builder chain and observes the final execute()"""
+
+    __slots__ = ("_builder", "_table", "_steps")
+
+    def __init__(self, builder, table: str, steps: Tuple[str, ...] = ()):
+        self._builder = builder
+        self._table = table
+        self._steps = steps
+
+    def __getattr__(self, attr):
+        if attr == "execute":
+            return self._execute
+        value = getattr(self._builder, attr)
+        if not callable(value):
+            # Properties such as .not_ return the next builder directly
+            if hasattr(value, "execute"):
+                return _QueryProxy(value, self._table, self._steps + (attr,))
+            return value
+
+        def chained(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _QueryProxy(result, self._table, self._steps + (_step(attr, args),))
+            return result
+
+        return chained
+
+    @property
+    def shape(self) -> str:
+        """e.g. "users.select eq(telegram_id)" - table, operation and filter columns"""
+        operation = next((s for s in self._steps if s in _OPERATIONS), "query")
+        filters = " ".join(s for s in self._steps if s not in _OPERATIONS)
+        return f"{self._table}.{operation}" + (f" {filters}" if filters else "")
+
+    def _execute(self, *args, **kwargs):
+        function = current_db_function.get() or f"table:{self._table}"
+        start = time.perf_counter()
+        try:
+            return self._builder.execute(*args, **kwargs)
+        except Exception as e:
+            DB_ERRORS.inc(function=function)
+            e._db_counted = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            shape = self.shape
+            trace = current_trace.get()
+            if trace is not None:
+                trace.record(function, shape, seconds)
+            if seconds * 1000 >= DB_SLOW_QUERY_MS:
+                label = trace.label if trace else "-"
+                _get_slow_log().info(f"[QUERY] {seconds * 1000:.1f}ms {function} {shape} (update {label})")
+
+
+def _step(attr: str, args: tuple) -> str:
+    if attr in _COLUMN_METHODS and args and isinstance(args[0], str):
+        return f"{attr}({args[0]})"
+    return attr
+
+
+class InstrumentedClient:
+    """
+    Drop-in wrapper around the Supabase Client.
+
+    Usage:
+        supabase = InstrumentedClient(create_client(url, key))
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str) -> _QueryProxy:
+        return _QueryProxy(self._client.table(name), name)
+
+    def rpc(self, fn: str, *args, **kwargs) -> _QueryProxy:
+        return _QueryProxy(self._client.rpc(fn, *args, **kwargs), f"rpc:{fn}")
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
@@ -1,116 +1,245 @@
 """
 Database utilities for managing OTT plans and credentials stock
+
+Stock is held in memory once loaded (first call, never at import):
+- per-plan free-list of unused credentials: claims are O(1)
+- per-plan hash index credential -> record: dedup and mark-used are O(1)
+- every change is appended (and fsynced) to a journal next to stocks.json;
+  the journal is folded into stocks.json with an atomic replace every
+  STOCK_JOURNAL_COMPACT entries, so a crash never leaves a half-written file
 """
 import json
 import os
+import threading
+from collections import deque
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Deque
 
 PLANS_DB = "data/plans.json"
 STOCKS_DB = "data/stocks.json"
+STOCKS_JOURNAL = STOCKS_DB + ".journal"
+STOCK_JOURNAL_COMPACT = 1000  # Journal entries before stocks.json is rewritten
+
+_lock = threading.RLock()
+_plans: Optional[Dict] = None
+_stocks: Optional[Dict[str, List[Dict]]] = None
+_index: Dict[str, Dict[str, Dict]] = {}     # plan_key -> credentials -> record
+_free: Dict[str, Deque[Dict]] = {}          # plan_key -> unused records, oldest first
+_unused: Dict[str, int] = {}                # plan_key -> unused count
+_journal_entries = 0
 
-os.makedirs("data", exist_ok=True)
+
+# ========== FILE I/O ==========
+
+def _atomic_write(path: str, data):
+    """Write to a temp file, fsync, then rename over the original"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _load_json(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
 
 
 # ========== PLANS DATABASE ==========
 
 def _read_plans():
-    """Read plans database"""
-    if not os.path.exists(PLANS_DB):
-        with open(PLANS_DB, "w") as f:
-            json.dump({}, f, indent=2)
-    with open(PLANS_DB, "r") as f:
-        return json.load(f)
+    """Read plans database (defaults are filled in on first access)"""
+    global _plans
+    with _lock:
+        if _plans is None:
+            _plans = _load_json(PLANS_DB)
+            initialize_default_plans()
+        return _plans
 
 
 def _write_plans(data):
     """Write plans database"""
-    with open(PLANS_DB, "w") as f:
-        json.dump(data, f, indent=2)
+    global _plans
+    with _lock:
+        _plans = data
+        _atomic_write(PLANS_DB, data)
+
+
+def _with_stock(plan: Dict) -> Dict:
+    plan = dict(plan)
+    plan["stock"] = get_plan_stock_count(plan["plan_key"]) if "plan_key" in plan else plan.get("stock", 0)
+    return plan
+
+
+# ========== STOCKS DATABASE ==========
+
+def _index_plan(plan_key: str):
+    records = _stocks[plan_key]
+    _index[plan_key] = {r["credentials"]: r for r in records}
+    _free[plan_key] = deque(r for r in records if not r.get("used", False))
+    _unused[plan_key] = len(_free[plan_key])
 
 
 def _read_stocks():
-    """Read stocks database"""
-    if not os.path.exists(STOCKS_DB):
-        with open(STOCKS_DB, "w") as f:
-            json.dump({}, f, indent=2)
-    with open(STOCKS_DB, "r") as f:
-        return json.load(f)
+    """Read stocks database (snapshot + journal replay, once per process)"""
+    global _stocks, _journal_entries
+    with _lock:
+        if _stocks is None:
+            _stocks = _load_json(STOCKS_DB)
+            for plan_key in _stocks:
+                _index_plan(plan_key)
+            _journal_entries = _replay_journal()
+            if _journal_entries:
+                _write_stocks(_stocks)
+        return _stocks
 
 
 def _write_stocks(data):
-    """Write stocks database"""
-    with open(STOCKS_DB, "w") as f:
-        json.dump(data, f, indent=2)
+    """Write a full stocks snapshot and start a fresh journal"""
+    global _journal_entries
+    with _lock:
+        _atomic_write(STOCKS_DB, data)
+        # Crashing before this truncate is safe: journal replay is idempotent
+        open(STOCKS_JOURNAL, "w").close()
+        _journal_entries = 0
+
+
+def _replay_journal() -> int:
+    if not os.path.exists(STOCKS_JOURNAL):
+        return 0
+    entries = 0
+    with open(STOCKS_JOURNAL, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # torn final line from a crash mid-append
+            if entry["op"] == "use":
+                _apply_use(entry["plan_key"], entry["credentials"], entry["used_at"], entry["used_by"])
+            entries += 1
+    return entries
+
+
+def _journal(entry: Dict):
+    """Append one change durably; compact into stocks.json when the journal grows"""
+    global _journal_entries
+    with open(STOCKS_JOURNAL, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    _journal_entries += 1
+    if _journal_entries >= STOCK_JOURNAL_COMPACT:
+        _write_stocks(_stocks)
+
+
+def _apply_add(plan_key: str, record: Dict) -> bool:
+    if plan_key not in _stocks:
+        _stocks[plan_key] = []
+        _index_plan(plan_key)
+    if record["credentials"] in _index[plan_key]:
+        return False
+    _stocks[plan_key].append(record)
+    _index[plan_key][record["credentials"]] = record
+    if not record.get("used", False):
+        _free[plan_key].append(record)
+        _unused[plan_key] += 1
+    return True
+
+
+def _apply_use(plan_key: str, credentials: str, used_at: str, used_by) -> bool:
+    record = _index.get(plan_key, {}).get(credentials)
+    if record is None or record.get("used", False):
+        return False
+    record["used"] = True
+    record["used_at"] = used_at
+    record["used_by"] = used_by
+    _unused[plan_key] -= 1
+    # The record stays in the free-list; consumers skip used heads lazily
+    return True
+
+
+def _next_free(plan_key: str) -> Optional[Dict]:
+    free = _free.get(plan_key)
+    while free and free[0].get("used", False):
+        free.popleft()
+    return free[0] if free else None
 
 
 # ========== PLAN MANAGEMENT ==========
 
 def get_plan(plan_key: str) -> Optional[Dict]:
     """Get plan details"""
-    plans = _read_plans()
-    return plans.get(plan_key)
+    plan = _read_plans().get(plan_key)
+    return _with_stock(plan) if plan else None
 
 
 def get_all_plans() -> Dict:
     """Get all plans"""
-    return _read_plans()
+    return {key: _with_stock(plan) for key, plan in _read_plans().items()}
 
 
 def create_plan(plan_key: str, ott_name: str, price: int, description: str = ""):
     """Create new plan"""
-    plans = _read_plans()
-    plans[plan_key] = {
-        "plan_key": plan_key,
-        "ott_name": ott_name,
-        "price": price,
-        "description": description,
-        "stock": 0,
-        "active": True,
-        "created_at": datetime.now().isoformat()
-    }
-    _write_plans(plans)
+    with _lock:
+        plans = _read_plans()
+        plans[plan_key] = {
+            "plan_key": plan_key,
+            "ott_name": ott_name,
+            "price": price,
+            "description": description,
+            "stock": get_plan_stock_count(plan_key),
+            "active": True,
+            "created_at": datetime.now().isoformat()
+        }
+        _write_plans(plans)
 
 
 def update_plan_price(plan_key: str, price: int):
     """Update plan price"""
-    plans = _read_plans()
-    if plan_key in plans:
-        plans[plan_key]["price"] = price
-        _write_plans(plans)
+    with _lock:
+        plans = _read_plans()
+        if plan_key in plans:
+            plans[plan_key]["price"] = price
+            _write_plans(plans)
 
 
 def update_plan_details(plan_key: str, description: str):
     """Update plan description"""
-    plans = _read_plans()
-    if plan_key in plans:
-        plans[plan_key]["description"] = description
-        _write_plans(plans)
+    with _lock:
+        plans = _read_plans()
+        if plan_key in plans:
+            plans[plan_key]["description"] = description
+            _write_plans(plans)
 
 
 def toggle_plan_active(plan_key: str):
     """Toggle plan active status"""
-    plans = _read_plans()
-    if plan_key in plans:
-        plans[plan_key]["active"] = not plans[plan_key].get("active", True)
-        _write_plans(plans)
-        return plans[plan_key]["active"]
-    return None
+    with _lock:
+        plans = _read_plans()
+        if plan_key in plans:
+            plans[plan_key]["active"] = not plans[plan_key].get("active", True)
+            _write_plans(plans)
+            return plans[plan_key]["active"]
+        return None
 
 
 def get_plan_stock_count(plan_key: str) -> int:
     """Get available stock count for plan"""
-    stocks = _read_stocks()
-    plan_stocks = stocks.get(plan_key, [])
-    return len([s for s in plan_stocks if not s.get("used", False)])
+    with _lock:
+        _read_stocks()
+        return _unused.get(plan_key, 0)
 
 
 def update_plan_stock_count(plan_key: str):
-    """Update stock count in plan"""
-    plans = _read_plans()
-    if plan_key in plans:
-        plans[plan_key]["stock"] = get_plan_stock_count(plan_key)
-        _write_plans(plans)
+    """Update stock count in plan (in memory; written with the next plan edit)"""
+    with _lock:
+        plans = _read_plans()
+        if plan_key in plans:
+            plans[plan_key]["stock"] = get_plan_stock_count(plan_key)
 
 
 # ========== STOCK MANAGEMENT ==========
@@ -120,76 +249,83 @@ def add_credentials(plan_key: str, credentials_list: List[str]) -> Dict:
     Add credentials to stock
     Returns: {"added": count, "duplicates": count, "total": count}
     """
-    stocks = _read_stocks()
-    
-    if plan_key not in stocks:
-        stocks[plan_key] = []
-    
-    existing_creds = [s["credentials"] for s in stocks[plan_key]]
     added = 0
     duplicates = 0
-    
-    for cred in credentials_list:
-        cred = cred.strip()
-        if not cred:
-            continue
-            
-        if cred in existing_creds:
-            duplicates += 1
-            continue
-        
-        stocks[plan_key].append({
-            "credentials": cred,
-            "used": False,
-            "added_at": datetime.now().isoformat(),
-            "used_at": None,
-            "used_by": None
-        })
-        added += 1
-    
-    _write_stocks(stocks)
-    update_plan_stock_count(plan_key)
-    
-    return {
-        "added": added,
-        "duplicates": duplicates,
-        "total": len(stocks[plan_key])
-    }
+
+    with _lock:
+        _read_stocks()
+        now = datetime.now().isoformat()
+        for cred in credentials_list:
+            cred = cred.strip()
+            if not cred:
+                continue
+
+            record = {
+                "credentials": cred,
+                "used": False,
+                "added_at": now,
+                "used_at": None,
+                "used_by": None
+            }
+            if not _apply_add(plan_key, record):
+                duplicates += 1
+                continue
+            added += 1
+
+        # Bulk uploads go straight into a new snapshot instead of the journal
+        if added:
+            _write_stocks(_stocks)
+        update_plan_stock_count(plan_key)
+
+        return {
+            "added": added,
+            "duplicates": duplicates,
+            "total": len(_stocks.get(plan_key, []))
+        }
 
 
 def get_unused_credential(plan_key: str) -> Optional[str]:
     """Get one unused credential"""
-    stocks = _read_stocks()
-    plan_stocks = stocks.get(plan_key, [])
-    
-    for stock in plan_stocks:
-        if not stock.get("used", False):
-            return stock["credentials"]
-    
-    return None
+    with _lock:
+        _read_stocks()
+        record = _next_free(plan_key)
+        return record["credentials"] if record else None
 
 
 def mark_credential_used(plan_key: str, credentials: str, user_id: int):
     """Mark credential as used"""
-    stocks = _read_stocks()
-    plan_stocks = stocks.get(plan_key, [])
-    
-    for stock in plan_stocks:
-        if stock["credentials"] == credentials and not stock.get("used", False):
-            stock["used"] = True
-            stock["used_at"] = datetime.now().isoformat()
-            stock["used_by"] = user_id
-            _write_stocks(stocks)
-            update_plan_stock_count(plan_key)
-            return True
-    
-    return False
+    with _lock:
+        _read_stocks()
+        used_at = datetime.now().isoformat()
+        if not _apply_use(plan_key, credentials, used_at, user_id):
+            return False
+        _journal({"op": "use", "plan_key": plan_key, "credentials": credentials,
+                  "used_at": used_at, "used_by": user_id})
+        update_plan_stock_count(plan_key)
+        return True
+
+
+def claim_credential(plan_key: str, user_id: int) -> Optional[str]:
+    """Take the next unused credential and mark it used in one step"""
+    with _lock:
+        credentials = get_unused_credential(plan_key)
+        if credentials is None:
+            return None
+        mark_credential_used(plan_key, credentials, user_id)
+        return credentials
 
 
 def get_all_stock_for_plan(plan_key: str) -> List[Dict]:
     """Get all stock for a plan"""
-    stocks = _read_stocks()
-    return stocks.get(plan_key, [])
+    with _lock:
+        return [dict(r) for r in _read_stocks().get(plan_key, [])]
+
+
+def flush_stocks():
+    """Fold the journal into stocks.json (e.g. on shutdown)"""
+    with _lock:
+        if _stocks is not None and _journal_entries:
+            _write_stocks(_stocks)
 
 
 # ========== INITIALIZATION ==========
@@ -197,7 +333,7 @@ def get_all_stock_for_plan(plan_key: str) -> List[Dict]:
 def initialize_default_plans():
     """Initialize default plans if not exist"""
     plans = _read_plans()
-    
+
     default_plans = {
         "netflix_4k": {
             "plan_key": "netflix_4k",
@@ -274,12 +410,7 @@ def initialize_default_plans():
     }
     
     # Only add plans that don't exist
-    for key, plan in default_plans.items():
-        if key not in plans:
-            plans[key] = plan
-    
-    _write_plans(plans)
-
-
-# Initialize on import
-initialize_default_plans()
+    missing = {key: plan for key, plan in default_plans.items() if key not in plans}
+    if missing:
+        plans.update(missing)
+        _write_plans(plans)
@@ -0,0 +1,183 @@
+"""
+SUBSCRIPTION EXPIRY ENGINE
+===========================
+Periodic job that acts on subscriptions' expires_at.
+
+Each pass:
+1. Expire - pages through active subscriptions with expires_at <= now, flips each
+   page to 'expired' in one bulk update and tells those users their plan ended
+2. Reclaim - queues the stock rows behind those subscriptions for admin review
+   (see CREDENTIAL RECLAIMS in supabase_schema.sql and the admin panel)
+3. Remind - pages through active, not-yet-reminded subscriptions ending within
+   SUBSCRIPTION_REMIND_BEFORE hours and sends a renewal reminder
+
+Pages are keyset-ordered by (expires_at, id) on the partial index
+idx_subscriptions_active_expiry, so a pass only reads the rows in its window
+and never scans expired history. Messages go through RateLimitedSender.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+from aiogram import Bot
+
+from config.settings import (
+    PLANS,
+    SUBSCRIPTION_EXPIRY_INTERVAL,
+    SUBSCRIPTION_REMIND_BEFORE,
+    SUBSCRIPTION_EXPIRY_BATCH,
+)
+from utils.supabase_db import (
+    get_active_subscriptions_due,
+    expire_subscriptions,
+    mark_subscriptions_reminded,
+    queue_credential_reclaims,
+)
+from utils.log_utils import send_log
+from utils.message_sender import RateLimitedSender
+from utils.screens import RENEWAL_REMINDER_TEMPLATE, SUBSCRIPTION_EXPIRED_TEMPLATE, RENEW_KBS
+
+log = logging.getLogger(__name__)
+
+
+def _plan_name(plan_key: str) -> str:
+    return PLANS.get(plan_key, {}).get("name", plan_key)
+
+
+def _format_date(value: str) -> str:
+    try:
+        return datetime.fromisoformat(value).strftime("%d %b %Y")
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _is_after(value: str, moment: datetime) -> bool:
+    try:
+        return datetime.fromisoformat(value) > moment
+    except (TypeError, ValueError):
+        return False
+
+
+class SubscriptionExpiryEngine:
+    """
+    Usage:
+        engine = SubscriptionExpiryEngine(bot)
+        engine.start()          # inside the running loop (on_startup)
+        await engine.stop()     # on_shutdown
+    """
+
+    def __init__(self, bot: Bot, interval: float = SUBSCRIPTION_EXPIRY_INTERVAL,
+                 remind_before_hours: float = SUBSCRIPTION_REMIND_BEFORE, batch: int = SUBSCRIPTION_EXPIRY_BATCH):
+        self.sender = RateLimitedSender(bot)
+        self.interval = interval
+        self.remind_before = timedelta(hours=remind_before_hours)
+        self.batch = batch
+        self.reclaims_queued = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # ========== SCANNING ==========
+
+    async def _pages(self, until: datetime, unreminded: bool = False) -> AsyncIterator[List[Dict]]:
+        """Keyset pages of active subscriptions expiring at or before `until`"""
+        loop = asyncio.get_running_loop()
+        after = None
+        while True:
+            # Data layer is synchronous; keep the event loop free between pages
+            rows = await loop.run_in_executor(
+                None, get_active_subscriptions_due, until.isoformat(), after, self.batch, unreminded
+            )
+            if not rows:
+                return
+            yield rows
+            if len(rows) < self.batch:
+                return
+            after = (rows[-1]["expires_at"], rows[-1]["id"])
+
+    # ========== PASSES ==========
+
+    async def expire_due(self, now: datetime) -> int:
+        loop = asyncio.get_running_loop()
+        expired = 0
+        async for rows in self._pages(now):
+            changed = await loop.run_in_executor(None, expire_subscriptions, [row["id"] for row in rows])
+            expired += len(changed)
+            if changed:
+                self.reclaims_queued += await loop.run_in_executor(
+                    None, queue_credential_reclaims, [row["id"] for row in changed]
+                )
+            # Only notify rows this pass actually flipped
+            for row in changed:
+                await self.sender.send_message(
+                    row["telegram_id"],
+                    SUBSCRIPTION_EXPIRED_TEMPLATE.format(plan=_plan_name(row["plan_key"])),
+                    parse_mode="HTML",
+                    reply_markup=RENEW_KBS.get(row["plan_key"]),
+                )
+        return expired
+
+    async def remind_due(self, now: datetime) -> int:
+        loop = asyncio.get_running_loop()
+        reminded = 0
+        async for rows in self._pages(now + self.remind_before, unreminded=True):
+            rows = [row for row in rows if _is_after(row["expires_at"], now)]
+            if not rows:
+                continue
+            # Mark first: a crash mid-page loses a reminder rather than sending it twice
+            if not await loop.run_in_executor(None, mark_subscriptions_reminded, [row["id"] for row in rows]):
+                continue
+            for row in rows:
+                sent = await self.sender.send_message(
+                    row["telegram_id"],
+                    RENEWAL_REMINDER_TEMPLATE.format(
+                        plan=_plan_name(row["plan_key"]), ends=_format_date(row["expires_at"])
+                    ),
+                    parse_mode="HTML",
+                    reply_markup=RENEW_KBS.get(row["plan_key"]),
+                )
+                reminded += sent
+        return reminded
+
+    async def run_once(self) -> Dict[str, int]:
+        now = datetime.now(timezone.utc)
+        self.reclaims_queued = 0
+        stats = {"expired": await self.expire_due(now)}
+        stats["reclaims"] = self.reclaims_queued
+        stats["reminded"] = await self.remind_due(now)
+        self.sender.forget_chats()
+        if stats["expired"] or stats["reminded"]:
+            log.info(
+                f"⏰ Expiry pass: {stats['expired']} expired, {stats['reclaims']} credentials queued for review, "
+                f"{stats['reminded']} reminded"
+            )
+        if stats["reclaims"]:
+            await send_log(
+                f"♻️ *Credentials Awaiting Review*\n"
+                f"Queued: {stats['reclaims']}\n"
+                f"Admin Panel → Subscriptions → Reclaims"
+            )
+        return stats
+
+    # ========== SCHEDULING ==========
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"⚠️ [EXPIRY] Pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,99 +1,254 @@
+"""
+LOCAL USER STORE
+=================
+Embedded SQLite (WAL) storage behind the original JSON-store API.
+
+- Every write is a single indexed statement inside a short transaction:
+  O(log n) per call instead of rewriting data/users.json and data/transactions.json
+- WAL mode + busy timeout: readers never block, concurrent writers queue instead
+  of corrupting a half-written file
+- One connection per thread, opened lazily; the schema is created on first use
+- On first open, existing data/users.json / data/transactions.json are imported
+  once; the JSON files are never written again (migrate_to_supabase.py reads
+  this store, not them)
+"""
+
 import json
 import os
+import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from config.settings import DATA_FILE, PLANS
+from typing import Dict, Iterator, List, Optional, Tuple
 
-DATA_TRANSACTIONS = "data/transactions.json"
-os.makedirs(os.path.dirname(DATA_TRANSACTIONS), exist_ok=True)
+from config.settings import DATA_FILE, LOCAL_DB_PATH, PLANS
 
+DATA_TRANSACTIONS = "data/transactions.json"
 
-# --- Helper functions for reading/writing JSON files ---
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_path: Optional[str] = None
+
+# Columns stored natively; any other user keys round-trip through users.extra
+_USER_COLUMNS = ("id", "name", "wallet", "joined_at", "referred_by")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    wallet INTEGER NOT NULL DEFAULT 0,
+    joined_at TEXT,
+    referred_by INTEGER,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    plan_key TEXT NOT NULL,
+    name TEXT,
+    price INTEGER,
+    bought_at TEXT,
+    expires_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions(user_id);
+CREATE TABLE IF NOT EXISTS referrals (
+    id INTEGER PRIMARY KEY,
+    referrer_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    description TEXT,
+    amount INTEGER NOT NULL,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions(user_id, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+# --- Connection management ---
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _conn() -> sqlite3.Connection:
+    """This thread's connection (schema + one-time JSON import on first use)"""
+    global _initialized_path
+    path = LOCAL_DB_PATH
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != path:
+        conn = _local.conn = _connect(path)
+        _local.path = path
+    if _initialized_path != path:
+        with _init_lock:
+            if _initialized_path != path:
+                conn.executescript(_SCHEMA)
+                _import_legacy_json(conn)
+                _initialized_path = path
+    return conn
+
+
+@contextmanager
+def _tx() -> Iterator[sqlite3.Connection]:
+    """Write transaction; BEGIN IMMEDIATE takes the write lock up front"""
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+# --- Row mapping ---
+
+def _insert_user(conn: sqlite3.Connection, user_id: int, user: dict):
+    extra = {k: v for k, v in user.items() if k not in _USER_COLUMNS + ("subscriptions", "referrals")}
+    conn.execute(
+        "INSERT OR REPLACE INTO users (id, name, wallet, joined_at, referred_by, extra) VALUES (?, ?, ?, ?, ?, ?)",
+        (user_id, user.get("name") or "", user.get("wallet", 0), user.get("joined_at"),
+         user.get("referred_by"), json.dumps(extra)),
+    )
+    conn.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
+    conn.executemany(
+        "INSERT INTO subscriptions (user_id, plan_key, name, price, bought_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(user_id, s.get("plan_key"), s.get("name"), s.get("price"), s.get("bought_at"), s.get("expires_at"))
+         for s in user.get("subscriptions", [])],
+    )
+    conn.execute("DELETE FROM referrals WHERE referrer_id = ?", (user_id,))
+    conn.executemany(
+        "INSERT INTO referrals (referrer_id, user_id) VALUES (?, ?)",
+        [(user_id, int(r)) for r in user.get("referrals", [])],
+    )
+
+
+def _load_user(conn: sqlite3.Connection, row: sqlite3.Row) -> dict:
+    user = {
+        "id": row["id"],
+        "name": row["name"],
+        "wallet": row["wallet"],
+        "subscriptions": [
+            {k: s[k] for k in ("plan_key", "name", "price", "bought_at", "expires_at")}
+            for s in conn.execute("SELECT * FROM subscriptions WHERE user_id = ? ORDER BY id", (row["id"],))
+        ],
+        "joined_at": row["joined_at"],
+        "referred_by": row["referred_by"],
+        "referrals": [
+            r[0] for r in conn.execute("SELECT user_id FROM referrals WHERE referrer_id = ? ORDER BY id", (row["id"],))
+        ],
+    }
+    user.update(json.loads(row["extra"] or "{}"))
+    return user
+
+
+def _import_legacy_json(conn: sqlite3.Connection):
+    """Copy data/users.json and data/transactions.json in once, on first open"""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if os.path.exists(DATA_FILE):
+            with open(DATA_FILE, "r") as f:
+                for uid, user in json.load(f).items():
+                    _insert_user(conn, int(uid), user)
+        if os.path.exists(DATA_TRANSACTIONS):
+            with open(DATA_TRANSACTIONS, "r") as f:
+                for uid, txns in json.load(f).items():
+                    conn.executemany(
+                        "INSERT INTO transactions (user_id, description, amount, timestamp) VALUES (?, ?, ?, ?)",
+                        [(int(uid), t.get("description"), t.get("amount", 0), t.get("timestamp")) for t in txns],
+                    )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)", (_now(),))
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# --- Compatibility helpers (whole-store snapshots; prefer the functions below) ---
 
 def _read_all():
-    """Read user data JSON file."""
-    if not os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "w") as f:
-            json.dump({}, f, indent=2)
-    with open(DATA_FILE, "r") as f:
-        return json.load(f)
+    """All users as the legacy {user_id: user} dict."""
+    conn = _conn()
+    return {str(row["id"]): _load_user(conn, row) for row in conn.execute("SELECT * FROM users")}
 
 
 def _write_all(data):
-    """Write user data JSON file."""
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    """Replace every user in `data` (legacy bulk write)."""
+    with _tx() as conn:
+        for uid, user in data.items():
+            _insert_user(conn, int(uid), user)
 
 
 def _read_transactions():
-    """Read transactions JSON file."""
-    if not os.path.exists(DATA_TRANSACTIONS):
-        with open(DATA_TRANSACTIONS, "w") as f:
-            json.dump({}, f, indent=2)
-    with open(DATA_TRANSACTIONS, "r") as f:
-        return json.load(f)
-
-
-def _write_transactions(data):
-    """Write transactions JSON file."""
-    with open(DATA_TRANSACTIONS, "w") as f:
-        json.dump(data, f, indent=2)
+    """All transactions as the legacy {user_id: [txn, ...]} dict."""
+    data = {}
+    for row in _conn().execute("SELECT * FROM transactions ORDER BY id"):
+        data.setdefault(str(row["user_id"]), []).append(
+            {"description": row["description"], "amount": row["amount"], "timestamp": row["timestamp"]}
+        )
+    return data
 
 
 # --- User management ---
 
 def create_user_if_not_exists(user_id: int, name: str = "", referred_by: int = None):
     """Create new user if not exists."""
-    data = _read_all()
-    uid = str(user_id)
-    if uid not in data:
-        data[uid] = {
-            "id": user_id,
-            "name": name,
-            "wallet": 0,
-            "subscriptions": [],
-            "joined_at": datetime.utcnow().isoformat(),
-            "referred_by": referred_by,
-            "referrals": []
-        }
-        _write_all(data)
-    return data[uid]
+    with _tx() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO users (id, name, wallet, joined_at, referred_by) VALUES (?, ?, 0, ?, ?)",
+            (user_id, name, _now(), referred_by),
+        )
+    return get_user(user_id)
 
 
 def get_user(user_id: int):
     """Fetch user data."""
-    data = _read_all()
-    return data.get(str(user_id))
+    conn = _conn()
+    row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+    return _load_user(conn, row) if row else None
 
 
 def save_user_data(user_id: int, user_data: dict):
     """Save/update user data."""
-    data = _read_all()
-    uid = str(user_id)
-    data[uid] = user_data
-    _write_all(data)
+    with _tx() as conn:
+        _insert_user(conn, int(user_id), user_data)
 
 
 def get_wallet_balance(user_id: int) -> int:
     """Return wallet balance."""
-    data = _read_all()
-    uid = str(user_id)
-    return data.get(uid, {}).get("wallet", 0)
+    row = _conn().execute("SELECT wallet FROM users WHERE id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
 
 
 def set_referred_by(user_id: int, referrer_id: int):
     """Set parent referral relationship."""
-    data = _read_all()
-    uid = str(user_id)
-    rid = str(referrer_id)
-    if uid not in data:
-        create_user_if_not_exists(user_id)
-        data = _read_all()
-    if data[uid].get("referred_by"):
-        return False  # already referred
-    data[uid]["referred_by"] = referrer_id
-    if rid in data:
-        data[rid].setdefault("referrals", []).append(user_id)
-    _write_all(data)
+    create_user_if_not_exists(user_id)
+    with _tx() as conn:
+        updated = conn.execute(
+            "UPDATE users SET referred_by = ? WHERE id = ? AND referred_by IS NULL", (referrer_id, user_id)
+        ).rowcount
+        if not updated:
+            return False  # already referred
+        if conn.execute("SELECT 1 FROM users WHERE id = ?", (referrer_id,)).fetchone():
+            conn.execute("INSERT INTO referrals (referrer_id, user_id) VALUES (?, ?)", (referrer_id, user_id))
     return True
 
 
@@ -101,50 +256,42 @@ def set_referred_by(user_id: int, referrer_id: int):
 
 def update_wallet(user_id: int, amount: int):
     """Add money to wallet."""
-    data = _read_all()
-    uid = str(user_id)
-    if uid not in data:
-        create_user_if_not_exists(user_id)
-        data = _read_all()
-    data[uid]["wallet"] = data[uid].get("wallet", 0) + amount
-    _write_all(data)
-    record_transaction(user_id, "Wallet Credit", amount)
-    return data[uid]["wallet"]
+    create_user_if_not_exists(user_id)
+    with _tx() as conn:
+        conn.execute("UPDATE users SET wallet = wallet + ? WHERE id = ?", (amount, user_id))
+        _insert_transaction(conn, user_id, "Wallet Credit", amount)
+        return conn.execute("SELECT wallet FROM users WHERE id = ?", (user_id,)).fetchone()[0]
 
 
 def deduct_wallet(user_id: int, amount: int) -> bool:
     """Deduct money from wallet."""
-    data = _read_all()
-    uid = str(user_id)
-    if uid not in data:
-        return False
-    if data[uid].get("wallet", 0) < amount:
-        return False
-    data[uid]["wallet"] -= amount
-    _write_all(data)
-    record_transaction(user_id, "Wallet Debit", -amount)
+    with _tx() as conn:
+        # Check and debit in one statement: no window for a concurrent overdraw
+        if not conn.execute(
+            "UPDATE users SET wallet = wallet - ? WHERE id = ? AND wallet >= ?", (amount, user_id, amount)
+        ).rowcount:
+            return False
+        _insert_transaction(conn, user_id, "Wallet Debit", -amount)
     return True
 
 
+def _insert_transaction(conn: sqlite3.Connection, user_id, description: str, amount: int):
+    conn.execute(
+        "INSERT INTO transactions (user_id, description, amount, timestamp) VALUES (?, ?, ?, ?)",
+        (int(user_id), description, amount, _now()),
+    )
+
+
 def record_transaction(user_id: int, description: str, amount: int):
     """Record transaction log."""
-    data = _read_transactions()
-    uid = str(user_id)
-    data.setdefault(uid, [])
-    data[uid].append({
-        "description": description,
-        "amount": amount,
-        "timestamp": datetime.utcnow().isoformat()
-    })
-    _write_transactions(data)
+    with _tx() as conn:
+        _insert_transaction(conn, user_id, description, amount)
 
 
 # --- Subscription Management ---
 
 def add_subscription(user_id: int, plan_key: str):
     """Add OTT subscription to user's profile."""
-    data = _read_all()
-    uid = str(user_id)
     if plan_key not in PLANS:
         raise ValueError("Unknown plan key.")
     plan = PLANS[plan_key]
@@ -157,12 +304,13 @@ def add_subscription(user_id: int, plan_key: str):
         "bought_at": now.isoformat(),
         "expires_at": expiry.isoformat()
     }
-    if uid not in data:
-        create_user_if_not_exists(user_id)
-        data = _read_all()
-    data[uid].setdefault("subscriptions", []).append(sub)
-    _write_all(data)
-    record_transaction(user_id, f"Purchased {plan['name']}", -plan["price"])
+    create_user_if_not_exists(user_id)
+    with _tx() as conn:
+        conn.execute(
+            "INSERT INTO subscriptions (user_id, plan_key, name, price, bought_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, plan_key, sub["name"], sub["price"], sub["bought_at"], sub["expires_at"]),
+        )
+        _insert_transaction(conn, user_id, f"Purchased {plan['name']}", -plan["price"])
     return sub
 
 
@@ -172,22 +320,19 @@ def credit_referral_bonus(user_id: int, added_amount: int):
     """
     If user was referred by someone, give 10% to parent.
     """
-    data = _read_all()
-    uid = str(user_id)
-    if uid not in data:
-        return 0
-    referrer_id = data[uid].get("referred_by")
-    if not referrer_id:
+    row = _conn().execute("SELECT referred_by FROM users WHERE id = ?", (user_id,)).fetchone()
+    if not row or not row[0]:
         return 0
 
-    parent_uid = str(referrer_id)
+    referrer_id = row[0]
     bonus = int(added_amount * 0.10)
-    data[parent_uid]["wallet"] = data[parent_uid].get("wallet", 0) + bonus
-    _write_all(data)
+    with _tx() as conn:
+        if not conn.execute("UPDATE users SET wallet = wallet + ? WHERE id = ?", (bonus, referrer_id)).rowcount:
+            return 0
 
-    # Record both logs
-    record_transaction(parent_uid, f"Referral Bonus (from {user_id})", bonus)
-    record_transaction(user_id, f"Referred by {parent_uid}", 0)
+        # Record both logs
+        _insert_transaction(conn, referrer_id, f"Referral Bonus (from {user_id})", bonus)
+        _insert_transaction(conn, user_id, f"Referred by {referrer_id}", 0)
 
     return bonus
 
@@ -196,5 +341,145 @@ def credit_referral_bonus(user_id: int, added_amount: int):
 
 def get_transactions(user_id: int):
     """Return list of transactions for user."""
-    data = _read_transactions()
-    return data.get(str(user_id), [])
+    return [
+        {"description": row["description"], "amount": row["amount"], "timestamp": row["timestamp"]}
+        for row in _conn().execute("SELECT * FROM transactions WHERE user_id = ? ORDER BY id", (user_id,))
+    ]
+
+
+# --- Admin queries (aggregates run in SQLite, nothing is loaded into memory) ---
+
+def get_recent_transactions(limit: int = 10) -> List[Dict]:
+    """Newest transactions across all users (newest first)."""
+    return [
+        {"user_id": row["user_id"], "description": row["description"], "amount": row["amount"],
+         "timestamp": row["timestamp"]}
+        for row in _conn().execute("SELECT * FROM transactions ORDER BY id DESC LIMIT ?", (limit,))
+    ]
+
+
+def iter_user_ids(batch: int = 1000) -> Iterator[int]:
+    """All user IDs, paged by primary key."""
+    last = None
+    conn = _conn()
+    while True:
+        if last is None:
+            rows = conn.execute("SELECT id FROM users ORDER BY id LIMIT ?", (batch,)).fetchall()
+        else:
+            rows = conn.execute("SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?", (last, batch)).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row[0]
+        last = rows[-1][0]
+
+
+def iter_users(after_id: int = 0, batch: int = 1000) -> Iterator[Tuple[int, dict]]:
+    """(user_id, user) for every user with an ID above `after_id`, paged by primary key."""
+    conn = _conn()
+    while True:
+        rows = conn.execute("SELECT * FROM users WHERE id > ? ORDER BY id LIMIT ?", (after_id, batch)).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row["id"], _load_user(conn, row)
+        after_id = rows[-1]["id"]
+
+
+def iter_user_transactions(after_id: int = 0, batch: int = 1000) -> Iterator[Tuple[int, List[Dict]]]:
+    """(user_id, transactions oldest first) per user with an ID above `after_id`, paged by user."""
+    conn = _conn()
+    while True:
+        ids = [r[0] for r in conn.execute(
+            "SELECT DISTINCT user_id FROM transactions WHERE user_id > ? ORDER BY user_id LIMIT ?", (after_id, batch)
+        )]
+        if not ids:
+            return
+        grouped: Dict[int, List[Dict]] = {}
+        for row in conn.execute(
+            "SELECT * FROM transactions WHERE user_id BETWEEN ? AND ? ORDER BY user_id, id", (ids[0], ids[-1])
+        ):
+            grouped.setdefault(row["user_id"], []).append(
+                {"description": row["description"], "amount": row["amount"], "timestamp": row["timestamp"]}
+            )
+        yield from grouped.items()
+        after_id = ids[-1]
+
+
+def get_store_stats() -> Dict[str, int]:
+    """Totals for the admin dashboard."""
+    conn = _conn()
+    users, wallet = conn.execute("SELECT COUNT(*), COALESCE(SUM(wallet), 0) FROM users").fetchone()
+    return {
+        "users": users,
+        "wallet": wallet,
+        "subscriptions": conn.execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0],
+        "referrals": conn.execute("SELECT COUNT(*) FROM referrals").fetchone()[0],
+        "transactions": conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0],
+    }
+
+
+# ============================================
+# BENCHMARK (For Reference)
+# ============================================
+if __name__ == "__main__":
+    import random
+    import sys
+    import tempfile
+    import time
+
+    users = 100_000
+    writes = 5_000
+    module = sys.modules[__name__]
+    tmp = tempfile.mkdtemp()
+
+    print("=" * 60)
+    print(f"Local User Store Benchmark ({users:,} users)")
+    print("=" * 60)
+
+    # Legacy: every write loads and rewrites the whole indented JSON file
+    legacy_path = os.path.join(tmp, "users.json")
+    legacy = {
+        str(i): {"id": i, "name": f"user{i}", "wallet": 100, "subscriptions": [], "joined_at": _now(),
+                 "referred_by": None, "referrals": []}
+        for i in range(1, users + 1)
+    }
+    with open(legacy_path, "w") as f:
+        json.dump(legacy, f, indent=2)
+    legacy_writes = 3
+    start = time.perf_counter()
+    for _ in range(legacy_writes):
+        with open(legacy_path) as f:
+            data = json.load(f)
+        data[str(random.randint(1, users))]["wallet"] += 1
+        with open(legacy_path, "w") as f:
+            json.dump(data, f, indent=2)
+    legacy_rate = legacy_writes / (time.perf_counter() - start)
+    print(f"\nJSON file (legacy)")
+    print(f"  File size    : {os.path.getsize(legacy_path) / 1e6:,.1f} MB")
+    print(f"  Writes/sec   : {legacy_rate:,.2f}")
+
+    # SQLite store, seeded through the one-time importer
+    module.DATA_FILE = legacy_path
+    module.DATA_TRANSACTIONS = os.path.join(tmp, "transactions.json")
+    module.LOCAL_DB_PATH = os.path.join(tmp, "local.db")
+    start = time.perf_counter()
+    _conn()
+    print(f"\nSQLite WAL store")
+    print(f"  Import       : {time.perf_counter() - start:,.1f}s")
+
+    rates = {}
+    for label, op in (
+        ("update_wallet", lambda uid: update_wallet(uid, 1)),
+        ("deduct_wallet", lambda uid: deduct_wallet(uid, 1)),
+        ("add_subscription", lambda uid: add_subscription(uid, "netflix_4k")),
+        ("get_user (read)", get_user),
+    ):
+        start = time.perf_counter()
+        for _ in range(writes):
+            op(random.randint(1, users))
+        rates[label] = writes / (time.perf_counter() - start)
+        print(f"  {label:<17}: {rates[label]:,.0f}/sec")
+
+    print(f"\n  update_wallet vs JSON rewrite: ~{rates['update_wallet'] / legacy_rate:,.0f}x faster")
+    print("=" * 60)
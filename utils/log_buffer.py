@@ -0,0 +1,167 @@
+"""
+BUFFERED LOG WRITER
+====================
+Collects database log rows in memory and writes them as multi-row inserts.
+
+- Callers only append to a deque: no I/O on the request path
+- A background thread flushes when LOG_BUFFER_MAX_ROWS rows are queued or every
+  LOG_BUFFER_FLUSH_INTERVAL seconds, whichever comes first
+- If the database is unreachable (retryable(error) is true), the batch is appended
+  to a local JSONL spill file and replayed on the next successful flush
+- A batch the database rejects is split until the offending rows are isolated;
+  those are logged and dropped, since retrying them can never succeed
+- close() (bot shutdown / interpreter exit) drains everything that is left
+"""
+
+import atexit
+import json
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List
+
+from config.settings import LOG_BUFFER_MAX_ROWS, LOG_BUFFER_FLUSH_INTERVAL, LOG_SPILL_PATH
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Default `retryable`: socket-level failures and timeouts"""
+    return isinstance(error, OSError)
+
+
+class LogBuffer:
+    """
+    Usage:
+        buffer = LogBuffer(insert_rows)   # insert_rows(list_of_dicts) raises on failure
+        buffer.add({"event_type": "...", ...})
+        buffer.close()
+    """
+
+    def __init__(self, writer: Callable[[List[Dict]], None], max_rows: int = LOG_BUFFER_MAX_ROWS,
+                 interval: float = LOG_BUFFER_FLUSH_INTERVAL, spill_path: str = LOG_SPILL_PATH,
+                 retryable: Callable[[Exception], bool] = is_connection_error):
+        self.writer = writer
+        self.retryable = retryable
+        self.max_rows = max_rows
+        self.interval = interval
+        self.spill_path = spill_path
+        self._rows: Deque[Dict] = deque()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.stats: Dict[str, int] = {"written": 0, "spilled": 0, "replayed": 0, "dropped": 0, "flushes": 0}
+
+    # ========== PRODUCERS ==========
+
+    def add(self, row: Dict):
+        """Queue one row (thread-safe, never blocks on the database)"""
+        self._rows.append(row)
+        if self._closed:
+            # Late rows after shutdown started: write through
+            self.flush()
+            return
+        if self._thread is None:
+            self._start()
+        if len(self._rows) >= self.max_rows:
+            self._wake.set()
+
+    def _start(self):
+        with self._flush_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-buffer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    # ========== FLUSHING ==========
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def _drain(self) -> List[Dict]:
+        rows = []
+        while self._rows and len(rows) < self.max_rows:
+            rows.append(self._rows.popleft())
+        return rows
+
+    def flush(self):
+        """Write everything queued so far; spill what cannot reach the database"""
+        with self._flush_lock:
+            while self._rows:
+                batch = self._drain()
+                self.stats["flushes"] += 1
+                unwritten = self._write(batch, "written")
+                if unwritten:
+                    self._spill(unwritten)
+                    continue
+                self._replay_spill()
+
+    def _write(self, rows: List[Dict], stat: str) -> List[Dict]:
+        """
+        Insert `rows` and return the ones left unwritten because the database
+        is unreachable. A rejected batch is bisected: the good halves are
+        written and each row rejected on its own is dropped.
+        """
+        try:
+            self.writer(rows)
+        except Exception as e:
+            if self.retryable(e):
+                print(f"⚠️ [LOG BUFFER] Database unreachable, spilling to {self.spill_path}: {e}")
+                return rows
+            if len(rows) == 1:
+                print(f"❌ [LOG BUFFER] Dropped log row the database rejected: {e} | {rows[0]}")
+                self.stats["dropped"] += 1
+                return []
+            mid = len(rows) // 2
+            unwritten = self._write(rows[:mid], stat)
+            if unwritten:
+                return unwritten + rows[mid:]
+            return self._write(rows[mid:], stat)
+        self.stats[stat] += len(rows)
+        return []
+
+    # ========== SPILL FILE ==========
+
+    def _spill(self, rows: List[Dict]):
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=str) + "\n")
+            self.stats["spilled"] += len(rows)
+        except OSError as e:
+            print(f"❌ [LOG BUFFER] Dropped {len(rows)} log rows, spill file unavailable: {e}")
+
+    def _replay_spill(self):
+        """Database is reachable again: push spilled rows, keep whatever is still unwritten"""
+        replaying = self.spill_path + ".replay"
+        try:
+            # A leftover .replay file means a previous replay was interrupted: finish it first
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replaying)
+            with open(replaying, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [LOG BUFFER] Cannot read spill file: {e}")
+            return
+
+        for start in range(0, len(rows), self.max_rows):
+            unwritten = self._write(rows[start:start + self.max_rows], "replayed")
+            if unwritten:
+                self._spill(unwritten + rows[start + self.max_rows:])
+                break
+        os.remove(replaying)
+
+    # ========== SHUTDOWN ==========
+
+    def close(self):
+        """Stop the flusher and write (or spill) every queued row"""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
@@ -0,0 +1,63 @@
+"""
+LOG PARTITION MAINTENANCE
+==========================
+Keeps the monthly-partitioned logs table ready and bounded.
+
+- Creates the partitions for this month and the next LOG_PARTITIONS_AHEAD months,
+  so inserts never fall into the default partition
+- Drops partitions older than LOG_RETENTION_MONTHS: a DROP TABLE per month,
+  constant time however many rows it held
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from config.settings import LOG_RETENTION_MONTHS, LOG_PARTITIONS_AHEAD, LOG_MAINTENANCE_INTERVAL
+from utils.supabase_db import ensure_log_partitions, drop_old_log_partitions
+
+log = logging.getLogger(__name__)
+
+
+class LogRetentionJob:
+    """
+    Usage:
+        job = LogRetentionJob()
+        job.start()          # inside the running loop (on_startup)
+        await job.stop()     # on_shutdown
+    """
+
+    def __init__(self, keep_months: int = LOG_RETENTION_MONTHS, months_ahead: int = LOG_PARTITIONS_AHEAD,
+                 interval: float = LOG_MAINTENANCE_INTERVAL):
+        self.keep_months = keep_months
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        loop = asyncio.get_running_loop()
+        created = await loop.run_in_executor(None, ensure_log_partitions, self.months_ahead)
+        dropped = await loop.run_in_executor(None, drop_old_log_partitions, self.keep_months)
+        if created or dropped:
+            log.info(f"🗂️ Log partitions: {created} created, dropped {', '.join(dropped) or 'none'}")
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"⚠️ [LOG RETENTION] Maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,84 @@
+"""
+RATE-LIMITED SENDER
+====================
+Paced bot-initiated messages (reminders, notices) that stay under Telegram's limits.
+
+- Global pacing: at most SENDER_RATE messages per second across all chats
+- Per-chat pacing: at least SENDER_CHAT_INTERVAL seconds between messages to one chat
+- RetryAfter (429) pauses the whole sender for the requested time, then retries
+- Users who blocked the bot / deleted their account are counted, not retried
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.utils.exceptions import BotBlocked, ChatNotFound, RetryAfter, TelegramAPIError, UserDeactivated
+
+from config.settings import SENDER_RATE, SENDER_CHAT_INTERVAL, SENDER_MAX_RETRIES
+
+log = logging.getLogger(__name__)
+
+
+class RateLimitedSender:
+    """
+    Sends messages one at a time at a bounded rate.
+
+    Usage:
+        sender = RateLimitedSender(bot)
+        ok = await sender.send_message(chat_id, text, parse_mode="HTML")
+    """
+
+    def __init__(self, bot: Bot, rate: float = SENDER_RATE, chat_interval: float = SENDER_CHAT_INTERVAL,
+                 max_retries: int = SENDER_MAX_RETRIES):
+        self.bot = bot
+        self.interval = 1.0 / rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+        self._last_sent: Dict[int, float] = {}
+        self.stats: Dict[str, int] = {"sent": 0, "blocked": 0, "failed": 0, "flood_waits": 0}
+
+    async def _wait_turn(self, chat_id: int):
+        async with self._lock:
+            now = time.monotonic()
+            ready = max(self._next_slot, self._last_sent.get(chat_id, 0.0) + self.chat_interval)
+            if ready > now:
+                await asyncio.sleep(ready - now)
+                now = ready
+            self._next_slot = now + self.interval
+            self._last_sent[chat_id] = now
+
+    async def _flood_wait(self, seconds: float):
+        # Push every queued send back, not just this one
+        async with self._lock:
+            self.stats["flood_waits"] += 1
+            log.warning(f"⏳ Flood wait {seconds}s")
+            await asyncio.sleep(seconds)
+            self._next_slot = time.monotonic()
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Send `text` to `chat_id`; returns False if it could not be delivered"""
+        for _ in range(self.max_retries + 1):
+            await self._wait_turn(chat_id)
+            try:
+                await self.bot.send_message(chat_id, text, **kwargs)
+                self.stats["sent"] += 1
+                return True
+            except RetryAfter as e:
+                await self._flood_wait(e.timeout)
+            except (BotBlocked, ChatNotFound, UserDeactivated):
+                self.stats["blocked"] += 1
+                return False
+            except TelegramAPIError as e:
+                log.warning(f"⚠️ Send to {chat_id} failed: {e}")
+                break
+        self.stats["failed"] += 1
+        return False
+
+    def forget_chats(self):
+        """Drop per-chat pacing state (call between runs to keep memory flat)"""
+        self._last_sent.clear()
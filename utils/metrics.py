@@ -0,0 +1,315 @@
+"""
+METRICS
+========
+In-process metrics exposed in Prometheus text format on a local HTTP port.
+
+- Handler latency / errors (MetricsMiddleware)
+- Data-layer function latency / errors (see utils/db_instrumentation.py)
+- Telegram Bot API calls, latency and 429s (instrument_telegram)
+- Event-loop lag, cache hits/misses, payment verification outcomes
+
+Scrape http://METRICS_HOST:METRICS_PORT/metrics. Ratios (cache hit ratio,
+429 rate) are derived from the counters in PromQL.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.utils.exceptions import RetryAfter
+
+from config.settings import METRICS_HOST, METRICS_PORT, LOOP_LAG_INTERVAL
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# =====================================================
+# METRIC TYPES
+# =====================================================
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        yield from super().render()
+        for key, value in self._values.items():
+            yield f"{self.name}{self._labels(key)} {value}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def render(self):
+        yield from super().render()
+        for key, value in self._values.items():
+            yield f"{self.name}{self._labels(key)} {value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        row = self._values.get(key)
+        if row is None:
+            row = self._values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        else:
+            row[len(self.buckets)] += 1
+        row[-1] += value
+
+    def render(self):
+        yield from super().render()
+        for key, row in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{self._labels(key, le)} {cumulative}"
+            cumulative += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{self._labels(key, le)} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {row[-1]}"
+            yield f"{self.name}_count{self._labels(key)} {cumulative}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+_registry = []
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =====================================================
+# BOT METRICS
+# =====================================================
+
+HANDLER_SECONDS = Histogram("bot_handler_duration_seconds", "Handler execution time", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised", ("handler",))
+
+DB_SECONDS = Histogram("db_function_duration_seconds", "utils.supabase_db function time", ("function",))
+DB_ERRORS = Counter("db_function_errors_total", "Failed Supabase queries per data-layer function", ("function",))
+
+TELEGRAM_REQUESTS = Counter("telegram_api_requests_total", "Bot API calls by result (ok, error, 429)",
+                            ("method", "result"))
+TELEGRAM_SECONDS = Histogram("telegram_api_duration_seconds", "Bot API call time", ("method",))
+
+LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event-loop scheduling delay")
+LOOP_LAG_SECONDS = Histogram("event_loop_lag_observed_seconds", "Event-loop scheduling delay samples",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result (hit, miss)", ("cache", "result"))
+
+PAYMENT_VERIFICATIONS = Counter("payment_verifications_total", "Payment verification outcomes",
+                                ("gateway", "outcome"))
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# =====================================================
+# HANDLER MIDDLEWARE
+# =====================================================
+
+_START_KEY = "_metrics_start"
+_HANDLER_KEY = "_metrics_handler"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Times every message / callback handler.
+
+    Callbacks are labelled with the CallbackRouter route that ran, not the router itself.
+
+    Usage:
+        dp.middleware.setup(MetricsMiddleware())
+    """
+
+    def _start(self, data: dict):
+        handler = current_handler.get(None)
+        data[_HANDLER_KEY] = getattr(handler, "__name__", "unknown")
+        data[_START_KEY] = time.perf_counter()
+
+    def _finish(self, data: dict):
+        start = data.pop(_START_KEY, None)
+        if start is None:
+            return
+        name = data.pop("callback_route", None) or data.pop(_HANDLER_KEY)
+        HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name)
+        # post_process runs in a finally block, so a propagating handler error is visible here
+        if sys.exc_info()[0] is not None:
+            HANDLER_ERRORS.inc(handler=name)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message: types.Message, results, data: dict):
+        self._finish(data)
+
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, callback_query: types.CallbackQuery, results, data: dict):
+        self._finish(data)
+
+
+# =====================================================
+# TELEGRAM API
+# =====================================================
+
+def instrument_telegram():
+    """
+    Count and time every Bot API request.
+
+    Hooks aiogram's shared request function, so ad-hoc Bot(token=...) instances
+    (force_subscribe, log_utils) are covered too. Safe to call more than once.
+    """
+    from aiogram.bot import api
+
+    if getattr(api.make_request, "_instrumented", False):
+        return
+    make_request = api.make_request
+
+    async def timed_make_request(session, server, token, method, data=None, files=None, **kwargs):
+        start = time.perf_counter()
+        result = "ok"
+        try:
+            return await make_request(session, server, token, method, data, files, **kwargs)
+        except RetryAfter:
+            result = "429"
+            raise
+        except Exception:
+            result = "error"
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, method=method)
+            TELEGRAM_REQUESTS.inc(method=method, result=result)
+
+    timed_make_request._instrumented = True
+    api.make_request = timed_make_request
+
+
+# =====================================================
+# EVENT LOOP LAG
+# =====================================================
+
+async def _probe_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_SECONDS.observe(lag)
+
+
+# =====================================================
+# HTTP ENDPOINT
+# =====================================================
+
+async def _metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[web.AppRunner]:
+    """
+    Serve /metrics and start the event-loop lag probe in the running loop.
+
+    Returns the AppRunner (call .cleanup() on shutdown), or None if disabled.
+    """
+    if not port:
+        return None
+
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics)
+    lag_task = None
+
+    async def _start_probe(_app):
+        nonlocal lag_task
+        lag_task = asyncio.create_task(_probe_loop_lag(LOOP_LAG_INTERVAL))
+
+    async def _stop_probe(_app):
+        if lag_task:
+            lag_task.cancel()
+
+    app.on_startup.append(_start_probe)
+    app.on_cleanup.append(_stop_probe)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"⚠️ Metrics server disabled, cannot bind {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    log.info(f"📊 Metrics on http://{host}:{port}/metrics")
+    return runner
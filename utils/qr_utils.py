@@ -0,0 +1,186 @@
+"""
+QR RENDERING UTILITIES
+=======================
+Renders UPI payment QR codes off the event loop.
+
+- Rendering runs in a worker pool (threads by default, processes optional)
+- In-flight renders are bounded so a burst of top-ups can't pile up
+- Output is a compact 1-bit PNG at a tuned module size
+- Repeated requests for the same payload reuse the cached PNG
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_M
+
+from config.settings import (
+    QR_BOX_SIZE,
+    QR_BORDER,
+    QR_POOL_KIND,
+    QR_WORKERS,
+    QR_MAX_PENDING,
+    QR_CACHE_SIZE,
+)
+from utils.metrics import cache_lookup
+
+_executor: Optional[Executor] = None
+_pending: Optional[asyncio.Semaphore] = None
+
+# payload -> PNG bytes (LRU)
+_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+
+# =====================================================
+# RENDERING (runs inside the worker pool)
+# =====================================================
+
+def render_qr_png(data: str, box_size: int = QR_BOX_SIZE, border: int = QR_BORDER) -> bytes:
+    """
+    Render a QR code as a 1-bit palette PNG.
+
+    Args:
+        data: Payload to encode (UPI URI)
+        box_size: Pixels per QR module
+        border: Quiet zone width in modules
+
+    Returns:
+        PNG file contents
+    """
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    # Mode "1" image -> 1-bit PNG; optimize squeezes the zlib stream further
+    img = qr.make_image(fill_color="black", back_color="white").get_image().convert("1")
+    bio = BytesIO()
+    img.save(bio, "PNG", optimize=True)
+    return bio.getvalue()
+
+
+# =====================================================
+# POOL MANAGEMENT
+# =====================================================
+
+def _get_executor() -> Executor:
+    """Lazily create the shared render pool"""
+    global _executor
+    if _executor is None:
+        if QR_POOL_KIND == "process":
+            _executor = ProcessPoolExecutor(max_workers=QR_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=QR_WORKERS, thread_name_prefix="qr")
+    return _executor
+
+
+def _get_pending() -> asyncio.Semaphore:
+    """Lazily create the in-flight limiter (must be built inside the running loop)"""
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(QR_MAX_PENDING)
+    return _pending
+
+
+def shutdown_qr_pool():
+    """Stop the render pool (call on bot shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+# =====================================================
+# PUBLIC API
+# =====================================================
+
+def _cache_get(data: str) -> Optional[bytes]:
+    png = _cache.get(data)
+    if png is not None:
+        _cache.move_to_end(data)
+    return png
+
+
+def _cache_put(data: str, png: bytes):
+    _cache[data] = png
+    _cache.move_to_end(data)
+    while len(_cache) > QR_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def render_qr(data: str) -> BytesIO:
+    """
+    Render a payment QR without blocking the event loop.
+
+    Args:
+        data: Payload to encode (UPI URI); also the cache key, since order IDs
+              only have one-second resolution and can repeat with another amount
+
+    Returns:
+        Fresh BytesIO named "payment_qr.png", ready for InputFile
+    """
+    png = _cache_get(data)
+    cache_lookup("payment_qr", png is not None)
+    if png is None:
+        async with _get_pending():
+            # Another waiter may have rendered it while we queued
+            png = _cache_get(data)
+            if png is None:
+                loop = asyncio.get_running_loop()
+                png = await loop.run_in_executor(_get_executor(), render_qr_png, data)
+                _cache_put(data, png)
+
+    bio = BytesIO(png)
+    bio.name = "payment_qr.png"
+    return bio
+
+
+# ============================================
+# BENCHMARK (For Reference)
+# ============================================
+if __name__ == "__main__":
+    upi = (
+        "upi://pay?pa=paytm.s20gimo@pty&pn=OTTOnly Wallet"
+        "&tr=M-7127370646-20260101120000&tn=M-7127370646-20260101120000"
+        "&am=500&cu=INR"
+    )
+    runs = 200
+
+    def _legacy():
+        img = qrcode.make(upi)
+        bio = BytesIO()
+        img.save(bio, "PNG")
+        return bio.getvalue()
+
+    print("=" * 60)
+    print("QR Render Benchmark")
+    print("=" * 60)
+
+    for label, fn in (("qrcode.make (legacy)", _legacy), ("render_qr_png", lambda: render_qr_png(upi))):
+        start = time.perf_counter()
+        for _ in range(runs):
+            png = fn()
+        elapsed = time.perf_counter() - start
+        print(f"\n{label}")
+        print(f"  Renders/sec : {runs / elapsed:,.1f}")
+        print(f"  Bytes/image : {len(png):,}")
+
+    async def _pooled():
+        payloads = [upi.replace("&am=500", f"&am={i}") for i in range(runs)]
+        start = time.perf_counter()
+        await asyncio.gather(*(render_qr(p) for p in payloads))
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        await asyncio.gather(*(render_qr(p) for p in payloads[-QR_CACHE_SIZE:]))
+        warm = time.perf_counter() - start
+        print(f"\nrender_qr ({QR_POOL_KIND} pool, {QR_WORKERS} workers)")
+        print(f"  Renders/sec (cold) : {runs / cold:,.1f}")
+        print(f"  Renders/sec (cache): {min(runs, QR_CACHE_SIZE) / warm:,.1f}")
+
+    asyncio.run(_pooled())
+    shutdown_qr_pool()
+    print("\n" + "=" * 60)
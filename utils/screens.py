@@ -0,0 +1,268 @@
+"""
+PRECOMPILED SCREENS
+====================
+Message texts and inline keyboards for the bot's menus.
+
+- Static screens (text + InlineKeyboardMarkup) are built once at import time
+  and shared by every handler call
+- Dynamic screens are SmallCapsTemplates: literals are pre-converted, only the
+  variable slots are converted per render
+"""
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from config.settings import PLANS, FORCE_SUBSCRIBE_CHANNEL_LINK
+from utils.text_utils import toSmallCaps, SmallCapsTemplate
+
+
+def _keyboard(row_width: int, *buttons, rows=()) -> InlineKeyboardMarkup:
+    """Build a keyboard from (label, kwargs) pairs; labels are converted to small caps"""
+    kb = InlineKeyboardMarkup(row_width=row_width)
+    if buttons:
+        kb.add(*(InlineKeyboardButton(toSmallCaps(label), **kw) for label, kw in buttons))
+    for row in rows:
+        kb.add(*(InlineKeyboardButton(toSmallCaps(label), **kw) for label, kw in row))
+    return kb
+
+
+# =====================================================
+# FORCE SUBSCRIBE
+# =====================================================
+
+FORCE_SUBSCRIBE_TEXT = (
+    "👋 Hi, I am OTTSONLY Bot\n\n"
+    "Here you can get YouTube Premium at just ₹25.\n\n"
+    "👉 Join our official channel to access this store."
+)
+
+# Plain-text buttons (not small caps) to match the channel gate's style
+FORCE_SUBSCRIBE_KB = InlineKeyboardMarkup(row_width=1).add(
+    InlineKeyboardButton("📢 JOIN CHANNEL", url=FORCE_SUBSCRIBE_CHANNEL_LINK),
+    InlineKeyboardButton("✅ VERIFY", callback_data="verify_subscription"),
+)
+
+
+# =====================================================
+# MAIN MENU
+# =====================================================
+
+WELCOME_TEMPLATE = SmallCapsTemplate(
+    "<b>Welcome to ottsonly, {name}\n"
+    "🚀 OTT SUBSCRIPTIONS AT BEST PRICES\n"
+    "Netflix • Prime • YouTube • Spotify & more\n\n"
+    "⚡ Instant access\n"
+    "🔒 100% trusted\n"
+    "💎 Premium quality</b>"
+)
+
+_TUTORIAL_URL = "https://t.me/+yEMiVMf-mkBmOWE1"
+_SUPPORT_URL = "https://t.me/ottsonly1"
+
+MAIN_MENU_KB = _keyboard(
+    2,
+    ("💳 Add Funds", {"callback_data": "menu_add_funds"}),
+    ("🎬 Buy OTTs", {"callback_data": "menu_buy_otts"}),
+    ("🎁 Refer & Earn", {"callback_data": "menu_refer"}),
+    ("👤 Profile", {"callback_data": "menu_profile"}),
+    ("📚 Tutorial", {"url": _TUTORIAL_URL}),
+    ("💬 Support", {"url": _SUPPORT_URL}),
+)
+
+BACK_TO_MAIN_TEXT = toSmallCaps("<b>🏠 Main Menu — Choose An Option Below:</b>")
+
+BACK_TO_MAIN_KB = _keyboard(
+    2,
+    ("💳 Add Funds", {"callback_data": "menu_add_funds"}),
+    ("🎬 Buy OTT Subscriptions", {"callback_data": "menu_buy_otts"}),
+    ("🎁 Refer & Earn", {"callback_data": "menu_refer"}),
+    ("👤 Profile", {"callback_data": "menu_profile"}),
+    ("📚 Tutorial", {"url": _TUTORIAL_URL}),
+    ("💬 Support", {"url": _SUPPORT_URL}),
+)
+
+# Variant shown by the OTT handler's back_to_main (clears FSM state)
+OTT_BACK_TO_MAIN_TEXT = toSmallCaps("<b>🏠 Main Menu - Choose An Option Below:</b>")
+
+OTT_BACK_TO_MAIN_KB = _keyboard(
+    1,
+    ("💳 Add Funds", {"callback_data": "add_funds"}),
+    ("🎬 Buy OTT Subscriptions", {"callback_data": "menu_buy_otts"}),
+    ("🎁 Refer & Earn", {"callback_data": "refer"}),
+    ("⚙️ Settings", {"callback_data": "menu_settings"}),
+)
+
+
+# =====================================================
+# WALLET
+# =====================================================
+
+ADD_FUNDS_TEXT = toSmallCaps("<b>💰 Add Funds To Your Wallet\n\nClick Below To Enter Any Amount You Want:</b>")
+
+ADD_FUNDS_KB = _keyboard(
+    1,
+    rows=(
+        (("✏️ Enter Custom Amount", {"callback_data": "addfunds_custom"}),),
+        (("⬅️ Back", {"callback_data": "back_to_main"}),),
+    ),
+)
+
+PAYMENT_QR_TEMPLATE = SmallCapsTemplate(
+    "<b>💳 Payment QR Code Generated!\n\n"
+    "💰 Amount: ₹{amount}\n"
+    "🆔 Order ID: {order_id}\n\n"
+    "📱 Scan QR Code To Pay\n"
+    "Or Click 'Check Status' After Payment.</b>"
+)
+
+
+# =====================================================
+# OTT STORE
+# =====================================================
+
+BUY_OTTS_TEXT = toSmallCaps("<b>🎬 Choose Your OTT Platform:</b>")
+
+BUY_OTTS_KB = _keyboard(
+    1,
+    ("📺 Netflix 4K", {"callback_data": "plan_netflix"}),
+    ("🎬 Prime Video", {"callback_data": "plan_prime"}),
+    ("🎵 YouTube Premium", {"callback_data": "plan_youtube"}),
+    ("🔥 Pornhub Premium", {"callback_data": "plan_pornhub"}),
+    ("🎁 Combo Pack", {"callback_data": "plan_combo"}),
+    ("⬅️ Back", {"callback_data": "back_to_main"}),
+)
+
+
+def _plan_screen(plan_key: str, body: str):
+    """Pre-render a plan detail page (price comes from config, so it is static)"""
+    text = toSmallCaps(f"<b>{body}💳 PRICE: ₹{PLANS[plan_key]['price']}</b>")
+    kb = _keyboard(
+        1,
+        rows=(
+            (("💰 Buy Now", {"callback_data": f"buy:{plan_key}"}),),
+            (("⬅️ Back", {"callback_data": "menu_buy_otts"}),),
+        ),
+    )
+    return text, kb
+
+
+# callback_data -> (text, keyboard)
+PLAN_SCREENS = {
+    "plan_netflix": _plan_screen(
+        "netflix_4k",
+        "📺 NETFLIX PREMIUM 4K\n\n"
+        "• Private Screen\n"
+        "• TV/Laptop Supported\n"
+        "• 4K + HDR\n"
+        "• Price : 75₹ / Month\n\n"
+        "🕒 Validity: 1 Month\n",
+    ),
+    "plan_prime": _plan_screen(
+        "prime_video",
+        "🎬 PRIME VIDEO\n\n"
+        "• Private Single Screen\n"
+        "• HD 1080p\n"
+        "• No ads\n"
+        "• Price : 35₹/Month\n\n"
+        "🕒 Validity: 1 Month\n",
+    ),
+    "plan_youtube": _plan_screen(
+        "youtube",
+        "▶️ YOUTUBE PREMIUM\n\n"
+        "• No Ads\n"
+        "• Background Play\n"
+        "• YouTube Music\n"
+        "• On your mail\n"
+        "• Price 25₹/ Month\n\n"
+        "🕒 Validity: 1 Month\n",
+    ),
+    "plan_pornhub": _plan_screen(
+        "pornhub",
+        "🔥 PORNHUB PREMIUM\n\n"
+        "✅ Private Single Screen\n"
+        "💎 Max Quality (1080p/4K)\n"
+        "💻 TV / PC / Mobile Supported\n"
+        "🕒 Validity: 1 Month\n",
+    ),
+    "plan_combo": _plan_screen(
+        "combo",
+        "🎁 OTT COMBO PACK\n\n"
+        "📺 NETFLIX PREMIUM 4K\n"
+        "• Private Screen\n"
+        "• TV/Laptop Supported\n"
+        "• 4K + HDR\n"
+        "• Price: 75₹ / Month\n\n"
+        "🎬 PRIME VIDEO\n"
+        "• Private Single Screen\n"
+        "• HD 1080p\n"
+        "• No ads\n"
+        "• Price: 35₹/Month\n\n"
+        "▶️ YOUTUBE PREMIUM\n"
+        "• No Ads\n"
+        "• Background Play\n"
+        "• YouTube Music\n"
+        "• On your mail\n"
+        "• Price: 25₹/ Month\n\n"
+        "+\n\n"
+        "🔞 FREE: PORNHUB PREMIUM\n"
+        "• Full Access\n"
+        "• HD Quality (free with combo)\n\n"
+        "🕒 Validity: 1 Month\n",
+    ),
+}
+
+
+# =====================================================
+# SUBSCRIPTION EXPIRY
+# =====================================================
+
+RENEWAL_REMINDER_TEMPLATE = SmallCapsTemplate(
+    "<b>⏰ Subscription Ending Soon\n"
+    "━━━━━━━━━━━━━━\n\n"
+    "📦 Plan: {plan}\n"
+    "📅 Ends: {ends}\n\n"
+    "Renew Now To Keep Watching Without Interruption.</b>"
+)
+
+SUBSCRIPTION_EXPIRED_TEMPLATE = SmallCapsTemplate(
+    "<b>⌛ Subscription Expired\n"
+    "━━━━━━━━━━━━━━\n\n"
+    "📦 Plan: {plan}\n\n"
+    "Your Access Has Ended. Renew Anytime From The Button Below.</b>"
+)
+
+_PLAN_SCREEN_FOR = {
+    "netflix_4k": "plan_netflix",
+    "prime_video": "plan_prime",
+    "youtube": "plan_youtube",
+    "pornhub": "plan_pornhub",
+    "combo": "plan_combo",
+}
+
+# plan_key -> "Renew" keyboard opening that plan's screen
+RENEW_KBS = {
+    plan_key: _keyboard(1, ("🔁 Renew Now", {"callback_data": screen}))
+    for plan_key, screen in _PLAN_SCREEN_FOR.items()
+}
+
+
+# =====================================================
+# ADMIN
+# =====================================================
+
+ADMIN_SUBS_TEXT = toSmallCaps(
+    "<b>📦 SUBSCRIPTION MANAGEMENT\n"
+    "━━━━━━━━━━━━━━\n\n"
+    "Select OTT Platform To Manage:</b>"
+)
+
+ADMIN_SUBS_KB = _keyboard(
+    2,
+    ("🎵 YouTube", {"callback_data": "admin_ott_youtube"}),
+    ("🎬 Prime Video", {"callback_data": "admin_ott_prime_video"}),
+    ("📺 Netflix", {"callback_data": "admin_ott_netflix_4k"}),
+    ("📦 Combo", {"callback_data": "admin_ott_combo"}),
+    ("🔞 Pornhub", {"callback_data": "admin_ott_pornhub"}),
+    rows=(
+        (("♻️ Reclaimed Credentials", {"callback_data": "admin_reclaims"}),),
+        (("🔙 Back to Admin", {"callback_data": "admin_back"}),),
+    ),
+)
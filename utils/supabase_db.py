@@ -8,10 +8,14 @@ This module provides clean, reusable functions for all database operations.
 """
 
 import os
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple
+import httpx
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from utils.db_instrumentation import InstrumentedClient, instrument_functions
+from utils.log_buffer import LogBuffer
 
 # Load environment variables
 load_dotenv()
@@ -23,7 +27,7 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("❌ Missing Supabase credentials. Check your .env file.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = InstrumentedClient(create_client(SUPABASE_URL, SUPABASE_KEY))
 
 
 # =====================================================
@@ -604,6 +608,14 @@ def add_credentials(plan_key: str, credentials_list: list) -> dict:
         }
 
 
+# Rows leased to a bot instance's hot pool (see utils/credential_pool.py) are skipped until the lease lapses
+_NOT_LEASED = "leased_by.is.null,lease_expires_at.lt.{now}"
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
 def get_unused_credential(plan_key: str) -> Optional[str]:
     """
     Get an unused credential for a plan.
@@ -615,7 +627,8 @@ def get_unused_credential(plan_key: str) -> Optional[str]:
         Credential string or None if no stock
     """
     try:
-        response = supabase.table("stocks").select("*").eq("plan_key", plan_key).eq("is_used", False).limit(1).execute()
+        response = supabase.table("stocks").select("*").eq("plan_key", plan_key).eq("is_used", False)\
+            .or_(_NOT_LEASED.format(now=_utc_now())).limit(1).execute()
         
         if response.data:
             return response.data[0].get("credential")
@@ -641,7 +654,8 @@ def mark_credential_used(plan_key: str, credential: str, telegram_id: int) -> bo
     """
     try:
         # First, get ONE unused credential ID that matches
-        response = supabase.table("stocks").select("id").eq("plan_key", plan_key).eq("credential", credential).eq("is_used", False).limit(1).execute()
+        response = supabase.table("stocks").select("id").eq("plan_key", plan_key).eq("credential", credential).eq("is_used", False)\
+            .or_(_NOT_LEASED.format(now=_utc_now())).limit(1).execute()
         
         if not response.data:
             print(f"⚠️ No unused credential found for {plan_key}: {credential}")
@@ -683,6 +697,78 @@ def get_stock_count(plan_key: str) -> int:
         return 0
 
 
+def lease_stock(plan_key: str, instance_id: str, count: int, ttl_seconds: int) -> List[Dict]:
+    """
+    Atomically lease unused credentials to one bot instance.
+    
+    Args:
+        plan_key: Plan identifier
+        instance_id: Leasing process (host:pid)
+        count: Max rows to lease
+        ttl_seconds: Lease lifetime; expired leases return to stock automatically
+        
+    Returns:
+        Leased stock rows (id, credential, lease_expires_at, ...)
+    """
+    try:
+        response = supabase.rpc("lease_stock", {
+            "p_plan_key": plan_key,
+            "p_instance": instance_id,
+            "p_count": count,
+            "p_ttl_seconds": ttl_seconds
+        }).execute()
+        return response.data or []
+    except Exception as e:
+        print(f"❌ Error leasing stock for {plan_key}: {e}")
+        return []
+
+
+def claim_leased_credential(stock_id: int, instance_id: str, telegram_id: int) -> bool:
+    """
+    Mark a leased credential as used in a single round-trip.
+    
+    Args:
+        stock_id: Leased stock row ID
+        instance_id: Instance holding the lease
+        telegram_id: User who bought it
+        
+    Returns:
+        True if delivered, False if the lease had lapsed and the row was taken
+    """
+    try:
+        response = supabase.rpc("claim_leased_stock", {
+            "p_id": stock_id,
+            "p_instance": instance_id,
+            "p_telegram_id": telegram_id
+        }).execute()
+        return bool(response.data)
+    except Exception as e:
+        print(f"❌ Error claiming leased credential {stock_id}: {e}")
+        return False
+
+
+def release_stock_leases(instance_id: str, stock_ids: Optional[List[int]] = None) -> int:
+    """
+    Return undelivered leases to stock.
+    
+    Args:
+        instance_id: Instance holding the leases
+        stock_ids: Specific rows, or None for all of the instance's leases
+        
+    Returns:
+        Number of rows released
+    """
+    try:
+        response = supabase.rpc("release_stock_leases", {
+            "p_instance": instance_id,
+            "p_ids": stock_ids
+        }).execute()
+        return response.data or 0
+    except Exception as e:
+        print(f"❌ Error releasing stock leases: {e}")
+        return 0
+
+
 def delete_stock(stock_id: int) -> bool:
     """
     Delete a stock item by ID.
@@ -723,7 +809,7 @@ def add_subscription(telegram_id: int, plan_key: str, credential: str = None) ->
             "plan_key": plan_key,
             "credential": credential,
             "status": "active",
-            "expires_at": (datetime.now() + timedelta(days=30)).isoformat()
+            "expires_at": (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
         }
         
         supabase.table("subscriptions").insert(sub_data).execute()
@@ -752,6 +838,180 @@ def get_user_subscriptions(telegram_id: int) -> List[Dict]:
         return []
 
 
+def get_active_subscriptions_due(until: str, after: Optional[Tuple[str, int]] = None, limit: int = 500,
+                                 unreminded: bool = False) -> List[Dict]:
+    """
+    One keyset page of active subscriptions expiring at or before `until`.
+    
+    Args:
+        until: ISO timestamp upper bound for expires_at
+        after: (expires_at, id) of the last row of the previous page
+        limit: Page size
+        unreminded: Only rows that have not been sent a renewal reminder
+        
+    Returns:
+        Rows (id, telegram_id, plan_key, credential, expires_at) ordered by (expires_at, id)
+    """
+    try:
+        query = supabase.table("subscriptions").select("id, telegram_id, plan_key, credential, expires_at") \
+            .eq("status", "active").lte("expires_at", until)
+        if unreminded:
+            query = query.is_("reminded_at", "null")
+        if after:
+            expires_at, last_id = after
+            query = query.or_(f"expires_at.gt.{expires_at},and(expires_at.eq.{expires_at},id.gt.{last_id})")
+        response = query.order("expires_at").order("id").limit(limit).execute()
+        return response.data or []
+    except Exception as e:
+        print(f"❌ Error getting due subscriptions: {e}")
+        return []
+
+
+def expire_subscriptions(subscription_ids: List[int]) -> List[Dict]:
+    """
+    Mark a batch of subscriptions expired in one statement.
+    
+    Args:
+        subscription_ids: Subscription row IDs
+        
+    Returns:
+        Rows that were still active and are now expired
+    """
+    if not subscription_ids:
+        return []
+    try:
+        response = supabase.table("subscriptions").update({"status": "expired"}) \
+            .in_("id", subscription_ids).eq("status", "active").execute()
+        return response.data or []
+    except Exception as e:
+        print(f"❌ Error expiring subscriptions: {e}")
+        return []
+
+
+def mark_subscriptions_reminded(subscription_ids: List[int]) -> bool:
+    """
+    Record that renewal reminders went out for a batch of subscriptions.
+    
+    Args:
+        subscription_ids: Subscription row IDs
+        
+    Returns:
+        True if successful
+    """
+    if not subscription_ids:
+        return True
+    try:
+        supabase.table("subscriptions").update({"reminded_at": _utc_now()}) \
+            .in_("id", subscription_ids).execute()
+        return True
+    except Exception as e:
+        print(f"❌ Error marking subscriptions reminded: {e}")
+        return False
+
+
+# =====================================================
+# CREDENTIAL RECLAIMS
+# =====================================================
+
+def queue_credential_reclaims(subscription_ids: List[int]) -> int:
+    """
+    Queue the stock rows behind expired subscriptions for admin review.
+    
+    Args:
+        subscription_ids: Subscription row IDs that just expired
+        
+    Returns:
+        Number of stock rows queued
+    """
+    if not subscription_ids:
+        return 0
+    try:
+        response = supabase.rpc("queue_credential_reclaims", {"p_subscription_ids": subscription_ids}).execute()
+        return response.data or 0
+    except Exception as e:
+        print(f"❌ Error queueing credential reclaims: {e}")
+        return 0
+
+
+def get_pending_reclaims(limit: int = 10, after_id: int = 0) -> List[Dict]:
+    """
+    One page of credentials awaiting review, oldest first.
+    
+    Args:
+        limit: Page size
+        after_id: Last reclaim ID of the previous page
+        
+    Returns:
+        Reclaim rows (id, stock_id, plan_key, previous_credential, created_at)
+    """
+    try:
+        response = supabase.table("credential_reclaims") \
+            .select("id, stock_id, plan_key, previous_credential, created_at") \
+            .eq("status", "pending").gt("id", after_id).order("id").limit(limit).execute()
+        return response.data or []
+    except Exception as e:
+        print(f"❌ Error getting pending reclaims: {e}")
+        return []
+
+
+def count_pending_reclaims() -> int:
+    """Number of credentials awaiting review"""
+    try:
+        response = supabase.table("credential_reclaims").select("id", count="exact") \
+            .eq("status", "pending").limit(1).execute()
+        return response.count or 0
+    except Exception as e:
+        print(f"❌ Error counting pending reclaims: {e}")
+        return 0
+
+
+def approve_credential_reclaim(reclaim_id: int, admin_id: int, credential: str = None) -> Optional[Dict]:
+    """
+    Return a reclaimed stock row to the unused pool.
+    
+    Args:
+        reclaim_id: Reclaim row ID
+        admin_id: Reviewing admin
+        credential: Rotated credential (None keeps the previous one)
+        
+    Returns:
+        The released stock row, or None if it was already reviewed
+    """
+    try:
+        response = supabase.rpc("approve_credential_reclaim", {
+            "p_id": reclaim_id,
+            "p_credential": credential,
+            "p_admin": admin_id
+        }).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        print(f"❌ Error approving reclaim {reclaim_id}: {e}")
+        return None
+
+
+def retire_credential_reclaim(reclaim_id: int, admin_id: int) -> bool:
+    """
+    Close a review without reselling the credential (stock row stays used).
+    
+    Args:
+        reclaim_id: Reclaim row ID
+        admin_id: Reviewing admin
+        
+    Returns:
+        True if the review was still open
+    """
+    try:
+        response = supabase.table("credential_reclaims").update({
+            "status": "retired",
+            "reviewed_at": _utc_now(),
+            "reviewed_by": admin_id
+        }).eq("id", reclaim_id).eq("status", "pending").execute()
+        return bool(response.data)
+    except Exception as e:
+        print(f"❌ Error retiring reclaim {reclaim_id}: {e}")
+        return False
+
+
 # =====================================================
 # TRANSACTION MANAGEMENT
 # =====================================================
@@ -982,8 +1242,8 @@ def allocate_combo_credentials(telegram_id: int) -> Dict[str, Any]:
                 }
         
         # Step 4: Add subscriptions for allocated services
-        for plan_key in allocated.keys():
-            add_subscription(telegram_id, plan_key)
+        for plan_key, credential in allocated.items():
+            add_subscription(telegram_id, plan_key, credential)
         
         # Step 5: Handle YouTube separately (it uses email collection flow)
         if has_youtube:
@@ -1060,10 +1320,38 @@ def get_stock_counts() -> Dict[str, Dict[str, int]]:
 # LOGGING TO DATABASE (OPTIONAL)
 # =====================================================
 
+def _insert_log_rows(rows: List[Dict]):
+    """Multi-row insert used by the log buffer (raises; see _log_insert_retryable)"""
+    supabase.table("logs").insert(rows, returning="minimal").execute()
+
+
+def _log_insert_retryable(error: Exception) -> bool:
+    """
+    True when the logs insert failed because the database could not be
+    reached (worth spilling and retrying), False when it rejected the rows.
+    """
+    if isinstance(error, (httpx.TransportError, OSError)):
+        return True
+    if isinstance(error, APIError):
+        code = str(error.code or "")
+        # PGRST000-003: PostgREST cannot reach Postgres; 08/53/57: connection, resources, shutdown;
+        # a bare 5xx status is a gateway error without a JSON body
+        return (code.startswith("PGRST00") or code[:2] in ("08", "53", "57")
+                or (len(code) == 3 and code.startswith("5")))
+    return False
+
+
+# Shared buffer; call log_buffer.close() on shutdown
+log_buffer = LogBuffer(_insert_log_rows, retryable=_log_insert_retryable)
+
+
 def store_log_in_db(event_type: str, telegram_id: Optional[int] = None, username: Optional[str] = None, details: Optional[Dict] = None, message: Optional[str] = None):
     """
     Store log entry in database for analytics and auditing.
     
+    The row is buffered and written in a background batch, so this never
+    waits on the database.
+    
     Args:
         event_type: Type of event (e.g., 'PAYMENT_SUCCESS', 'PURCHASE_FAILED')
         telegram_id: User's Telegram ID
@@ -1071,35 +1359,37 @@ def store_log_in_db(event_type: str, telegram_id: Optional[int] = None, username
         details: Additional data as dictionary
         message: Log message text
     """
-    try:
-        log_entry = {
-            "event_type": event_type,
-            "telegram_id": telegram_id,
-            "username": username,
-            "details": details or {},
-            "message": message
-        }
-        
-        supabase.table("logs").insert(log_entry).execute()
-        
-    except Exception as e:
-        print(f"❌ Error storing log in database: {e}")
+    log_buffer.add({
+        "event_type": event_type,
+        "telegram_id": telegram_id,
+        "username": username,
+        "details": details or {},
+        "message": message,
+        "created_at": _utc_now()
+    })
 
 
-def get_recent_logs(limit: int = 50, event_type: Optional[str] = None, telegram_id: Optional[int] = None) -> List[Dict]:
+def get_recent_logs(limit: int = 50, event_type: Optional[str] = None, telegram_id: Optional[int] = None,
+                    since: Optional[str] = None, before: Optional[Tuple[str, int]] = None) -> List[Dict]:
     """
-    Retrieve recent logs from database.
+    Retrieve recent logs from database, newest first.
+    
+    Filters line up with idx_logs_user_time / idx_logs_event_time, and a time
+    bound lets Postgres skip whole monthly partitions.
     
     Args:
         limit: Number of logs to retrieve
         event_type: Filter by event type
         telegram_id: Filter by user ID
+        since: Only logs at or after this ISO timestamp
+        before: (created_at, id) of the last row of the previous page; rows
+                sharing that timestamp (one batch insert) are split by id
         
     Returns:
         List of log entries
     """
     try:
-        query = supabase.table("logs").select("*").order("created_at", desc=True).limit(limit)
+        query = supabase.table("logs").select("*")
         
         if event_type:
             query = query.eq("event_type", event_type)
@@ -1107,7 +1397,14 @@ def get_recent_logs(limit: int = 50, event_type: Optional[str] = None, telegram_
         if telegram_id:
             query = query.eq("telegram_id", telegram_id)
         
-        result = query.execute()
+        if since:
+            query = query.gte("created_at", since)
+        
+        if before:
+            created_at, last_id = before
+            query = query.or_(f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{last_id})")
+        
+        result = query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute()
         return result.data if result.data else []
         
     except Exception as e:
@@ -1115,18 +1412,54 @@ def get_recent_logs(limit: int = 50, event_type: Optional[str] = None, telegram_
         return []
 
 
-def get_user_activity_logs(telegram_id: int, limit: int = 20) -> List[Dict]:
+def get_user_activity_logs(telegram_id: int, limit: int = 20, before: Optional[Tuple[str, int]] = None) -> List[Dict]:
     """
     Get activity logs for a specific user.
     
     Args:
         telegram_id: User's Telegram ID
         limit: Number of logs to retrieve
+        before: (created_at, id) of the last row of the previous page
         
     Returns:
         List of user's activity logs
     """
-    return get_recent_logs(limit=limit, telegram_id=telegram_id)
+    return get_recent_logs(limit=limit, telegram_id=telegram_id, before=before)
 
 
-# =====================================================
\ No newline at end of file
+def ensure_log_partitions(months_ahead: int = 2) -> int:
+    """
+    Create monthly logs partitions for this month and the next `months_ahead`.
+    
+    Returns:
+        Number of partitions created
+    """
+    try:
+        response = supabase.rpc("ensure_log_partitions", {"p_months_ahead": months_ahead}).execute()
+        return response.data or 0
+    except Exception as e:
+        print(f"❌ Error creating log partitions: {e}")
+        return 0
+
+
+def drop_old_log_partitions(keep_months: int) -> List[str]:
+    """
+    Drop monthly logs partitions older than `keep_months` full months.
+    
+    Returns:
+        Names of the dropped partitions
+    """
+    try:
+        response = supabase.rpc("drop_log_partitions", {"p_keep_months": keep_months}).execute()
+        return response.data or []
+    except Exception as e:
+        print(f"❌ Error dropping log partitions: {e}")
+        return []
+
+
+# =====================================================
+# METRICS
+# =====================================================
+
+# Latency / error metrics for every public function above
+instrument_functions(globals(), __name__)
@@ -3,69 +3,92 @@ Text Utility Functions
 Provides text transformation utilities for bot messages
 """
 
+import re
+from string import Formatter
+
+
+# Unicode small-caps character mapping, compiled once into a str.translate table.
+# Maps both uppercase and lowercase to their small-caps equivalents.
+_SMALL_CAPS_TABLE = str.maketrans(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "ᴀʙᴄᴅᴇꜰɢʜɪᴊᴋʟᴍɴᴏᴘǫʀꜱᴛᴜᴠᴡxʏᴢᴀʙᴄᴅᴇꜰɢʜɪᴊᴋʟᴍɴᴏᴘǫʀꜱᴛᴜᴠᴡxʏᴢ",
+)
+
+# An HTML tag runs from "<" to the next ">" (or to the end if never closed).
+# Capturing group keeps the tags in re.split() output at odd indexes.
+_TAG_SPLIT = re.compile(r"(<[^>]*>?)")
+
 
 def toSmallCaps(text):
     """
     Converts regular text to Unicode small-caps style while preserving HTML tags.
-    
+
     Example:
         "TELEGRAM FONTS" → "ᴛᴇʟᴇɢʀᴀᴍ ꜰᴏɴᴛꜱ"
         "<b>Hello</b>" → "<b>ʜᴇʟʟᴏ</b>"
-    
+
     Args:
         text (str): Input text to convert
-        
+
     Returns:
         str: Text converted to Unicode small-caps with HTML tags preserved
-        
+
     Note:
         - A-Z and a-z are converted to small-caps Unicode characters
         - Numbers, emojis, symbols, and punctuation remain unchanged
         - HTML tags are preserved and not converted
         - No external libraries required - pure Unicode mapping
     """
-    # Unicode small-caps character mapping
-    # Maps both uppercase and lowercase to their small-caps equivalents
-    small_caps_map = {
-        'a': 'ᴀ', 'b': 'ʙ', 'c': 'ᴄ', 'd': 'ᴅ', 'e': 'ᴇ',
-        'f': 'ꜰ', 'g': 'ɢ', 'h': 'ʜ', 'i': 'ɪ', 'j': 'ᴊ',
-        'k': 'ᴋ', 'l': 'ʟ', 'm': 'ᴍ', 'n': 'ɴ', 'o': 'ᴏ',
-        'p': 'ᴘ', 'q': 'ǫ', 'r': 'ʀ', 's': 'ꜱ', 't': 'ᴛ',
-        'u': 'ᴜ', 'v': 'ᴠ', 'w': 'ᴡ', 'x': 'x', 'y': 'ʏ', 'z': 'ᴢ',
-        'A': 'ᴀ', 'B': 'ʙ', 'C': 'ᴄ', 'D': 'ᴅ', 'E': 'ᴇ',
-        'F': 'ꜰ', 'G': 'ɢ', 'H': 'ʜ', 'I': 'ɪ', 'J': 'ᴊ',
-        'K': 'ᴋ', 'L': 'ʟ', 'M': 'ᴍ', 'N': 'ɴ', 'O': 'ᴏ',
-        'P': 'ᴘ', 'Q': 'ǫ', 'R': 'ʀ', 'S': 'ꜱ', 'T': 'ᴛ',
-        'U': 'ᴜ', 'V': 'ᴠ', 'W': 'ᴡ', 'X': 'x', 'Y': 'ʏ', 'Z': 'ᴢ'
-    }
-    
-    # Convert each character, but skip characters inside HTML tags
-    result = []
-    inside_tag = False
-    
-    for char in text:
-        if char == '<':
-            # Entering an HTML tag
-            inside_tag = True
-            result.append(char)
-        elif char == '>':
-            # Exiting an HTML tag
-            inside_tag = False
-            result.append(char)
-        elif inside_tag:
-            # Inside a tag, keep character as-is
-            result.append(char)
-        else:
-            # Outside tags, apply small-caps conversion
-            result.append(small_caps_map.get(char, char))
-    
-    return ''.join(result)
+    if "<" not in text:
+        return text.translate(_SMALL_CAPS_TABLE)
+
+    parts = _TAG_SPLIT.split(text)
+    # Even indexes are text between tags, odd indexes are the tags themselves
+    parts[::2] = [part.translate(_SMALL_CAPS_TABLE) for part in parts[::2]]
+    return "".join(parts)
+
+
+class SmallCapsTemplate:
+    """
+    A str.format-style template whose literal text is converted to small caps once.
+
+    Only the values filled into the {slots} are converted at render time, so a
+    dynamic screen costs one translate per variable instead of one per message.
+    Slots must sit outside HTML tags (e.g. "<b>{name}</b>", not "<a href='{url}'>").
+
+    Example:
+        WELCOME = SmallCapsTemplate("<b>Welcome, {name}</b>")
+        WELCOME.format(name="Alex") → "<b>ᴡᴇʟᴄᴏᴍᴇ, ᴀʟᴇx</b>"
+    """
+
+    __slots__ = ("_parts",)
+
+    def __init__(self, template: str):
+        self._parts = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if literal:
+                self._parts.append((toSmallCaps(literal), None, None))
+            if field is not None:
+                fmt = "{" + ("!" + conversion if conversion else "") + (":" + spec if spec else "") + "}"
+                self._parts.append((None, field, fmt))
+
+    def format(self, **values) -> str:
+        """Render the template, converting only the slot values to small caps"""
+        out = []
+        for literal, field, fmt in self._parts:
+            if literal is not None:
+                out.append(literal)
+            else:
+                out.append(toSmallCaps(fmt.format(values[field])))
+        return "".join(out)
 
 
 # ============================================
 # EXAMPLE USAGE (For Reference)
 # ============================================
 if __name__ == "__main__":
+    import time
+
     # Test the function
     test_texts = [
         "Welcome To OTTOnly!",
@@ -74,14 +97,63 @@ if __name__ == "__main__":
         "Payment Successful! 💰",
         "Order ID: NET1234"
     ]
-    
+
     print("=" * 60)
     print("Unicode Small-Caps Converter Test")
     print("=" * 60)
-    
+
     for text in test_texts:
         converted = toSmallCaps(text)
         print(f"\nOriginal:  {text}")
         print(f"Converted: {converted}")
-    
+
     print("\n" + "=" * 60)
+
+    # Microbenchmark: previous per-character implementation vs translate table
+    def _legacy_toSmallCaps(text):
+        small_caps_map = dict(zip(
+            "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ",
+            "ᴀʙᴄᴅᴇꜰɢʜɪᴊᴋʟᴍɴᴏᴘǫʀꜱᴛᴜᴠᴡxʏᴢᴀʙᴄᴅᴇꜰɢʜɪᴊᴋʟᴍɴᴏᴘǫʀꜱᴛᴜᴠᴡxʏᴢ",
+        ))
+        result = []
+        inside_tag = False
+        for char in text:
+            if char == '<':
+                inside_tag = True
+                result.append(char)
+            elif char == '>':
+                inside_tag = False
+                result.append(char)
+            elif inside_tag:
+                result.append(char)
+            else:
+                result.append(small_caps_map.get(char, char))
+        return ''.join(result)
+
+    screen = (
+        "<b>Welcome to ottsonly, {name}\n"
+        "🚀 OTT SUBSCRIPTIONS AT BEST PRICES\n"
+        "Netflix • Prime • YouTube • Spotify & more\n\n"
+        "⚡ Instant access\n"
+        "🔒 100% trusted\n"
+        "💎 Premium quality</b>"
+    )
+    template = SmallCapsTemplate(screen)
+    assert _legacy_toSmallCaps(screen.format(name="Alex")) == template.format(name="Alex")
+    assert _legacy_toSmallCaps(screen) == toSmallCaps(screen)
+
+    runs = 50_000
+    cases = (
+        ("legacy toSmallCaps", lambda: _legacy_toSmallCaps(screen.format(name="Alex"))),
+        ("toSmallCaps", lambda: toSmallCaps(screen.format(name="Alex"))),
+        ("SmallCapsTemplate", lambda: template.format(name="Alex")),
+    )
+    print("Render Microbenchmark")
+    print("=" * 60)
+    for label, fn in cases:
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<22} {runs / elapsed:>12,.0f} renders/sec")
+    print("=" * 60)
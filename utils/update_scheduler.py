@@ -0,0 +1,128 @@
+"""
+UPDATE SCHEDULER MIDDLEWARE
+============================
+Serializes updates per user while different users run fully in parallel.
+
+- Each user_id gets its own FIFO lock: a user's updates run one at a time, in arrival order
+- Each user may have at most USER_QUEUE_LIMIT updates queued/running; extras are dropped
+- A callback whose data is already queued/running for that user (double tap) is dropped
+- Locks are reference-counted and removed once a user has nothing pending
+- The lock is held around the whole update pipeline (middlewares + handlers) and
+  released in a finally, so a CancelHandler or an exception anywhere cannot leak it
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from config.settings import USER_QUEUE_LIMIT
+
+log = logging.getLogger(__name__)
+
+
+def _update_user_id(update: types.Update) -> Optional[int]:
+    """Return the Telegram user an update belongs to (None for channel posts etc.)"""
+    for event in (
+        update.message,
+        update.edited_message,
+        update.callback_query,
+        update.inline_query,
+        update.chosen_inline_result,
+        update.shipping_query,
+        update.pre_checkout_query,
+        update.my_chat_member,
+        update.chat_member,
+        update.chat_join_request,
+    ):
+        if event is not None and getattr(event, "from_user", None):
+            return event.from_user.id
+    return None
+
+
+class _UserSlot:
+    """Per-user FIFO lock plus bookkeeping for queue depth and in-flight callbacks"""
+
+    __slots__ = ("lock", "pending", "callbacks")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.callbacks: Set[str] = set()
+
+
+class UserOrderingMiddleware(BaseMiddleware):
+    """
+    Per-user ordered, cross-user parallel update execution.
+
+    Registered like a middleware, but it wraps the dispatcher's update handler
+    instead of using pre/post hooks: aiogram skips post_process when a later
+    middleware cancels or a handler raises, which would leave the user locked.
+
+    Usage:
+        dp.middleware.setup(UserOrderingMiddleware())   # register before other middlewares
+    """
+
+    def __init__(self, queue_limit: int = USER_QUEUE_LIMIT):
+        super().__init__()
+        self.queue_limit = queue_limit
+        self._slots: Dict[int, _UserSlot] = {}
+        self.dropped: Dict[str, int] = {"duplicate": 0, "overflow": 0}
+
+    def setup(self, manager):
+        super().setup(manager)
+        handler = manager.dispatcher.updates_handler
+        notify = handler.notify
+
+        async def ordered_notify(update: types.Update) -> List:
+            return await self.run(update, notify)
+
+        handler.notify = ordered_notify
+
+    async def _reject(self, update: types.Update, reason: str, alert: str) -> List:
+        self.dropped[reason] += 1
+        log.info(f"⏭️ Dropped {reason} update {update.update_id}")
+        if update.callback_query:
+            try:
+                await update.callback_query.answer(alert)
+            except Exception:
+                pass
+        return []
+
+    async def run(self, update: types.Update, process) -> List:
+        """Run process(update) under the user's lock, or drop it per the queue policy"""
+        user_id = _update_user_id(update)
+        if user_id is None:
+            return await process(update)
+
+        slot = self._slots.get(user_id)
+        if slot is None:
+            slot = self._slots[user_id] = _UserSlot()
+
+        callback_data = update.callback_query.data if update.callback_query else None
+
+        # Drop policy: same button pressed again while the first press is still pending
+        if callback_data is not None and callback_data in slot.callbacks:
+            return await self._reject(update, "duplicate", "⏳ Already processing, please wait...")
+
+        if slot.pending >= self.queue_limit:
+            return await self._reject(update, "overflow", "⏳ Too many requests, please slow down.")
+
+        slot.pending += 1
+        if callback_data is not None:
+            slot.callbacks.add(callback_data)
+        try:
+            async with slot.lock:
+                return await process(update)
+        finally:
+            slot.pending -= 1
+            if callback_data is not None:
+                slot.callbacks.discard(callback_data)
+            if slot.pending <= 0:
+                del self._slots[user_id]
+
+    @property
+    def active_users(self) -> int:
+        return len(self._slots)
@@ -0,0 +1,231 @@
+"""
+WEBHOOK SERVER
+===============
+Runs the bot behind a reverse proxy using Telegram webhooks instead of long polling.
+
+- Verifies Telegram's X-Telegram-Bot-Api-Secret-Token header on every request
+- Processes updates concurrently, bounded by WEBHOOK_MAX_CONCURRENT_UPDATES per worker
+- Several worker processes share one port (SO_REUSEPORT); FSM state is shared
+  through Redis, so more than one worker requires REDIS_URL
+- On SIGTERM/SIGINT stops accepting updates and drains in-flight ones before exit
+"""
+
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import os
+from typing import Awaitable, Callable, Optional, Set
+from urllib.parse import urlparse
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+
+from config.settings import (
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    WEBHOOK_WORKERS,
+    WEBHOOK_MAX_CONCURRENT_UPDATES,
+    WEBHOOK_DRAIN_TIMEOUT,
+    METRICS_PORT,
+)
+from utils.metrics import start_metrics_server
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+Hook = Callable[[Dispatcher], Awaitable[None]]
+
+
+def make_storage(redis_url: Optional[str]):
+    """
+    Build the FSM storage for this process.
+
+    With REDIS_URL set every worker sees the same FSM state; without it the
+    process keeps its own MemoryStorage, which run_webhook refuses for more
+    than one worker.
+    """
+    if not redis_url:
+        from aiogram.contrib.fsm_storage.memory import MemoryStorage
+        return MemoryStorage()
+
+    # Optional dependency: only needed for multi-worker deployments.
+    # aiogram 2.25's RedisStorage2 is built on redis-py's redis.asyncio.
+    try:
+        import redis.asyncio  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError(
+            "REDIS_URL is set but the 'redis' package is missing; "
+            "install it with `pip install -r requirements.txt` or unset REDIS_URL"
+        ) from e
+    from aiogram.contrib.fsm_storage.redis import RedisStorage2
+
+    url = urlparse(redis_url)
+    db = int(url.path.lstrip("/") or 0)
+    return RedisStorage2(
+        host=url.hostname or "localhost",
+        port=url.port or 6379,
+        db=db,
+        password=url.password,
+        ssl=url.scheme == "rediss",
+        prefix="ottsonly_fsm",
+    )
+
+
+class UpdateServer:
+    """aiohttp application that feeds webhook updates into the dispatcher"""
+
+    def __init__(self, dp: Dispatcher, max_concurrent: int = WEBHOOK_MAX_CONCURRENT_UPDATES,
+                 secret: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH):
+        self.dp = dp
+        self.secret = secret
+        self.path = path
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._in_flight: Set[asyncio.Task] = set()
+        self._accepting = True
+
+    # ========== REQUEST HANDLING ==========
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._accepting:
+            # Telegram retries non-2xx responses, so nothing is lost while draining
+            return web.Response(status=503)
+
+        token = request.headers.get(SECRET_HEADER, "")
+        if not self.secret or not hmac.compare_digest(token, self.secret):
+            return web.Response(status=401)
+
+        try:
+            update = types.Update(**(await request.json()))
+        except Exception:
+            return web.Response(status=400)
+
+        # Backpressure: hold the response until a slot frees up, so Telegram
+        # (and the proxy) throttle instead of this worker buffering unbounded work
+        await self._slots.acquire()
+        Bot.set_current(self.dp.bot)
+        Dispatcher.set_current(self.dp)
+        task = asyncio.create_task(self._process(update))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return web.Response(status=200)
+
+    async def _process(self, update: types.Update):
+        try:
+            await self.dp.updates_handler.notify(update)
+        except Exception as e:
+            log.exception(f"❌ Error processing update {update.update_id}: {e}")
+        finally:
+            self._slots.release()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"accepting": self._accepting, "in_flight": len(self._in_flight)})
+
+    # ========== SHUTDOWN ==========
+
+    async def drain(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Stop accepting new updates and wait for in-flight ones to finish"""
+        self._accepting = False
+        if not self._in_flight:
+            return
+        log.info(f"⏳ Draining {len(self._in_flight)} in-flight updates...")
+        done, pending = await asyncio.wait(set(self._in_flight), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            log.warning(f"⚠️ Cancelled {len(pending)} updates after {timeout}s drain timeout")
+
+    def build_app(self, on_startup: Optional[Hook] = None, on_shutdown: Optional[Hook] = None,
+                  set_webhook: bool = True, metrics_port: int = 0) -> web.Application:
+        app = web.Application()
+        metrics_runner = None
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get("/healthz", self.health)
+
+        async def _startup(_app):
+            nonlocal metrics_runner
+            Bot.set_current(self.dp.bot)
+            metrics_runner = await start_metrics_server(metrics_port)
+            Dispatcher.set_current(self.dp)
+            if set_webhook:
+                await self.dp.bot.set_webhook(
+                    WEBHOOK_HOST + self.path,
+                    secret_token=self.secret,
+                    # Keep updates queued (or answered 503) while the previous process drained
+                    drop_pending_updates=False,
+                    max_connections=WEBHOOK_MAX_CONCURRENT_UPDATES * WEBHOOK_WORKERS,
+                )
+            if on_startup:
+                await on_startup(self.dp)
+
+        async def _shutdown(_app):
+            await self.drain()
+            if on_shutdown:
+                await on_shutdown(self.dp)
+            if metrics_runner:
+                await metrics_runner.cleanup()
+            await self.dp.storage.close()
+            await self.dp.storage.wait_closed()
+            session = await self.dp.bot.get_session()
+            await session.close()
+
+        app.on_startup.append(_startup)
+        app.on_shutdown.append(_shutdown)
+        return app
+
+
+# =====================================================
+# ENTRY POINT
+# =====================================================
+
+def _serve(dp: Dispatcher, on_startup: Optional[Hook], on_shutdown: Optional[Hook], worker: int):
+    # Only the first worker registers the webhook and runs the one-off startup hook
+    server = UpdateServer(dp)
+    app = server.build_app(
+        on_startup=on_startup if worker == 0 else None,
+        on_shutdown=on_shutdown,
+        set_webhook=worker == 0,
+        metrics_port=METRICS_PORT + worker if METRICS_PORT else 0,
+    )
+    log.info(f"🌐 Webhook worker {worker} (pid {os.getpid()}) on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+    web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT, reuse_port=WEBHOOK_WORKERS > 1,
+                print=None, shutdown_timeout=WEBHOOK_DRAIN_TIMEOUT)
+
+
+def run_webhook(dp: Dispatcher, on_startup: Optional[Hook] = None, on_shutdown: Optional[Hook] = None):
+    """
+    Serve the dispatcher over webhooks with WEBHOOK_WORKERS processes.
+
+    Workers are forked from the current process, so the dispatcher and handler
+    registrations are shared; each worker opens its own HTTP session lazily.
+    """
+    if not WEBHOOK_SECRET:
+        raise ValueError("❌ WEBHOOK_SECRET is required in webhook mode. Check your .env file.")
+
+    from aiogram.contrib.fsm_storage.memory import MemoryStorage
+    if WEBHOOK_WORKERS > 1 and isinstance(dp.storage, MemoryStorage):
+        # Each worker would keep its own FSM state and lose users mid-conversation
+        raise ValueError("❌ WEBHOOK_WORKERS > 1 requires REDIS_URL for shared FSM state. Check your .env file.")
+
+    if WEBHOOK_WORKERS <= 1:
+        _serve(dp, on_startup, on_shutdown, 0)
+        return
+
+    ctx = multiprocessing.get_context("fork")
+    workers = [
+        ctx.Process(target=_serve, args=(dp, on_startup, on_shutdown, i), name=f"webhook-{i}")
+        for i in range(WEBHOOK_WORKERS)
+    ]
+    for proc in workers:
+        proc.start()
+    try:
+        for proc in workers:
+            proc.join()
+    except KeyboardInterrupt:
+        # Children received the same SIGINT and are draining; wait for them
+        for proc in workers:
+            proc.join()
@@ -0,0 +1,138 @@
+"""
+Webhook load test - posts synthetic Telegram updates to the webhook endpoint.
+
+Usage:
+    # Against a running bot (BOT_MODE=webhook)
+    python webhook_load_test.py --url http://127.0.0.1:8080/telegram/webhook --secret $WEBHOOK_SECRET
+
+    # Self-contained: starts an in-process UpdateServer with no-op handlers
+    python webhook_load_test.py --local --handler-ms 20
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+from aiohttp import ClientSession, TCPConnector, web
+from aiogram import Bot, Dispatcher
+
+from utils.webhook import UpdateServer, SECRET_HEADER
+
+_update_ids = itertools.count(1)
+
+
+def synthetic_update(user_id: int) -> dict:
+    """Alternate between a /start message and a menu button callback"""
+    update_id = next(_update_ids)
+    user = {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}", "username": f"load{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    if update_id % 2:
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id, "date": int(time.time()), "chat": chat, "from": user,
+                "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        }
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "from": user, "chat_instance": str(user_id), "data": "menu_buy_otts",
+            "message": {"message_id": update_id, "date": int(time.time()), "chat": chat, "text": "menu"},
+        },
+    }
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_load(url: str, secret: str, total: int, concurrency: int, users: int):
+    latencies = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(synthetic_update(100000 + i % users))
+
+    async def worker(session):
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            async with session.post(url, json=payload, headers={SECRET_HEADER: secret}) as resp:
+                await resp.read()
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, latencies, statuses
+
+
+async def main(args):
+    runner = None
+    processed = []
+
+    if args.local:
+        bot = Bot(token="123456:LOADTEST")
+        dp = Dispatcher(bot)
+
+        @dp.message_handler()
+        @dp.callback_query_handler()
+        async def _noop(obj):
+            await asyncio.sleep(args.handler_ms / 1000)
+            processed.append(time.perf_counter())
+
+        server = UpdateServer(dp, max_concurrent=args.max_concurrent, secret=args.secret)
+        app = server.build_app(set_webhook=False)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.port).start()
+        url = f"http://127.0.0.1:{args.port}{server.path}"
+    else:
+        url = args.url
+
+    elapsed, latencies, statuses = await run_load(url, args.secret, args.updates, args.concurrency, args.users)
+
+    if runner:
+        # Triggers UpdateServer.drain via on_shutdown
+        await runner.cleanup()
+
+    print("=" * 60)
+    print("📈 WEBHOOK LOAD TEST")
+    print("=" * 60)
+    print(f"Target:        {url}")
+    print(f"Updates:       {args.updates} ({args.concurrency} concurrent clients, {args.users} users)")
+    print(f"Elapsed:       {elapsed:.2f}s")
+    print(f"Throughput:    {args.updates / elapsed:,.1f} updates/sec")
+    print(f"Latency p50:   {_percentile(latencies, 50):.1f} ms")
+    print(f"Latency p95:   {_percentile(latencies, 95):.1f} ms")
+    print(f"Latency p99:   {_percentile(latencies, 99):.1f} ms")
+    print(f"Latency mean:  {statistics.mean(latencies) if latencies else 0:.1f} ms")
+    print(f"Status codes:  {dict(sorted(statuses.items()))}")
+    if args.local:
+        print(f"Processed:     {len(processed)} (after drain)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Post synthetic updates to the bot webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/telegram/webhook")
+    parser.add_argument("--secret", default="loadtest-secret")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--local", action="store_true", help="Start an in-process server with no-op handlers")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--handler-ms", type=float, default=20.0)
+    parser.add_argument("--max-concurrent", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))